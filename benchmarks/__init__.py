@@ -0,0 +1 @@
+"""Nornir F5 benchmarks."""
@@ -0,0 +1,63 @@
+"""Benchmark of the JSON codec backends.
+
+Compares the encoding and decoding time of the available JSON backends on the
+ATC declarations used by the tests.
+
+Usage:
+    python -m benchmarks.json_codec [--number N] [--scale N]
+"""
+
+import argparse
+import glob
+import os
+import timeit
+
+from nornir_f5.plugins.connections.codec import JSON_CODECS
+
+DECLARATIONS_DIR = os.path.join(
+    os.path.dirname(__file__), "..", "tests", "declarations", "atc"
+)
+
+
+def _load_declarations(scale: int) -> dict:
+    codec = JSON_CODECS["json"]
+    declarations = {}
+    for path in sorted(glob.glob(f"{DECLARATIONS_DIR}/**/*.json", recursive=True)):
+        with open(path, "rb") as f:
+            declaration = codec.loads(f.read())
+        # Replicate the declaration content to emulate a large declaration
+        if scale > 1:
+            declaration = {
+                f"{k}_{i}": v for i in range(scale) for k, v in declaration.items()
+            }
+        declarations[os.path.relpath(path, DECLARATIONS_DIR)] = declaration
+    return declarations
+
+
+def main() -> None:
+    """Runs the benchmark and prints the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=2000, help="iterations")
+    parser.add_argument("--scale", type=int, default=1, help="declaration scale")
+    args = parser.parse_args()
+
+    declarations = _load_declarations(args.scale)
+    print(
+        f"{'declaration':<40} {'backend':<8} {'size':>9} "
+        f"{'loads us':>10} {'dumps us':>10}"
+    )
+    for name, declaration in declarations.items():
+        raw = JSON_CODECS["json"].dumps(declaration)
+        for backend, codec in JSON_CODECS.items():
+            loads = timeit.timeit(lambda c=codec, r=raw: c.loads(r), number=args.number)
+            dumps = timeit.timeit(
+                lambda c=codec, d=declaration: c.dumps(d), number=args.number
+            )
+            print(
+                f"{name:<40} {backend:<8} {len(raw):>9} "
+                f"{loads / args.number * 1e6:>10.2f} {dumps / args.number * 1e6:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
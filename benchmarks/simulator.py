@@ -0,0 +1,496 @@
+"""Stateful BIG-IP REST simulator.
+
+Serves the iControl REST and ATC endpoints used by the nornir_f5 tasks from
+memory, with a configurable latency, error rate and rate limit, so that the
+tasks can be exercised against many devices without a lab.
+
+The simulator is a `Transport` of the F5 connection:
+
+    simulator = BigIPSimulator(SimulatorSettings(latency=0.02))
+    extras = {"transport": simulator}
+
+Each device (`hostname:port`) has its own state: authentication tokens, AS3/DO/TS
+declarations and their async tasks, config-sync status, uploaded files and LX
+packages.
+"""
+
+import gzip
+import json
+import random
+import re
+import shlex
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Pattern, Tuple
+from urllib.parse import urlsplit
+
+from requests import PreparedRequest, Response
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RetryError
+from urllib3.exceptions import MaxRetryError
+
+from nornir_f5.plugins.connections import Transport
+
+DOWNLOADS_DIR = "/var/config/rest/downloads"
+ATC_SERVICES = {
+    "appsvcs": "3.22.1",
+    "declarative-onboarding": "1.21.0",
+    "telemetry": "1.17.0",
+}
+
+
+@dataclass
+class SimulatorSettings:
+    """Settings of the simulated devices.
+
+    Attributes:
+        latency (float): The time (in seconds) taken to serve each request.
+        jitter (float): The maximum random variation (in seconds) of the latency.
+        error_rate (float): The fraction of the requests failing with a 503.
+        rate_limit (Optional[float]): The number of requests per second served by
+            each device, beyond which requests fail with a 429.
+        task_duration (float): The time (in seconds) taken by the async tasks.
+        sync_duration (float): The time (in seconds) taken by the config-sync.
+        version (str): The BIG-IP version.
+        seed (Optional[int]): The seed of the random generator.
+    """
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    rate_limit: Optional[float] = None
+    task_duration: float = 0.0
+    sync_duration: float = 0.0
+    version: str = "15.1.0"
+    seed: Optional[int] = None
+
+
+@dataclass
+class _AsyncTask:
+    done_at: float
+    result: Dict[str, Any]
+    apply: Callable[[], str] = field(repr=False)
+    message: Optional[str] = None
+
+
+class _Device:
+    def __init__(self, settings: SimulatorSettings) -> None:
+        self.lock = threading.Lock()
+        self.tokens: Dict[str, int] = {}
+        self.sync_status = "Changes Pending"
+        self.sync_done_at: Optional[float] = None
+        self.declarations: Dict[str, Any] = {}
+        self.tasks: Dict[str, _AsyncTask] = {}
+        self.files: Dict[str, bytearray] = {}
+        self.packages: Dict[str, str] = {}
+        self.bucket = settings.rate_limit or 0.0
+        self.bucket_at = time.monotonic()
+
+
+_Handler = Callable[[_Device, PreparedRequest, Any, "re.Match"], Tuple[int, Any]]
+
+
+def _stats(uri: str, name: str, value: str) -> Dict[str, Any]:
+    return {
+        "entries": {
+            f"https://localhost{uri}/0": {
+                "nestedStats": {"entries": {name: {"description": value}}}
+            }
+        }
+    }
+
+
+def _as3_tenants(declaration: Dict[str, Any]) -> List[str]:
+    adc = declaration.get("declaration", declaration)
+    return [
+        k for k, v in adc.items() if isinstance(v, dict) and v.get("class") == "Tenant"
+    ]
+
+
+class BigIPSimulator(Transport):
+    """Simulates BIG-IP devices.
+
+    Attributes:
+        settings (SimulatorSettings): The settings of the simulated devices.
+        requests (Counter): The number of requests served, by route.
+        statuses (Counter): The number of responses, by status code.
+    """
+
+    def __init__(self, settings: Optional[SimulatorSettings] = None) -> None:
+        """Initializes the simulator.
+
+        Args:
+            settings (Optional[SimulatorSettings]): The settings of the devices.
+        """
+        self.settings = settings or SimulatorSettings()
+        self.requests: Counter = Counter()
+        self.statuses: Counter = Counter()
+        self._devices: Dict[str, _Device] = {}
+        self._lock = threading.Lock()
+        self._random = random.Random(self.settings.seed)  # noqa S311
+        self._routes: List[Tuple[str, Pattern, _Handler]] = [
+            ("POST", re.compile(r"/mgmt/shared/authn/login$"), self._login),
+            ("PATCH", re.compile(r"/mgmt/shared/authz/tokens/(\w+)$"), self._token),
+            ("DELETE", re.compile(r"/mgmt/shared/authz/tokens/(\w+)$"), self._token),
+            ("GET", re.compile(r"/mgmt/tm/sys/version$"), self._version),
+            ("GET", re.compile(r"/mgmt/tm/cm/sync-status$"), self._sync_status),
+            ("GET", re.compile(r"/mgmt/tm/cm/failover-status$"), self._failover),
+            (
+                "GET",
+                re.compile(r"/mgmt/tm/cm/device-group/~Common~[^/]+/devices$"),
+                self._devices_list,
+            ),
+            ("POST", re.compile(r"/mgmt/tm/cm$"), self._config_sync),
+            ("POST", re.compile(r"/mgmt/tm/util/unix-ls$"), self._unix_ls),
+            ("POST", re.compile(r"/mgmt/tm/util/unix-rm$"), self._unix_rm),
+            (
+                "POST",
+                re.compile(r"/mgmt/shared/file-transfer/uploads/([^/]+)$"),
+                self._upload,
+            ),
+            (
+                "POST",
+                re.compile(r"/mgmt/shared/iapp/package-management-tasks$"),
+                self._package_task,
+            ),
+            (
+                "GET",
+                re.compile(r"/mgmt/shared/iapp/package-management-tasks/([\w-]+)$"),
+                self._get_package_task,
+            ),
+            (
+                "GET",
+                re.compile(
+                    r"/mgmt/shared/(appsvcs|declarative-onboarding|telemetry)/info$"
+                ),  # noqa B950
+                self._atc_info,
+            ),
+            ("GET", re.compile(r"/mgmt/shared/appsvcs/task/([\w-]+)$"), self._task),
+            (
+                "GET",
+                re.compile(r"/mgmt/shared/declarative-onboarding/task/([\w-]+)$"),
+                self._task,
+            ),
+            (
+                "GET",
+                re.compile(
+                    r"/mgmt/shared/(appsvcs/declare|declarative-onboarding|telemetry/declare)(?:/([^/]+))?$"  # noqa B950
+                ),
+                self._get_declaration,
+            ),
+            (
+                "POST",
+                re.compile(r"/mgmt/shared/appsvcs/declare(?:/[^/]+)?$"),
+                self._as3,
+            ),
+            ("DELETE", re.compile(r"/mgmt/shared/appsvcs/declare/([^/]+)$"), self._as3),
+            ("POST", re.compile(r"/mgmt/shared/declarative-onboarding$"), self._do),
+            ("POST", re.compile(r"/mgmt/shared/telemetry/declare$"), self._ts),
+        ]
+
+    @property
+    def devices(self) -> int:
+        """Returns the number of devices that received requests.
+
+        Returns:
+            int: The number of devices.
+        """
+        return len(self._devices)
+
+    def send(
+        self, adapter: HTTPAdapter, request: PreparedRequest, **kwargs: Any
+    ) -> Response:
+        """Serves a request, retrying it as per the retry strategy of the adapter.
+
+        Args:
+            adapter (HTTPAdapter): The transport adapter of the connection.
+            request (PreparedRequest): The request to serve.
+            **kwargs (Any): The arguments of `HTTPAdapter.send`.
+
+        Returns:
+            Response: The response.
+
+        Raises:
+            RetryError: The raised exception when the retries are exhausted.
+        """
+        retries = adapter.max_retries
+        while True:
+            status, payload = self._serve(request)
+            headers = {"Content-Type": "application/json"}
+            if status == 429:
+                headers["Retry-After"] = "1"
+            body = payload if isinstance(payload, bytes) else b""
+            if payload is not None and not isinstance(payload, bytes):
+                body = json.dumps(payload).encode("utf-8")
+            response = self.build_response(adapter, request, status, body, headers)
+            if not retries.is_retry(request.method, status, "Retry-After" in headers):
+                return response
+            try:
+                retries = retries.increment(
+                    request.method, request.url, response=response.raw
+                )
+            except MaxRetryError as e:
+                raise RetryError(e, request=request) from e
+            retries.sleep(response.raw)
+
+    def _device(self, host: str) -> _Device:
+        with self._lock:
+            if host not in self._devices:
+                self._devices[host] = _Device(self.settings)
+            return self._devices[host]
+
+    def _network(self) -> bool:
+        # Waits for the latency and returns whether the request fails
+        jitter = self.settings.jitter
+        with self._lock:
+            latency = self.settings.latency + self._random.uniform(-jitter, jitter)
+            fail = self._random.random() < self.settings.error_rate
+        time.sleep(max(latency, 0.0))
+        return fail
+
+    def _throttled(self, device: _Device) -> bool:
+        rate = self.settings.rate_limit
+        if not rate:
+            return False
+        with device.lock:
+            now = time.monotonic()
+            device.bucket = min(rate, device.bucket + (now - device.bucket_at) * rate)
+            device.bucket_at = now
+            if device.bucket < 1:
+                return True
+            device.bucket -= 1
+            return False
+
+    def _route(self, request: PreparedRequest, path: str) -> Optional[Tuple]:
+        for method, pattern, handler in self._routes:
+            match = pattern.match(path)
+            if method == request.method and match:
+                return f"{method} {pattern.pattern}", handler, match
+        return None
+
+    def _serve(self, request: PreparedRequest) -> Tuple[int, Any]:
+        url = urlsplit(request.url)
+        device = self._device(url.netloc)
+
+        route = self._route(request, url.path)
+        if route is None:
+            return self._count(f"{request.method} (unknown)", 404, None)
+        route, handler, match = route
+
+        if self._network():
+            return self._count(route, 503, {"code": 503, "message": "Unavailable"})
+        if self._throttled(device):
+            return self._count(route, 429, {"code": 429, "message": "Too Many"})
+        if handler != self._login and not self._authorized(device, request):
+            return self._count(route, 401, {"code": 401, "message": "Unauthorized"})
+
+        body = request.body or b""
+        if request.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        if request.headers.get("Content-Type") == "application/json" and body:
+            body = json.loads(body)
+        with device.lock:
+            status, payload = handler(device, request, body, match)
+        return self._count(route, status, payload)
+
+    def _count(self, route: str, status: int, payload: Any) -> Tuple[int, Any]:
+        with self._lock:
+            self.requests[route] += 1
+            self.statuses[status] += 1
+        return status, payload
+
+    @staticmethod
+    def _authorized(device: _Device, request: PreparedRequest) -> bool:
+        if request.headers.get("Authorization", "").startswith("Basic "):
+            return True
+        with device.lock:
+            return request.headers.get("X-F5-Auth-Token") in device.tokens
+
+    # Authentication
+
+    def _login(self, device, request, body, match):
+        token = uuid.uuid4().hex.upper()
+        device.tokens[token] = 1200
+        return 200, {
+            "token": {
+                "token": token,
+                "name": token,
+                "userName": body["username"],
+                "authProviderName": body.get("loginProviderName", "tmos"),
+            }
+        }
+
+    def _token(self, device, request, body, match):
+        token = match.group(1)
+        if token not in device.tokens:
+            return 404, {"code": 404, "message": "Token not found"}
+        if request.method == "DELETE":
+            del device.tokens[token]
+        else:
+            device.tokens[token] = body["timeout"]
+        return 200, {"token": token, "timeout": device.tokens.get(token)}
+
+    # System and cluster management
+
+    def _version(self, device, request, body, match):
+        return 200, _stats("/mgmt/tm/sys/version", "Version", self.settings.version)
+
+    def _sync_status(self, device, request, body, match):
+        if device.sync_done_at is not None and time.monotonic() >= device.sync_done_at:
+            device.sync_status = "In Sync"
+            device.sync_done_at = None
+        return 200, _stats("/mgmt/tm/cm/sync-status", "status", device.sync_status)
+
+    def _failover(self, device, request, body, match):
+        return 200, _stats("/mgmt/tm/cm/failover-status", "status", "ACTIVE")
+
+    def _devices_list(self, device, request, body, match):
+        return 200, {"items": [{"name": urlsplit(request.url).hostname}]}
+
+    def _config_sync(self, device, request, body, match):
+        device.sync_status = "Syncing"
+        device.sync_done_at = time.monotonic() + self.settings.sync_duration
+        return 200, {"kind": "tm:cm:runstate", **body}
+
+    # Files
+
+    def _unix_ls(self, device, request, body, match):
+        path = body["utilCmdArgs"]
+        names = [f[len(path) + 1 :] for f in device.files if f.startswith(f"{path}/")]
+        if path in device.files:
+            result = f"{path}\n"
+        elif names:
+            result = "".join(f"{name}\n" for name in sorted(names))
+        else:
+            result = f"/bin/ls: cannot access {path}: No such file or directory\n"
+        return 200, {
+            "kind": "tm:util:unix-ls:runstate",
+            **body,
+            "commandResult": result,
+        }
+
+    def _unix_rm(self, device, request, body, match):
+        for path in shlex.split(body["utilCmdArgs"]):
+            device.files.pop(path, None)
+        return 200, {"kind": "tm:util:unix-rm:runstate", **body}
+
+    def _upload(self, device, request, body, match):
+        start, end, size = map(int, re.split(r"[-/]", request.headers["Content-Range"]))
+        data = device.files.setdefault(f"{DOWNLOADS_DIR}/{match.group(1)}", bytearray())
+        data[start : end + 1] = body
+        return 200, {"remainingByteCount": size - end - 1, "totalByteCount": size}
+
+    def _package_task(self, device, request, body, match):
+        task_id = str(uuid.uuid4())
+        done_at = time.monotonic() + self.settings.task_duration
+
+        def apply() -> str:
+            if body["operation"] == "UNINSTALL":
+                device.packages.pop(body["packageName"], None)
+                return "FINISHED"
+            path = body["packageFilePath"]
+            if path not in device.files:
+                return "FAILED"
+            device.packages[path.rsplit("/", 1)[-1].rsplit(".", 1)[0]] = path
+            return "FINISHED"
+
+        device.tasks[task_id] = _AsyncTask(done_at, {"id": task_id, **body}, apply)
+        return 200, {"id": task_id, "status": "CREATED", **body}
+
+    def _get_package_task(self, device, request, body, match):
+        task = device.tasks.get(match.group(1))
+        if task is None:
+            return 404, {"code": 404, "message": "Task not found"}
+        if time.monotonic() < task.done_at:
+            return 200, {**task.result, "status": "STARTED"}
+        if task.message is None:
+            task.message = task.apply()
+        status = {**task.result, "status": task.message}
+        if task.message == "FAILED":
+            status["errorMessage"] = "Package file not found"
+        return 200, status
+
+    # ATC
+
+    def _atc_info(self, device, request, body, match):
+        return 200, {"version": ATC_SERVICES[match.group(1)]}
+
+    def _get_declaration(self, device, request, body, match):
+        declaration = device.declarations.get(match.group(1).split("/")[0])
+        tenant = match.group(2)
+        if declaration is not None and tenant:
+            declaration = (
+                {tenant: declaration[tenant]} if tenant in declaration else None
+            )
+        if not declaration:
+            return 204, b""
+        return 200, declaration
+
+    def _atc_task(self, device, result: Dict[str, Any], apply) -> str:
+        task_id = str(uuid.uuid4())
+        done_at = time.monotonic() + self.settings.task_duration
+        device.tasks[task_id] = _AsyncTask(done_at, {"id": task_id, **result}, apply)
+        return task_id
+
+    def _as3(self, device, request, body, match):
+        if request.method == "DELETE":
+            tenants = [match.group(1)]
+        else:
+            tenants = _as3_tenants(body)
+
+        def apply() -> str:
+            current = device.declarations.get("appsvcs", {})
+            declaration = dict(current)
+            for tenant in tenants:
+                declaration.pop(tenant, None)
+                if request.method == "POST":
+                    declaration[tenant] = body.get("declaration", body)[tenant]
+            if declaration == current:
+                return "no change"
+            device.declarations["appsvcs"] = declaration
+            return "success"
+
+        task_id = self._atc_task(device, {"tenants": tenants}, apply)
+        return 200, {
+            "id": task_id,
+            "results": [
+                {"message": "Declaration successfully submitted", "tenant": t}
+                for t in tenants
+            ],
+        }
+
+    def _do(self, device, request, body, match):
+        def apply() -> str:
+            if device.declarations.get("declarative-onboarding") == body:
+                return "no change"
+            device.declarations["declarative-onboarding"] = body
+            return "success"
+
+        task_id = self._atc_task(device, {}, apply)
+        return 202, {"id": task_id, "result": {"message": "processing"}}
+
+    def _ts(self, device, request, body, match):
+        device.declarations["telemetry"] = body
+        return 200, {"message": "success", "declaration": body}
+
+    def _task(self, device, request, body, match):
+        task = device.tasks.get(match.group(1))
+        if task is None:
+            return 404, {"code": 404, "message": "Task not found"}
+        if time.monotonic() < task.done_at:
+            message = "in progress" if "tenants" in task.result else "processing"
+        else:
+            if task.message is None:
+                task.message = task.apply()
+            message = task.message
+        if "tenants" in task.result:
+            return 200, {
+                "id": task.result["id"],
+                "results": [
+                    {"message": message, "tenant": t} for t in task.result["tenants"]
+                ],
+            }
+        return 200, {"id": task.result["id"], "result": {"message": message}}
@@ -0,0 +1,224 @@
+"""Throughput benchmark of the tasks against simulated BIG-IP devices.
+
+Runs each task scenario against 10, 100 and 1,000 devices served by the BIG-IP
+simulator, and reports the hosts per second, wall time, peak RSS and number of
+requests. Each run is done in a fresh process so that its peak RSS is its own.
+
+Usage:
+    python -m benchmarks.throughput [--hosts N [N ...]] [--scenarios NAME [NAME ...]]
+        [--workers N] [--latency SECONDS] [--jitter SECONDS] [--error-rate RATE]
+        [--rate-limit RPS] [--task-duration SECONDS] [--sync-duration SECONDS]
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from typing import Any, Callable, Dict, Tuple
+
+from benchmarks.simulator import BigIPSimulator, SimulatorSettings
+from nornir.core import Nornir
+from nornir.core.configuration import Config, LoggingConfig
+from nornir.core.inventory import (
+    ConnectionOptions,
+    Defaults,
+    Groups,
+    Host,
+    Hosts,
+    Inventory,
+)
+from nornir.core.plugins.connections import ConnectionPluginRegister
+from nornir.plugins.runners import ThreadedRunner
+
+from nornir_f5.plugins.connections import CONNECTION_NAME
+from nornir_f5.plugins.tasks import (
+    atc,
+    bigip_cm_config_sync,
+    bigip_health_snapshot,
+    bigip_shared_file_transfer_uploads,
+    bigip_shared_iapp_lx_package,
+    bigip_sys_version,
+)
+
+PACKAGE_SIZE = 1024 * 1024  # bytes
+TESTS_DIR = os.path.join(os.path.dirname(__file__), "..", "tests")
+SCENARIOS: Dict[str, Tuple[Callable, Dict[str, Any]]] = {
+    "sys_version": (bigip_sys_version, {}),
+    "health_snapshot": (bigip_health_snapshot, {}),
+    "as3_post": (
+        atc,
+        {
+            "atc_method": "POST",
+            "atc_declaration_file": f"{TESTS_DIR}/declarations/atc/as3/simple_01.json",
+            "atc_delay": 0,
+        },
+    ),
+    "as3_get": (atc, {"atc_method": "GET", "atc_service": "AS3"}),
+    "do_post": (
+        atc,
+        {
+            "atc_method": "POST",
+            "atc_declaration_file": f"{TESTS_DIR}/declarations/atc/device/basic.json",
+            "atc_delay": 0,
+        },
+    ),
+    "ts_post": (
+        atc,
+        {
+            "atc_method": "POST",
+            "atc_declaration_file": f"{TESTS_DIR}/declarations/atc/telemetry/default_pull_consumer.json",  # noqa B950
+        },
+    ),
+    "config_sync": (
+        bigip_cm_config_sync,
+        {"device_group": "device_sync_group", "delay": 1},
+    ),
+    "upload": (
+        bigip_shared_file_transfer_uploads,
+        {"local_file_path": f"{TESTS_DIR}/files/myfile.txt"},
+    ),
+    "lx_package": (
+        bigip_shared_iapp_lx_package,
+        # The package file is generated, see `run`
+        {"package": None, "delay": 0},
+    ),
+}
+# Scenarios run (untimed) before others, to set up the state of the devices
+SETUPS = {"as3_get": "as3_post"}
+
+
+def _peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return rss / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+
+def _nornir(hosts: int, workers: int, simulator: BigIPSimulator) -> Nornir:
+    ConnectionPluginRegister.auto_register()
+    defaults = Defaults(
+        connection_options={
+            CONNECTION_NAME: ConnectionOptions(extras={"transport": simulator})
+        }
+    )
+    inventory = Inventory(
+        hosts=Hosts(
+            {
+                f"bigip{i}": Host(
+                    name=f"bigip{i}",
+                    hostname=f"bigip{i}.simulator",
+                    port=443,
+                    username="admin",
+                    password="admin",  # noqa S106
+                    platform="f5_bigip",
+                    defaults=defaults,
+                )
+                for i in range(hosts)
+            }
+        ),
+        groups=Groups(),
+        defaults=defaults,
+    )
+    return Nornir(
+        inventory=inventory,
+        runner=ThreadedRunner(num_workers=workers),
+        config=Config(logging=LoggingConfig(enabled=False)),
+    )
+
+
+def run(
+    scenario: str, hosts: int, workers: int, settings: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Runs a scenario against simulated devices.
+
+    Args:
+        scenario (str): The name of the scenario.
+        hosts (int): The number of devices.
+        workers (int): The number of Nornir workers.
+        settings (Dict[str, Any]): The settings of the simulator.
+
+    Returns:
+        Dict[str, Any]: The metrics of the run.
+    """
+    task, kwargs = SCENARIOS[scenario]
+    simulator = BigIPSimulator(SimulatorSettings(**settings))
+    nr = _nornir(hosts, workers, simulator)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if "package" in kwargs:
+            kwargs = {**kwargs, "package": f"{tmp_dir}/nornir_f5_benchmark.rpm"}
+            with open(kwargs["package"], "wb") as f:
+                f.write(os.urandom(PACKAGE_SIZE))
+
+        if scenario in SETUPS:
+            setup_task, setup_kwargs = SCENARIOS[SETUPS[scenario]]
+            nr.run(task=setup_task, **setup_kwargs)
+            simulator.requests.clear()
+
+        start = time.perf_counter()
+        result = nr.run(task=task, **kwargs)
+        wall_time = time.perf_counter() - start
+        nr.close_connections()
+
+    return {
+        "scenario": scenario,
+        "hosts": hosts,
+        "failed": len(result.failed_hosts),
+        "wall_time": wall_time,
+        "hosts_per_sec": hosts / wall_time,
+        "peak_rss_mb": _peak_rss_mb(),
+        "requests": sum(simulator.requests.values()),
+    }
+
+
+def main() -> None:
+    """Runs the benchmark and prints the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hosts", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS)
+    )
+    parser.add_argument("--workers", type=int, default=100, help="Nornir workers")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.005, help="seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=None, help="req/s")
+    parser.add_argument("--task-duration", type=float, default=0.1, help="seconds")
+    parser.add_argument("--sync-duration", type=float, default=0.1, help="seconds")
+    args = parser.parse_args()
+
+    settings = asdict(
+        SimulatorSettings(
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            rate_limit=args.rate_limit,
+            task_duration=args.task_duration,
+            sync_duration=args.sync_duration,
+            seed=0,
+        )
+    )
+    print(
+        f"{'scenario':<16} {'hosts':>6} {'failed':>6} {'wall s':>8} "
+        f"{'hosts/s':>9} {'peak MB':>8} {'requests':>9}"
+    )
+    context = multiprocessing.get_context("spawn")
+    for scenario in args.scenarios:
+        for hosts in args.hosts:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                metrics = executor.submit(
+                    run, scenario, hosts, args.workers, settings
+                ).result()
+            print(
+                f"{scenario:<16} {hosts:>6} {metrics['failed']:>6} "
+                f"{metrics['wall_time']:>8.2f} {metrics['hosts_per_sec']:>9.1f} "
+                f"{metrics['peak_rss_mb']:>8.1f} {metrics['requests']:>9}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,42 @@
 """Nornir F5 connections."""
 
+from nornir_f5.plugins.connections.breaker import CircuitBreaker
+from nornir_f5.plugins.connections.cassette import CassettePlayer, CassetteRecorder
+from nornir_f5.plugins.connections.codec import (
+    JSONCodec,
+    get_json_codec,
+    iter_json_object_members,
+    json_dumps,
+    json_loads,
+)
 from nornir_f5.plugins.connections.f5 import (
     CONNECTION_NAME,
+    CompressionMetrics,
+    CompressionStats,
     F5RestClient,
+    Transport,
     f5_rest_client,
 )
+from nornir_f5.plugins.connections.probe import probe_hosts
+from nornir_f5.plugins.connections.retry import RetryBudget, RetryPolicy, RetryRule
 
 __all__ = (
     "CONNECTION_NAME",
+    "CassettePlayer",
+    "CassetteRecorder",
+    "CircuitBreaker",
+    "CompressionMetrics",
+    "CompressionStats",
     "F5RestClient",
+    "JSONCodec",
+    "RetryBudget",
+    "RetryPolicy",
+    "RetryRule",
+    "Transport",
     "f5_rest_client",
+    "get_json_codec",
+    "iter_json_object_members",
+    "json_dumps",
+    "json_loads",
+    "probe_hosts",
 )
@@ -0,0 +1,155 @@
+"""Nornir F5 circuit breaker.
+
+Stops sending requests to a device which keeps failing (e.g. a wedged
+restjavad), so that the tasks fail fast instead of going through the full retry
+strategy again and again.
+
+The breaker of a host is closed while the requests succeed. It opens after a
+number of consecutive failures, rejecting all the requests for a cool-down
+period. It is then half-open: a single request is let through to probe the
+device, closing the breaker if it succeeds and opening it again otherwise.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict
+
+from requests import Response
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_COOL_DOWN = 30.0  # seconds
+FAILURE_STATUSES = {500, 502, 503, 504}
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+# The circuit breaker of each `host:port`, kept across the connections
+_breakers: Dict[str, "CircuitBreaker"] = {}
+_breakers_lock = threading.Lock()
+
+
+class CircuitBreaker:
+    """Circuit breaker of the requests sent to a device.
+
+    Attributes:
+        name (str): The name of the device (`host:port`).
+        failure_threshold (int): The number of consecutive failures opening the
+            breaker.
+        cool_down (float): The time (in seconds) the breaker stays open.
+        failures (int): The number of consecutive failures.
+        rejected (int): The number of requests rejected while open.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        cool_down: float = DEFAULT_COOL_DOWN,
+    ) -> None:
+        """Initializes the breaker, closed.
+
+        Args:
+            name (str): The name of the device (`host:port`).
+            failure_threshold (int): The number of consecutive failures opening
+                the breaker.
+            cool_down (float): The time (in seconds) the breaker stays open.
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cool_down = cool_down
+        self.failures = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._opened_at = 0.0
+        self._open = False
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        """Returns the state of the breaker.
+
+        Returns:
+            str: The state [closed, open, half-open].
+        """
+        with self._lock:
+            if not self._open:
+                return CLOSED
+            if self._probing or time.monotonic() - self._opened_at >= self.cool_down:
+                return HALF_OPEN
+            return OPEN
+
+    def _acquire(self) -> None:
+        with self._lock:
+            if not self._open:
+                return
+            if self._probing or time.monotonic() - self._opened_at < self.cool_down:
+                self.rejected += 1
+                raise Exception(
+                    f"The circuit breaker of {self.name} is open "
+                    f"({self.failures} consecutive failures)."
+                )
+            # Half-open: this request probes the device
+            self._probing = True
+
+    def _release(self, success: bool) -> None:
+        with self._lock:
+            self._probing = False
+            if success:
+                self.failures = 0
+                self._open = False
+                return
+            self.failures += 1
+            if self._open or self.failures >= self.failure_threshold:
+                self._open = True
+                self._opened_at = time.monotonic()
+
+    def call(
+        self, func: Callable[..., Response], *args: Any, **kwargs: Any
+    ) -> Response:
+        """Sends a request through the breaker.
+
+        Connection errors, exhausted retries and 5xx responses are failures.
+
+        Args:
+            func (Callable[..., Response]): The function sending the request.
+            *args (Any): The positional arguments of `func`.
+            **kwargs (Any): The keyword arguments of `func`.
+
+        Returns:
+            Response: The response.
+
+        Raises:
+            Exception: The exception of `func`.
+        """
+        self._acquire()
+        try:
+            response = func(*args, **kwargs)
+        except Exception:
+            self._release(False)
+            raise
+        self._release(response.status_code not in FAILURE_STATUSES)
+        return response
+
+
+def get_circuit_breaker(
+    name: str,
+    failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+    cool_down: float = DEFAULT_COOL_DOWN,
+) -> CircuitBreaker:
+    """Returns the circuit breaker of a device, shared by its connections.
+
+    Args:
+        name (str): The name of the device (`host:port`).
+        failure_threshold (int): The number of consecutive failures opening the
+            breaker, if created.
+        cool_down (float): The time (in seconds) the breaker stays open, if
+            created.
+
+    Returns:
+        CircuitBreaker: The circuit breaker.
+    """
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name, failure_threshold, cool_down)
+        return _breakers[name]
@@ -0,0 +1,259 @@
+"""Nornir F5 HTTP cassettes.
+
+Records the requests sent to F5 devices, with their responses and timings, into a
+cassette file, and replays them offline with their original or scaled timings.
+
+A cassette is a JSON lines file (gzip-compressed if its name ends with `.gz`)
+holding one interaction per line. Request bodies are not recorded, and
+authentication tokens are redacted.
+"""
+
+import base64
+import gzip
+import threading
+import time
+from typing import IO, Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+from requests import PreparedRequest, Response
+from requests.adapters import HTTPAdapter
+
+from nornir_f5.plugins.connections.codec import json_dumps, json_loads
+from nornir_f5.plugins.connections.f5 import LOGIN_URI, Transport
+
+CASSETTE_VERSION = 1
+REDACTED = "REDACTED"
+REDACTED_HEADERS = {"authorization", "cookie", "set-cookie", "x-f5-auth-token"}
+RECORDED_HEADERS = {"content-type", "content-range", "retry-after"}
+
+
+def _open(path: str, mode: str) -> IO[bytes]:
+    if path.endswith(".gz"):
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+
+def _encode_body(body: bytes) -> Dict[str, str]:
+    try:
+        return {"body": body.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"body_b64": base64.b64encode(body).decode("ascii")}
+
+
+def _decode_body(interaction: Dict[str, Any]) -> bytes:
+    if "body_b64" in interaction:
+        return base64.b64decode(interaction["body_b64"])
+    return interaction.get("body", "").encode("utf-8")
+
+
+class CassetteRecorder(Transport):
+    """Transport recording the interactions into a cassette file.
+
+    The connections recording into the same file share the same recorder, see
+    `get_recorder`.
+    """
+
+    def __init__(self, path: str, transport: Optional[Transport] = None) -> None:
+        """Initializes the recorder, truncating the cassette file.
+
+        Args:
+            path (str): The path of the cassette file.
+            transport (Optional[Transport]): The transport sending the requests.
+                If not provided, the requests are sent over the network.
+        """
+        self.path = path
+        self.transport = transport or Transport()
+        self._lock = threading.Lock()
+        self._secrets: Set[str] = set()
+        self._starts: Dict[str, float] = {}
+        with _open(path, "wb") as f:
+            f.write(json_dumps({"version": CASSETTE_VERSION}) + b"\n")
+
+    def _redact(self, text: str) -> str:
+        for secret in self._secrets:
+            text = text.replace(secret, REDACTED)
+        return text
+
+    def send(
+        self, adapter: HTTPAdapter, request: PreparedRequest, **kwargs: Any
+    ) -> Response:
+        """Sends a request and records its response.
+
+        Args:
+            adapter (HTTPAdapter): The transport adapter of the connection.
+            request (PreparedRequest): The request to send.
+            **kwargs (Any): The arguments of `HTTPAdapter.send`.
+
+        Returns:
+            Response: The response.
+        """
+        url = urlsplit(request.url)
+        start = time.monotonic()
+        resp = self.transport.send(adapter, request, **kwargs)
+        elapsed = time.monotonic() - start
+        # The body is read, so that it can be recorded
+        body = resp.content
+
+        with self._lock:
+            offset = start - self._starts.setdefault(url.netloc, start)
+            # Tokens are redacted wherever they appear afterwards
+            if url.path == LOGIN_URI and resp.ok:
+                self._secrets.add(resp.json()["token"]["token"])
+            headers = {
+                k: (REDACTED if k.lower() in REDACTED_HEADERS else v)
+                for k, v in resp.headers.items()
+                if k.lower() in RECORDED_HEADERS | REDACTED_HEADERS
+            }
+            interaction = {
+                "host": url.netloc,
+                "method": request.method,
+                "url": self._redact(url._replace(scheme="", netloc="").geturl()),
+                "offset": round(offset, 6),
+                "elapsed": round(elapsed, 6),
+                "status": resp.status_code,
+                "headers": headers,
+                **_encode_body(body),
+            }
+            if "body" in interaction:
+                interaction["body"] = self._redact(interaction["body"])
+            with _open(self.path, "ab") as f:
+                f.write(json_dumps(interaction) + b"\n")
+
+        return resp
+
+
+class CassettePlayer(Transport):
+    """Transport replaying the interactions of a cassette file.
+
+    The requests of each host are served from the interactions recorded for that
+    host, or for the first recorded host if there is none. `GET` requests are
+    served with the last interaction recorded before the time elapsed since the
+    login of the host, so that polling loops follow the recorded timeline; other
+    requests, and all requests when replaying without delay, are served in the
+    recorded order. Each login restarts the timeline.
+    """
+
+    def __init__(self, path: str, latency_scale: float = 1.0) -> None:
+        """Loads the cassette file.
+
+        Args:
+            path (str): The path of the cassette file.
+            latency_scale (float): The factor applied to the recorded latencies
+                and timeline. `0` replays the interactions without any delay.
+
+        Raises:
+            Exception: The raised exception when the cassette is not valid.
+        """
+        self.path = path
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._interactions: Dict[Tuple[str, str, str], List[Dict[str, Any]]] = {}
+        self._hosts: List[str] = []
+        self._starts: Dict[str, float] = {}
+        self._cursors: Dict[Tuple[str, str, str], int] = {}
+
+        with _open(path, "rb") as f:
+            lines = f.read().splitlines()
+        if not lines or json_loads(lines[0]).get("version") != CASSETTE_VERSION:
+            raise Exception(f"Cassette {path!r} is not valid.")
+        for line in lines[1:]:
+            interaction = json_loads(line)
+            key = (interaction["host"], interaction["method"], interaction["url"])
+            self._interactions.setdefault(key, []).append(interaction)
+            if interaction["host"] not in self._hosts:
+                self._hosts.append(interaction["host"])
+
+    def _select(
+        self, host: str, key: Tuple[str, str, str], now: float
+    ) -> Dict[str, Any]:
+        interactions = self._interactions[key]
+        cursor = self._cursors.get((host, *key[1:]), 0)
+        if key[1] == "GET" and self.latency_scale:
+            # Follow the timeline, without going back in time
+            offset = (now - self._starts[host]) / self.latency_scale
+            while (
+                cursor + 1 < len(interactions)
+                and interactions[cursor + 1]["offset"] <= offset
+            ):
+                cursor += 1
+            self._cursors[(host, *key[1:])] = cursor
+            return interactions[cursor]
+        self._cursors[(host, *key[1:])] = cursor + 1
+        return interactions[min(cursor, len(interactions) - 1)]
+
+    def send(
+        self, adapter: HTTPAdapter, request: PreparedRequest, **kwargs: Any
+    ) -> Response:
+        """Serves a request from the cassette.
+
+        Args:
+            adapter (HTTPAdapter): The transport adapter of the connection.
+            request (PreparedRequest): The request to serve.
+            **kwargs (Any): The arguments of `HTTPAdapter.send`.
+
+        Returns:
+            Response: The recorded response.
+
+        Raises:
+            Exception: The raised exception when the request was not recorded.
+        """
+        url = urlsplit(request.url)
+        host = url.netloc
+        path = url._replace(scheme="", netloc="").geturl()
+        now = time.monotonic()
+
+        with self._lock:
+            if url.path == LOGIN_URI or host not in self._starts:
+                self._starts[host] = now
+                self._cursors = {k: v for k, v in self._cursors.items() if k[0] != host}
+            recorded_host = host if host in self._hosts else self._hosts[0]
+            key = (recorded_host, request.method, path)
+            if key not in self._interactions:
+                raise Exception(f"No recorded response for {request.method} {path}.")
+            interaction = self._select(host, key, now)
+
+        time.sleep(interaction["elapsed"] * self.latency_scale)
+        return self.build_response(
+            adapter,
+            request,
+            interaction["status"],
+            _decode_body(interaction),
+            interaction["headers"],
+        )
+
+
+_recorders: Dict[str, CassetteRecorder] = {}
+_players: Dict[Tuple[str, float], CassettePlayer] = {}
+_cassettes_lock = threading.Lock()
+
+
+def get_recorder(path: str, transport: Optional[Transport] = None) -> CassetteRecorder:
+    """Returns the recorder of a cassette file, shared by all connections.
+
+    Args:
+        path (str): The path of the cassette file.
+        transport (Optional[Transport]): The transport sending the requests.
+
+    Returns:
+        CassetteRecorder: The recorder.
+    """
+    with _cassettes_lock:
+        if path not in _recorders:
+            _recorders[path] = CassetteRecorder(path, transport)
+        return _recorders[path]
+
+
+def get_player(path: str, latency_scale: float = 1.0) -> CassettePlayer:
+    """Returns the player of a cassette file, shared by all connections.
+
+    Args:
+        path (str): The path of the cassette file.
+        latency_scale (float): The factor applied to the recorded latencies.
+
+    Returns:
+        CassettePlayer: The player.
+    """
+    with _cassettes_lock:
+        if (path, latency_scale) not in _players:
+            _players[(path, latency_scale)] = CassettePlayer(path, latency_scale)
+        return _players[(path, latency_scale)]
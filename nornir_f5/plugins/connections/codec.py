@@ -0,0 +1,275 @@
+"""Nornir F5 JSON codec.
+
+Encodes and decodes the JSON bodies exchanged with F5 devices using the fastest
+available backend (orjson), falling back to the standard library.
+"""
+
+import json
+import re
+from typing import (
+    Any,
+    Callable,
+    Container,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+class JSONCodec:
+    """JSON encoder/decoder backed by a JSON library.
+
+    Attributes:
+        name (str): The name of the backend.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        dumps: Callable[[Any], bytes],
+        loads: Callable[[Union[bytes, str]], Any],
+    ) -> None:
+        """Initializes the codec.
+
+        Args:
+            name (str): The name of the backend.
+            dumps (Callable[[Any], bytes]): The function serializing an object
+                to UTF-8 encoded JSON.
+            loads (Callable[[Union[bytes, str]], Any]): The function deserializing
+                a JSON document.
+        """
+        self.name = name
+        self._dumps = dumps
+        self._loads = loads
+
+    def dumps(self, obj: Any) -> bytes:
+        """Serializes an object to UTF-8 encoded JSON.
+
+        Args:
+            obj (Any): The object to serialize.
+
+        Returns:
+            bytes: The JSON document.
+        """
+        return self._dumps(obj)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        """Deserializes a JSON document.
+
+        Args:
+            data (Union[bytes, str]): The JSON document.
+
+        Returns:
+            Any: The deserialized object.
+        """
+        return self._loads(data)
+
+
+JSON_CODECS: Dict[str, JSONCodec] = {
+    "json": JSONCodec(
+        name="json",
+        dumps=lambda obj: json.dumps(obj, separators=(",", ":")).encode("utf-8"),
+        loads=json.loads,
+    ),
+}
+if orjson is not None:  # pragma: no branch
+    JSON_CODECS["orjson"] = JSONCodec(
+        name="orjson", dumps=orjson.dumps, loads=orjson.loads
+    )
+
+# Ordered from the fastest to the slowest backend
+JSON_CODEC_PREFERENCE = ["orjson", "json"]
+
+_JSON_STRING_SPECIAL_CHARS = re.compile(rb'["\\]')
+_JSON_STRUCTURAL_CHARS = re.compile(rb'[{}\[\]",]')
+_JSON_WHITESPACE = b" \t\r\n"
+
+
+def get_json_codec(name: Optional[str] = None) -> JSONCodec:
+    """Returns a JSON codec.
+
+    Args:
+        name (Optional[str]): The name of the backend. Accepted values include
+            [orjson, json]. If not provided, the fastest installed backend is used.
+
+    Returns:
+        JSONCodec: The JSON codec.
+
+    Raises:
+        Exception: The raised exception when the backend is not available.
+    """
+    if name is None:
+        name = next(n for n in JSON_CODEC_PREFERENCE if n in JSON_CODECS)
+    if name not in JSON_CODECS:
+        raise Exception(f"JSON backend {name!r} is not available.")
+    return JSON_CODECS[name]
+
+
+def json_dumps(obj: Any) -> bytes:
+    """Serializes an object to JSON with the default codec.
+
+    Args:
+        obj (Any): The object to serialize.
+
+    Returns:
+        bytes: The JSON document.
+    """
+    return get_json_codec().dumps(obj)
+
+
+def json_loads(data: Union[bytes, str]) -> Any:
+    """Deserializes a JSON document with the default codec.
+
+    Args:
+        data (Union[bytes, str]): The JSON document.
+
+    Returns:
+        Any: The deserialized object.
+    """
+    return get_json_codec().loads(data)
+
+
+class _ChunkReader:
+    """Reads a JSON document from chunks, buffering only the unread part."""
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self._chunks = iter(chunks)
+        self.buf = b""
+        self.pos = 0
+
+    def _fill(self) -> None:
+        for chunk in self._chunks:
+            if chunk:
+                self.buf = self.buf[self.pos :] + chunk
+                self.pos = 0
+                return
+        raise ValueError("Unexpected end of the JSON document.")
+
+    def next_char(self) -> bytes:
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _JSON_WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                self.pos += 1
+                return self.buf[self.pos - 1 : self.pos]
+            self._fill()
+
+    def read_string(self, capture: bool) -> bytes:
+        # The opening quote has already been read
+        parts = [b'"'] if capture else []
+        escaped = False
+        while True:
+            if self.pos >= len(self.buf):
+                self._fill()
+            if escaped:
+                # Skip the escaped character
+                if capture:
+                    parts.append(self.buf[self.pos : self.pos + 1])
+                self.pos += 1
+                escaped = False
+                continue
+
+            match = _JSON_STRING_SPECIAL_CHARS.search(self.buf, self.pos)
+            end = len(self.buf) if match is None else match.end()
+            if capture:
+                parts.append(self.buf[self.pos : end])
+            self.pos = end
+            if match is None:
+                continue
+            if match.group() == b'"':
+                return b"".join(parts)
+            escaped = True
+
+    def _next_structural_char(self, parts: Optional[List[bytes]]) -> bytes:
+        # The bytes skipped are appended to `parts`, unless it is `None`
+        while True:
+            match = _JSON_STRUCTURAL_CHARS.search(self.buf, self.pos)
+            end = len(self.buf) if match is None else match.start()
+            if parts is not None:
+                parts.append(self.buf[self.pos : end])
+            self.pos = end
+            if match is not None:
+                self.pos += 1
+                return match.group()
+            self._fill()
+
+    def read_value(self, capture: bool) -> Tuple[Optional[bytes], bytes]:
+        parts: Optional[List[bytes]] = [] if capture else None
+        depth = 0
+        while True:
+            char = self._next_structural_char(parts)
+            if char == b'"':
+                string = self.read_string(capture)
+                if parts is not None:
+                    parts.append(string)
+                continue
+            if char in (b"{", b"["):
+                depth += 1
+            elif depth == 0:
+                # End of the member value
+                return (b"".join(parts) if parts is not None else None), char
+            elif char in (b"}", b"]"):
+                depth -= 1
+            if parts is not None:
+                parts.append(char)
+
+
+def iter_json_object_members(
+    chunks: Iterable[bytes],
+    keys: Optional[Container[str]] = None,
+    codec: Optional[JSONCodec] = None,
+) -> Iterator[Tuple[str, Any]]:
+    """Incrementally decodes the members of a JSON object.
+
+    Only the members being decoded are buffered: the values of the other
+    members are skipped as they are read, so the memory used is proportional
+    to the chunk size and the size of the selected members.
+
+    Args:
+        chunks (Iterable[bytes]): The chunks of the JSON document.
+        keys (Optional[Container[str]]): The keys of the members to decode.
+            If not provided, all members are decoded.
+        codec (Optional[JSONCodec]): The JSON codec used to decode the members.
+
+    Yields:
+        Tuple[str, Any]: The key and decoded value of each selected member.
+
+    Raises:
+        ValueError: The raised exception when the JSON document is not an object
+            or is malformed.
+    """
+    codec = codec or get_json_codec()
+    reader = _ChunkReader(chunks)
+
+    if reader.next_char() != b"{":
+        raise ValueError("The JSON document is not an object.")
+    char = reader.next_char()
+    if char == b"}":
+        return
+
+    while True:
+        if char != b'"':
+            raise ValueError("The JSON document is malformed.")
+        key = codec.loads(reader.read_string(capture=True))
+        if reader.next_char() != b":":
+            raise ValueError("The JSON document is malformed.")
+
+        capture = keys is None or key in keys
+        value, char = reader.read_value(capture)
+        if capture:
+            yield key, codec.loads(value)
+
+        if char == b"}":
+            return
+        if char != b",":
+            raise ValueError("The JSON document is malformed.")
+        char = reader.next_char()
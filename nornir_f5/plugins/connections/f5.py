@@ -3,56 +3,310 @@
 Allows to interact with F5 devices.
 """
 
+import gzip
+import io
+import threading
 from base64 import b64encode
+from dataclasses import dataclass
+from http import HTTPStatus
 from typing import Any, Dict, Optional
 
 import requests
 import urllib3
 from nornir.core import Task
 from nornir.core.configuration import Config
-from requests import Response
+from requests import PreparedRequest, Response
 from requests.adapters import HTTPAdapter
-from requests_toolbelt.utils import dump
+from urllib3.response import HTTPResponse
 from urllib3.util import Retry
 
-urllib3.disable_warnings()
+from nornir_f5.plugins.connections.breaker import (
+    DEFAULT_COOL_DOWN,
+    DEFAULT_FAILURE_THRESHOLD,
+    get_circuit_breaker,
+)
+from nornir_f5.plugins.connections.codec import JSONCodec, get_json_codec
+from nornir_f5.plugins.connections.probe import get_probe_error, probe_key
+from nornir_f5.plugins.connections.registry import (
+    acquire_connection,
+    invalidate_connection,
+    release_connection,
+)
+from nornir_f5.plugins.connections.retry import DEFAULT_RETRY_POLICY
 
 CONNECTION_NAME = "f5"
-DEFAULT_RETRY_STRATEGY = Retry(
-    total=3,
-    backoff_factor=1,
-    status_forcelist=[429, 500, 502, 503, 504],
-)
+DEFAULT_COMPRESS_MIN_SIZE = 64 * 1024  # bytes
 DEFAULT_TIMEOUT = 5  # seconds
 LOGIN_URI = "/mgmt/shared/authn/login"
 TOKENS_URI = "/mgmt/shared/authz/tokens"
 
 
+@dataclass
+class CompressionMetrics:
+    """Compression metrics of an HTTP response.
+
+    Attributes:
+        url (str): The URL of the request.
+        encoding (Optional[str]): The content encoding of the response.
+        wire_bytes (int): The size of the body received over the network.
+        decoded_bytes (int): The size of the decoded body.
+    """
+
+    url: str
+    encoding: Optional[str]
+    wire_bytes: int
+    decoded_bytes: int
+
+    @property
+    def ratio(self) -> float:
+        """Returns the decoded size divided by the wire size.
+
+        Returns:
+            float: The compression ratio.
+        """
+        return self.decoded_bytes / self.wire_bytes if self.wire_bytes else 1.0
+
+
+class CompressionStats:
+    """Aggregated compression metrics of a connection.
+
+    Tracks both the responses received and the request bodies sent compressed.
+    """
+
+    def __init__(self) -> None:
+        """Initializes the counters."""
+        self._lock = threading.Lock()
+        self.responses = 0
+        self.compressed_responses = 0
+        self.response_wire_bytes = 0
+        self.response_decoded_bytes = 0
+        self.compressed_requests = 0
+        self.request_raw_bytes = 0
+        self.request_wire_bytes = 0
+
+    def add_response(self, metrics: CompressionMetrics) -> None:
+        """Adds the metrics of a response.
+
+        Args:
+            metrics (CompressionMetrics): The compression metrics of the response.
+        """
+        with self._lock:
+            self.responses += 1
+            if metrics.encoding:
+                self.compressed_responses += 1
+            self.response_wire_bytes += metrics.wire_bytes
+            self.response_decoded_bytes += metrics.decoded_bytes
+
+    def add_request(self, raw_bytes: int, wire_bytes: int) -> None:
+        """Adds the sizes of a compressed request body.
+
+        Args:
+            raw_bytes (int): The size of the body before compression.
+            wire_bytes (int): The size of the body sent over the network.
+        """
+        with self._lock:
+            self.compressed_requests += 1
+            self.request_raw_bytes += raw_bytes
+            self.request_wire_bytes += wire_bytes
+
+    @property
+    def ratio(self) -> float:
+        """Returns the overall compression ratio of the responses.
+
+        Returns:
+            float: The compression ratio.
+        """
+        if not self.response_wire_bytes:
+            return 1.0
+        return self.response_decoded_bytes / self.response_wire_bytes
+
+
+class Transport:
+    """Transport of the requests of an F5 connection.
+
+    The default transport sends the requests over the network. Custom transports,
+    set with the `transport` extra, can serve the requests otherwise (e.g. from a
+    simulator) by overriding `send`.
+    """
+
+    def send(
+        self, adapter: HTTPAdapter, request: PreparedRequest, **kwargs: Any
+    ) -> Response:
+        """Sends a request.
+
+        Args:
+            adapter (HTTPAdapter): The transport adapter of the connection.
+            request (PreparedRequest): The request to send.
+            **kwargs (Any): The arguments of `HTTPAdapter.send`.
+
+        Returns:
+            Response: The response.
+        """
+        return HTTPAdapter.send(adapter, request, **kwargs)
+
+    @staticmethod
+    def build_response(
+        adapter: HTTPAdapter,
+        request: PreparedRequest,
+        status: int,
+        body: bytes = b"",
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Response:
+        """Builds a response as if it was received over the network.
+
+        Args:
+            adapter (HTTPAdapter): The transport adapter of the connection.
+            request (PreparedRequest): The request.
+            status (int): The HTTP status code.
+            body (bytes): The body, encoded as per its `Content-Encoding` header.
+            headers (Optional[Dict[str, str]]): The headers.
+
+        Returns:
+            Response: The response.
+        """
+        raw = HTTPResponse(
+            body=io.BytesIO(body),
+            headers=headers or {},
+            status=status,
+            reason=HTTPStatus(status).phrase,
+            preload_content=False,
+            decode_content=True,
+            request_method=request.method,
+            request_url=request.url,
+        )
+        return adapter.build_response(request, raw)
+
+
+class _F5Response(Response):
+    """Custom `Response` decoding JSON bodies with the connection's codec."""
+
+    codec: JSONCodec = get_json_codec("json")
+
+    def json(self, **kwargs) -> Any:
+        """Returns the JSON-decoded content of the response.
+
+        Args:
+            **kwargs: Unused, kept for compatibility with `Response.json`.
+
+        Returns:
+            Any: The decoded content.
+        """
+        return self.codec.loads(self.content)
+
+
+class _F5Session(requests.Session):
+    """Custom `Session` encoding JSON bodies with the connection's codec."""
+
+    def __init__(self, codec: JSONCodec) -> None:
+        """Initializes the session.
+
+        Args:
+            codec (JSONCodec): The JSON codec.
+        """
+        super().__init__()
+        self.codec = codec
+
+    def request(self, method, url, *args, **kwargs) -> Response:  # noqa D102
+        body = kwargs.pop("json", None)
+        if body is not None:
+            headers = dict(kwargs.get("headers") or {})
+            headers.setdefault("Content-Type", "application/json")
+            kwargs["data"] = self.codec.dumps(body)
+            kwargs["headers"] = headers
+        return super().request(method, url, *args, **kwargs)
+
+
 class _TimeoutHTTPAdapter(HTTPAdapter):
     """Custom `Transport Adapter` with a default timeout.
 
-    This class allows to set a default timeout for all HTTP calls.
+    This class allows to set a default timeout for all HTTP calls, to retry each
+    request as per the retry policy, and to compress large request bodies.
     """
 
     def __init__(self, *args, **kwargs):
+        # The retry strategy of the request sent by each thread
+        self._local = threading.local()
+        self.retry_policy = kwargs.pop("retry_policy", DEFAULT_RETRY_POLICY)
         self.timeout = DEFAULT_TIMEOUT
         if "timeout" in kwargs:
             self.timeout = kwargs["timeout"]
             del kwargs["timeout"]
+        self.compress_min_size = kwargs.pop("compress_min_size", None)
+        self.compression_stats = kwargs.pop("compression_stats", CompressionStats())
+        self.json_codec = kwargs.pop("json_codec", get_json_codec())
+        self.transport = kwargs.pop("transport", Transport())
+        self.circuit_breaker = kwargs.pop("circuit_breaker", None)
         super().__init__(*args, **kwargs)
 
+    def _compress(self, request) -> None:
+        body = request.body
+        if (
+            self.compress_min_size is None
+            or not isinstance(body, bytes)
+            or len(body) < self.compress_min_size
+            or "Content-Encoding" in request.headers
+            or "Content-Range" in request.headers
+        ):
+            return
+
+        compressed = gzip.compress(body)
+        request.body = compressed
+        request.headers["Content-Encoding"] = "gzip"
+        request.headers["Content-Length"] = str(len(compressed))
+        self.compression_stats.add_request(len(body), len(compressed))
+
+    @property
+    def max_retries(self) -> Retry:
+        return getattr(self._local, "max_retries", self._max_retries)
+
+    @max_retries.setter
+    def max_retries(self, value: Retry) -> None:
+        self._max_retries = value
+
+    def build_response(self, req, resp) -> Response:
+        response = super().build_response(req, resp)
+        response.__class__ = _F5Response
+        response.codec = self.json_codec
+        return response
+
     def send(self, request, **kwargs) -> Response:
         timeout = kwargs.get("timeout")
         if timeout is None:
             kwargs["timeout"] = self.timeout
-        return super().send(request, **kwargs)
+        self._compress(request)
+        self._local.max_retries = self.retry_policy.for_request(request)
+        self.retry_policy.budget.deposit()
+        if self.circuit_breaker is None:
+            return self.transport.send(self, request, **kwargs)
+        return self.circuit_breaker.call(self.transport.send, self, request, **kwargs)
 
 
 def _assert_status_hook(response: Response, *args, **kwargs) -> None:
     response.raise_for_status()
 
 
+def _compression_hook(stats: CompressionStats):
+    def hook(response: Response, *args, **kwargs) -> None:
+        # Streamed bodies are left untouched
+        if kwargs.get("stream"):
+            return
+        decoded_bytes = len(response.content)
+        metrics = CompressionMetrics(
+            url=response.url,
+            encoding=response.headers.get("Content-Encoding"),
+            wire_bytes=response.raw.tell() if response.raw else decoded_bytes,
+            decoded_bytes=decoded_bytes,
+        )
+        response.compression_metrics = metrics
+        stats.add_response(metrics)
+
+    return hook
+
+
 def _logging_hook(response: Response, *args, **kwargs) -> None:
+    # Only loaded when debugging
+    from requests_toolbelt.utils import dump
+
     data = dump.dump_all(response)
     print(data.decode("utf-8"))
 
@@ -63,8 +317,44 @@ class F5RestClient:
     This plugin allows to make calls to an F5 REST server.
 
     Authentication is handled automatically.
+
+    Responses are negotiated with the default `Accept-Encoding` of requests
+    (gzip, deflate), and large request bodies can optionally be sent
+    gzip-compressed. Compression metrics are collected in `compression_stats`.
+
+    JSON bodies are encoded and decoded with the fastest installed JSON backend
+    (see `nornir_f5.plugins.connections.codec`), unless the `json_backend` extra
+    is set.
+
+    Requests are sent over the network, unless a `Transport` is set in the
+    `transport` extra. They can be recorded into a cassette file set in the
+    `record_cassette` extra, and replayed from the cassette file set in the
+    `replay_cassette` extra, with the latencies scaled by `replay_latency_scale`
+    (see `nornir_f5.plugins.connections.cassette`).
+
+    When the `circuit_breaker` extra is set, the requests to a device failing
+    `circuit_breaker_threshold` times in a row are rejected for
+    `circuit_breaker_cool_down` seconds, then a single request probes the device
+    (see `nornir_f5.plugins.connections.breaker`).
+
+    The requests are retried as per the `RetryPolicy` set in the `retry_policy`
+    extra, or the default policy: the idempotent requests are retried on errors
+    and transient statuses, within a retry budget shared by the connections
+    (see `nornir_f5.plugins.connections.retry`).
+
+    When the `shared_connection` extra is set, the hosts with the same hostname,
+    port, username and authentication mode (basic, or the login provider of the
+    token), such as the aliases of a device, share one connection. It is opened
+    with the extras of the first host, and closed once all the hosts closed it
+    (see `nornir_f5.plugins.connections.registry`).
+
+    Attributes:
+        shared_key (Optional[tuple]): The key of the shared connection, if any.
     """
 
+    shared_key: Optional[tuple] = None
+    _shared_client: Optional["F5RestClient"] = None
+
     def open(  # noqa A003
         self,
         hostname: Optional[str],
@@ -77,7 +367,7 @@ class F5RestClient:
     ) -> None:
         """Gets a token and opens the connection.
 
-        Uses a custom `Transport Adapter` to provide default timeout and retry strategy.
+        Uses a custom `Transport Adapter` to provide default timeout and retry policy.
 
         Args:
             hostname (Optional[str]): The hostname of the device.
@@ -87,18 +377,85 @@ class F5RestClient:
             platform (Optional[str]): The device family platform.
             extras (Optional[Dict[str, Any]): The extra variables.
             configuration (Optional[Config]): The configuration.
+
+        Raises:
+            Exception: The raised exception when the host is unreachable.
         """
-        session = requests.Session()
+        # Fail fast when the probe found the host unreachable
+        probe_error = get_probe_error(probe_key(hostname, port))
+        if probe_error:
+            raise Exception(f"Host {hostname}:{port} is unreachable: {probe_error}.")
+
+        if not extras.get("shared_connection", False):
+            self._open(hostname, username, password, port, extras)
+            return
+
+        # The aliases of the device share the connection of the first one
+        auth = (
+            "basic"
+            if extras.get("basic_auth", False)
+            else extras.get("login_provider_name", "tmos")
+        )
+        self.shared_key = (hostname, port, username, auth)
+        client = acquire_connection(
+            self.shared_key,
+            lambda: self._open(hostname, username, password, port, extras),
+        )
+        vars(self).update(vars(client))
+        self._shared_client = client
+
+    def _open(
+        self,
+        hostname: Optional[str],
+        username: Optional[str],
+        password: Optional[str],
+        port: Optional[int],
+        extras: Dict[str, Any],
+    ) -> "F5RestClient":
+        # Imported here, as the cassettes depend on this module
+        from nornir_f5.plugins.connections.cassette import get_player, get_recorder
+
+        transport = extras.get("transport", None)
+        if extras.get("replay_cassette"):
+            transport = get_player(
+                extras["replay_cassette"], extras.get("replay_latency_scale", 1.0)
+            )
+        if extras.get("record_cassette"):
+            transport = get_recorder(extras["record_cassette"], transport)
+
+        json_codec = get_json_codec(extras.get("json_backend", None))
+        session = _F5Session(codec=json_codec)
         session.verify = extras.get("validate_certs", False)
+        if not session.verify:
+            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-        hooks = [_assert_status_hook]
+        self.compression_stats = CompressionStats()
+        hooks = [_compression_hook(self.compression_stats), _assert_status_hook]
         if extras.get("debug"):
             hooks.append(_logging_hook)
         session.hooks["response"] = hooks
 
+        circuit_breaker = None
+        if extras.get("circuit_breaker", False):
+            circuit_breaker = get_circuit_breaker(
+                f"{hostname}:{port}",
+                extras.get("circuit_breaker_threshold", DEFAULT_FAILURE_THRESHOLD),
+                extras.get("circuit_breaker_cool_down", DEFAULT_COOL_DOWN),
+            )
+        self.circuit_breaker = circuit_breaker
+
         kwargs = {
-            "max_retries": DEFAULT_RETRY_STRATEGY,
+            "circuit_breaker": circuit_breaker,
+            "compress_min_size": (
+                extras.get("compress_min_size", DEFAULT_COMPRESS_MIN_SIZE)
+                if extras.get("compress_requests", False)
+                else None
+            ),
+            "compression_stats": self.compression_stats,
+            "json_codec": json_codec,
+            "retry_policy": extras.get("retry_policy", None),
             "timeout": extras.get("timeout", None),
+            "transport": transport,
         }
         adapter = _TimeoutHTTPAdapter(
             **{k: v for k, v in kwargs.items() if v is not None}
@@ -129,9 +486,29 @@ class F5RestClient:
                 session.patch(f"https://{self.host}{TOKENS_URI}/{token}", json=data)
 
         self.connection = session
+        return self
+
+    def invalidate(self) -> None:
+        """Invalidates the connection, before re-opening it.
+
+        Used when the token is no longer valid (e.g. once the device
+        restarted). A shared connection is then re-opened by the next alias
+        opening it, instead of being reused by the aliases still holding it.
+        """
+        if self.shared_key is not None:
+            invalidate_connection(self.shared_key, self._shared_client)
 
     def close(self) -> None:
-        """Deletes the token and closes the connection."""
+        """Deletes the token and closes the connection.
+
+        A shared connection is only closed by the last alias releasing it.
+        """
+        if self.shared_key is not None:
+            release_connection(self.shared_key, F5RestClient._close)
+            return
+        self._close()
+
+    def _close(self) -> None:
         token = self.connection.headers.get("X-F5-Auth-Token", None)
         if token:
             self.connection.delete(f"https://{self.host}{TOKENS_URI}/{token}")
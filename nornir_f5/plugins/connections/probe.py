@@ -0,0 +1,131 @@
+"""Nornir F5 reachability probe.
+
+Probes the hosts of an inventory concurrently (TCP connect and TLS handshake with a
+short deadline) before running the tasks. The unreachable hosts are marked as
+failed, so that the tasks skip them, and remembered, so that opening a connection
+to them fails immediately instead of waiting for the timeouts and retries.
+"""
+
+import asyncio
+import ssl
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from nornir.core import Nornir
+
+DEFAULT_PROBE_CONCURRENCY = 256
+DEFAULT_PROBE_TIMEOUT = 2.0  # seconds
+DEFAULT_PROBE_TTL = 300.0  # seconds
+
+# The expiry time and error of each unreachable `host:port`
+_unreachable: Dict[str, Tuple[float, str]] = {}
+_unreachable_lock = threading.Lock()
+
+
+def probe_key(hostname: Optional[str], port: Optional[int]) -> str:
+    """Returns the key of a host in the probe results.
+
+    Args:
+        hostname (Optional[str]): The hostname of the F5 connection.
+        port (Optional[int]): The port of the F5 connection.
+
+    Returns:
+        str: The `hostname:port` of the host.
+    """
+    return f"{hostname}:{port}"
+
+
+def get_probe_error(host: str) -> Optional[str]:
+    """Returns the error of the last probe of an unreachable host, if not expired.
+
+    Args:
+        host (str): The `hostname:port` of the host (see `probe_key`).
+
+    Returns:
+        Optional[str]: The error, or `None` if the host was not found unreachable.
+    """
+    with _unreachable_lock:
+        expiry, error = _unreachable.get(host, (0.0, None))
+        if expiry <= time.monotonic():
+            _unreachable.pop(host, None)
+            return None
+        return error
+
+
+async def _probe(hostname: str, port: int, timeout: float, tls: bool) -> Optional[str]:
+    context = None
+    if tls:
+        # Only the handshake is checked, not the certificate
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    try:
+        _reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(hostname, port, ssl=context), timeout
+        )
+    except asyncio.TimeoutError:
+        return f"Timed out after {timeout} seconds"
+    except OSError as e:
+        return str(e) or type(e).__name__
+    writer.close()
+    return None
+
+
+def probe_hosts(
+    nornir: Nornir,
+    timeout: float = DEFAULT_PROBE_TIMEOUT,
+    tls: bool = True,
+    ttl: float = DEFAULT_PROBE_TTL,
+    max_concurrency: int = DEFAULT_PROBE_CONCURRENCY,
+) -> Dict[str, Optional[str]]:
+    """Probes the hosts concurrently, and marks the unreachable hosts as failed.
+
+    The unreachable hosts are remembered for `ttl` seconds: opening an F5
+    connection to them fails immediately. Must not be called from a running event
+    loop.
+
+    Args:
+        nornir (Nornir): The Nornir object holding the hosts to probe.
+        timeout (float): The deadline (in seconds) of the probe of each host.
+        tls (bool): Whether to complete the TLS handshake, or only connect.
+        ttl (float): The time (in seconds) the unreachable hosts are remembered.
+        max_concurrency (int): The maximum number of concurrent probes.
+
+    Returns:
+        Dict[str, Optional[str]]: The error of each unreachable host, or `None`
+            for each reachable host.
+    """
+    # Imported here, as the connection plugin imports this module
+    from nornir_f5.plugins.connections.f5 import CONNECTION_NAME
+
+    # The hosts are probed with the parameters of their F5 connection
+    params = {
+        name: host.get_connection_parameters(CONNECTION_NAME)
+        for name, host in nornir.inventory.hosts.items()
+    }
+
+    async def probe_all() -> Tuple[Optional[str], ...]:
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def probe(hostname: str, port: int) -> Optional[str]:
+            async with semaphore:
+                return await _probe(hostname, port, timeout, tls)
+
+        return await asyncio.gather(
+            *(probe(p.hostname or name, p.port or 443) for name, p in params.items())
+        )
+
+    results = asyncio.run(probe_all())
+    errors = {name: results[i] for i, name in enumerate(params)}
+
+    expiry = time.monotonic() + ttl
+    with _unreachable_lock:
+        for name, error in errors.items():
+            host = probe_key(params[name].hostname, params[name].port)
+            if error is None:
+                _unreachable.pop(host, None)
+                continue
+            _unreachable[host] = (expiry, error)
+            nornir.data.failed_hosts.add(name)
+    return errors
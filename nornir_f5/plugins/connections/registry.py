@@ -0,0 +1,97 @@
+"""Nornir F5 shared connections registry.
+
+Allows the hosts of an inventory which are aliases of the same device (e.g. per
+partition or per role) to share one connection to it, instead of each logging
+in and keeping its own token and pool of sockets.
+
+The connections are keyed by device and credentials, and counted by reference:
+the first alias opens the connection, and the last one to release it closes it.
+A connection which is no longer valid (e.g. its token, once the device restarted)
+is invalidated, so that the next alias acquiring it opens a new one.
+"""
+
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class _SharedConnection:
+    """Connection shared by the aliases of a device."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.refs = 0
+        self.client: Optional[Any] = None
+
+
+# The shared connections, by device and credentials
+_connections: Dict[Hashable, _SharedConnection] = {}
+_connections_lock = threading.Lock()
+
+
+def acquire_connection(key: Hashable, open_client: Callable[[], Any]) -> Any:
+    """Returns the shared connection of a key, opening it if needed.
+
+    Args:
+        key (Hashable): The key of the connection.
+        open_client (Callable[[], Any]): The function opening the connection.
+
+    Returns:
+        Any: The connection.
+
+    Raises:
+        Exception: The exception of `open_client`.
+    """
+    with _connections_lock:
+        shared = _connections.setdefault(key, _SharedConnection())
+        shared.refs += 1
+
+    # Only one alias opens the connection, the others wait for it
+    try:
+        with shared.lock:
+            if shared.client is None:
+                shared.client = open_client()
+            return shared.client
+    except Exception:
+        release_connection(key, lambda client: None)
+        raise
+
+
+def release_connection(key: Hashable, close_client: Callable[[Any], None]) -> None:
+    """Releases the shared connection of a key, closing it if no longer used.
+
+    Args:
+        key (Hashable): The key of the connection.
+        close_client (Callable[[Any], None]): The function closing the
+            connection.
+    """
+    with _connections_lock:
+        shared = _connections[key]
+        shared.refs -= 1
+        if shared.refs:
+            return
+        del _connections[key]
+
+    if shared.client is not None:
+        close_client(shared.client)
+
+
+def invalidate_connection(key: Hashable, client: Any) -> None:
+    """Invalidates the shared connection of a key, if still the given one.
+
+    The next alias acquiring the connection opens a new one, while the aliases
+    holding the invalidated one keep it until they acquire it again. A connection
+    already replaced is not invalidated, so that the aliases noticing the same
+    outage only open one new connection.
+
+    Args:
+        key (Hashable): The key of the connection.
+        client (Any): The connection to invalidate.
+    """
+    with _connections_lock:
+        shared = _connections.get(key)
+    if shared is None:
+        return
+
+    with shared.lock:
+        if shared.client is client:
+            shared.client = None
@@ -0,0 +1,253 @@
+"""Nornir F5 retry policy.
+
+Decides how each request is retried, depending on its method and endpoint. The
+idempotent requests (the reads, such as the polling of the tasks, and the
+idempotent writes, such as the chunk uploads) are retried on connection errors,
+read errors and transient statuses. The other requests are only retried when
+they were not received (connection errors), or rejected with a `Retry-After`
+header.
+
+The retries of all the connections are limited by a retry budget, a ratio of the
+requests sent, so that retries do not pile up when many devices degrade at once.
+The `Retry-After` header of the responses is honoured, up to a maximum.
+"""
+
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+from urllib.parse import urlsplit
+
+from requests import PreparedRequest
+from urllib3.exceptions import MaxRetryError, ResponseError
+from urllib3.util import Retry
+
+DEFAULT_MAX_RETRY_AFTER = 120.0  # seconds
+DEFAULT_MIN_RETRIES = 10
+DEFAULT_RETRY_RATIO = 0.1
+DEFAULT_RETRY_WINDOW = 10.0  # seconds
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+
+class RetryBudget:
+    """Budget of the retries, shared by the connections.
+
+    Within each window, the retries are allowed while they do not exceed
+    `min_retries` plus `ratio` times the requests sent.
+
+    Attributes:
+        ratio (float): The ratio of retries to requests allowed.
+        min_retries (int): The number of retries always allowed in a window.
+        window (float): The duration (in seconds) of the window.
+        requests (int): The number of requests sent in the current window.
+        retries (int): The number of retries allowed in the current window.
+        rejected (int): The number of retries rejected.
+    """
+
+    def __init__(
+        self,
+        ratio: float = DEFAULT_RETRY_RATIO,
+        min_retries: int = DEFAULT_MIN_RETRIES,
+        window: float = DEFAULT_RETRY_WINDOW,
+    ) -> None:
+        """Initializes the budget.
+
+        Args:
+            ratio (float): The ratio of retries to requests allowed.
+            min_retries (int): The number of retries always allowed in a window.
+            window (float): The duration (in seconds) of the window.
+        """
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self.requests = 0
+        self.retries = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._started_at = time.monotonic()
+
+    def _roll(self) -> None:
+        now = time.monotonic()
+        if now - self._started_at >= self.window:
+            self._started_at = now
+            self.requests = 0
+            self.retries = 0
+
+    def deposit(self) -> None:
+        """Adds a request sent."""
+        with self._lock:
+            self._roll()
+            self.requests += 1
+
+    def withdraw(self) -> bool:
+        """Takes a retry from the budget.
+
+        Returns:
+            bool: Whether the retry is allowed.
+        """
+        with self._lock:
+            self._roll()
+            if self.retries >= self.min_retries + self.ratio * self.requests:
+                self.rejected += 1
+                return False
+            self.retries += 1
+            return True
+
+
+class F5Retry(Retry):
+    """Retry strategy limited by a retry budget and a maximum `Retry-After`."""
+
+    def __init__(
+        self,
+        *args,
+        budget: Optional[RetryBudget] = None,
+        max_retry_after: float = DEFAULT_MAX_RETRY_AFTER,
+        **kwargs,
+    ) -> None:
+        """Initializes the strategy.
+
+        Args:
+            *args: The positional arguments of `Retry`.
+            budget (Optional[RetryBudget]): The retry budget.
+            max_retry_after (float): The maximum time (in seconds) to wait for,
+                as per the `Retry-After` header.
+            **kwargs: The keyword arguments of `Retry`.
+        """
+        super().__init__(*args, **kwargs)
+        self.budget = budget
+        self.max_retry_after = max_retry_after
+
+    def new(self, **kw) -> "F5Retry":  # noqa D102
+        kw.setdefault("budget", self.budget)
+        kw.setdefault("max_retry_after", self.max_retry_after)
+        return super().new(**kw)
+
+    def increment(self, method=None, url=None, *args, **kwargs) -> "F5Retry":
+        """Returns the strategy of the next retry.
+
+        Args:
+            method: The HTTP method.
+            url: The URL.
+            *args: The positional arguments of `Retry.increment`.
+            **kwargs: The keyword arguments of `Retry.increment`.
+
+        Returns:
+            F5Retry: The strategy of the next retry.
+
+        Raises:
+            MaxRetryError: The raised exception when the retry budget is
+                exhausted.
+        """
+        new_retry = super().increment(method, url, *args, **kwargs)
+        if self.budget is not None and not self.budget.withdraw():
+            raise MaxRetryError(
+                kwargs.get("_pool"),
+                url,
+                kwargs.get("error") or ResponseError("retry budget exhausted"),
+            )
+        return new_retry
+
+    def get_retry_after(self, response) -> Optional[float]:  # noqa D102
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, self.max_retry_after)
+
+
+@dataclass
+class RetryRule:
+    """Rule matching the idempotent requests.
+
+    Attributes:
+        methods (List[str]): The HTTP methods.
+        path (str): The regular expression matching the path of the URL.
+        content_range (bool): Whether only the requests with a `Content-Range`
+            header (e.g. the chunks of an upload) match.
+    """
+
+    methods: List[str]
+    path: str = ".*"
+    content_range: bool = False
+
+    def matches(self, request: PreparedRequest) -> bool:
+        """Returns whether a request matches the rule.
+
+        Args:
+            request (PreparedRequest): The request.
+
+        Returns:
+            bool: Whether the request matches.
+        """
+        return (
+            request.method in self.methods
+            and (not self.content_range or "Content-Range" in request.headers)
+            and re.match(self.path, urlsplit(request.url).path) is not None
+        )
+
+
+DEFAULT_RETRY_RULES = [
+    # Reads, including the polling of the tasks
+    RetryRule(methods=["GET", "HEAD", "OPTIONS"]),
+    # Chunk uploads
+    RetryRule(
+        methods=["POST"],
+        path=(
+            "/mgmt/(shared/file-transfer/uploads"
+            "|cm/autodeploy/software-image-uploads)/"
+        ),
+        content_range=True,
+    ),
+    # Reads of the file system
+    RetryRule(methods=["POST"], path="/mgmt/tm/util/unix-ls$"),
+]
+
+
+@dataclass
+class RetryPolicy:
+    """Retry policy of the requests of the connections.
+
+    Attributes:
+        rules (List[RetryRule]): The rules matching the idempotent requests.
+        total (int): The maximum number of retries of a request.
+        backoff_factor (float): The backoff factor between retries.
+        budget (Optional[RetryBudget]): The retry budget. Defaults to a budget
+            shared by all the policies.
+        max_retry_after (float): The maximum time (in seconds) to wait for, as
+            per the `Retry-After` header.
+    """
+
+    rules: List[RetryRule] = field(default_factory=lambda: list(DEFAULT_RETRY_RULES))
+    total: int = 3
+    backoff_factor: float = 1
+    budget: Optional[RetryBudget] = None
+    max_retry_after: float = DEFAULT_MAX_RETRY_AFTER
+
+    def __post_init__(self) -> None:
+        """Sets the default budget."""
+        if self.budget is None:
+            self.budget = DEFAULT_RETRY_BUDGET
+
+    def for_request(self, request: PreparedRequest) -> F5Retry:
+        """Returns the retry strategy of a request.
+
+        Args:
+            request (PreparedRequest): The request.
+
+        Returns:
+            F5Retry: The retry strategy.
+        """
+        idempotent = any(rule.matches(request) for rule in self.rules)
+        return F5Retry(
+            total=self.total,
+            read=None if idempotent else False,
+            status_forcelist=RETRY_STATUSES if idempotent else None,
+            allowed_methods=None,
+            backoff_factor=self.backoff_factor,
+            budget=self.budget,
+            max_retry_after=self.max_retry_after,
+        )
+
+
+DEFAULT_RETRY_BUDGET = RetryBudget()
+DEFAULT_RETRY_POLICY = RetryPolicy()
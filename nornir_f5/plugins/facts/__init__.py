@@ -0,0 +1,19 @@
+"""Nornir F5 device facts cache."""
+
+from nornir_f5.plugins.facts.cache import (
+    DEFAULT_FACTS_TTL,
+    FactsCache,
+    get_fact,
+    get_facts_cache,
+    invalidate_facts,
+    set_facts_cache,
+)
+
+__all__ = (
+    "DEFAULT_FACTS_TTL",
+    "FactsCache",
+    "get_fact",
+    "get_facts_cache",
+    "invalidate_facts",
+    "set_facts_cache",
+)
@@ -0,0 +1,180 @@
+"""Nornir F5 device facts cache.
+
+Remembers the facts of the devices which rarely change (e.g. the TMOS version
+or the ATC versions), so that the tasks depending on them do not request them
+every time. The facts are stored in a SQLite database, in memory by default, or
+in a file to share them across runs.
+
+The cache is disabled until set with `set_facts_cache`.
+"""
+
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from nornir_f5.plugins.connections.codec import json_dumps, json_loads
+
+DEFAULT_FACTS_TTL = 3600.0  # seconds
+
+_cache: Optional["FactsCache"] = None
+
+
+class FactsCache:
+    """Cache of the facts of the devices, expiring after a TTL.
+
+    The facts are keyed by device (`host:port`) and name. A fact named
+    `<name>:<key>` (e.g. `atc:AS3`) belongs to the `<name>` fact when
+    invalidating.
+    """
+
+    def __init__(self, path: str = ":memory:", ttl: float = DEFAULT_FACTS_TTL) -> None:
+        """Opens the cache.
+
+        Args:
+            path (str): The path of the SQLite database. Defaults to an in-memory
+                database, only shared by this process.
+            ttl (float): The time (in seconds) the facts are valid.
+        """
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS facts (host TEXT, fact TEXT, "
+                "value BLOB, updated REAL, PRIMARY KEY (host, fact))"
+            )
+
+    def get(self, host: str, fact: str, ttl: Optional[float] = None) -> Any:
+        """Returns a fact of a device, if cached and not expired.
+
+        Args:
+            host (str): The device (`host:port`).
+            fact (str): The name of the fact.
+            ttl (Optional[float]): The time (in seconds) the fact is valid.
+                Defaults to the TTL of the cache.
+
+        Returns:
+            Any: The fact, or `None` if not cached or expired.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM facts WHERE host = ? AND fact = ? AND updated > ?",
+                (host, fact, time.time() - ttl),
+            ).fetchone()
+        return json_loads(row[0]) if row else None
+
+    def get_all(self, host: str, ttl: Optional[float] = None) -> Dict[str, Any]:
+        """Returns all the facts of a device which are not expired.
+
+        Args:
+            host (str): The device (`host:port`).
+            ttl (Optional[float]): The time (in seconds) the facts are valid.
+                Defaults to the TTL of the cache.
+
+        Returns:
+            Dict[str, Any]: The facts, by name.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT fact, value FROM facts WHERE host = ? AND updated > ? "
+                "ORDER BY fact",
+                (host, time.time() - ttl),
+            ).fetchall()
+        return {fact: json_loads(value) for fact, value in rows}
+
+    def set(self, host: str, fact: str, value: Any) -> None:  # noqa A003
+        """Caches a fact of a device.
+
+        Args:
+            host (str): The device (`host:port`).
+            fact (str): The name of the fact.
+            value (Any): The fact. Must be JSON-serializable.
+        """
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO facts VALUES (?, ?, ?, ?)",
+                (host, fact, json_dumps(value), time.time()),
+            )
+
+    def invalidate(self, host: str, *facts: str) -> None:
+        """Removes facts of a device.
+
+        Args:
+            host (str): The device (`host:port`).
+            *facts (str): The names of the facts. Defaults to all the facts.
+        """
+        with self._lock, self._db:
+            if not facts:
+                self._db.execute("DELETE FROM facts WHERE host = ?", (host,))
+            for fact in facts:
+                self._db.execute(
+                    "DELETE FROM facts WHERE host = ? AND "
+                    "(fact = ? OR substr(fact, 1, ?) = ?)",
+                    (host, fact, len(fact) + 1, f"{fact}:"),
+                )
+
+    def close(self) -> None:
+        """Closes the database."""
+        with self._lock:
+            self._db.close()
+
+
+def get_facts_cache() -> Optional[FactsCache]:
+    """Returns the facts cache used by the tasks.
+
+    Returns:
+        Optional[FactsCache]: The facts cache, or `None` if disabled.
+    """
+    return _cache
+
+
+def set_facts_cache(cache: Optional[FactsCache]) -> None:
+    """Sets the facts cache used by the tasks.
+
+    Args:
+        cache (Optional[FactsCache]): The facts cache, or `None` to disable it.
+    """
+    global _cache
+    _cache = cache
+
+
+def get_fact(
+    host: str, fact: str, func: Callable[[], Any], ttl: Optional[float] = None
+) -> Any:
+    """Returns a fact of a device from the cache, or gets and caches it.
+
+    Args:
+        host (str): The device (`host:port`).
+        fact (str): The name of the fact.
+        func (Callable[[], Any]): The function getting the fact from the device.
+        ttl (Optional[float]): The time (in seconds) the fact is valid.
+            Defaults to the TTL of the cache.
+
+    Returns:
+        Any: The fact.
+    """
+    cache = _cache
+    if cache is None:
+        return func()
+    value = cache.get(host, fact, ttl)
+    if value is None:
+        value = func()
+        if value is not None:
+            cache.set(host, fact, value)
+    return value
+
+
+def invalidate_facts(host: str, *facts: str) -> None:
+    """Removes facts of a device from the cache, if enabled.
+
+    Args:
+        host (str): The device (`host:port`).
+        *facts (str): The names of the facts. Defaults to all the facts.
+    """
+    cache = _cache
+    if cache is not None:
+        cache.invalidate(host, *facts)
@@ -0,0 +1,9 @@
+"""Nornir F5 processors."""
+
+from nornir_f5.plugins.processors.retention import (
+    RESULT_RETENTION_OPTIONS,
+    ResultRetention,
+    ResultSummary,
+)
+
+__all__ = ("RESULT_RETENTION_OPTIONS", "ResultRetention", "ResultSummary")
@@ -0,0 +1,233 @@
+"""Nornir F5 result retention.
+
+Compacts the results of the tasks once each host has completed its task, so that
+the aggregated result of large inventories does not hold every payload (e.g. the
+declarations returned by `atc`) in memory.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass, is_dataclass
+from typing import Any, Dict, Optional
+
+from nornir.core.inventory import Host
+from nornir.core.task import AggregatedResult, MultiResult, Result, Task
+
+from nornir_f5.plugins.connections.codec import json_loads
+
+RESULT_RETENTION_OPTIONS = ["full", "summary", "spill"]
+SPILL_THRESHOLD = 1024  # bytes
+STATUS_MAX_LENGTH = 256
+
+
+@dataclass
+class ResultSummary:
+    """Summary of a task result, retained in place of its payload.
+
+    Attributes:
+        status (Optional[str]): The status message of the result, if any.
+        changed (bool): Whether the task changed the system.
+        sha256 (str): The SHA-256 hash of the JSON-serialized payload.
+        size (int): The size (in bytes) of the JSON-serialized payload.
+        elapsed (Optional[float]): The time (in seconds) taken by the task.
+        file (Optional[str]): The path of the file holding the payload, when
+            spilled to disk.
+    """
+
+    status: Optional[str]
+    changed: bool
+    sha256: str
+    size: int
+    elapsed: Optional[float] = None
+    file: Optional[str] = None
+
+    def load(self) -> Any:
+        """Loads the payload spilled to disk.
+
+        Returns:
+            Any: The payload.
+
+        Raises:
+            Exception: The raised exception when the payload was not spilled.
+        """
+        if self.file is None:
+            raise Exception("The payload was not spilled to disk.")
+        with open(self.file, "rb") as f:
+            return json_loads(f.read())
+
+
+def _default(obj: Any) -> Any:
+    if is_dataclass(obj) and not isinstance(obj, type):
+        return asdict(obj)
+    return str(obj)
+
+
+def _serialize(payload: Any) -> bytes:
+    # Sorted keys, so that equal payloads have the same hash
+    return json.dumps(payload, sort_keys=True, default=_default).encode("utf-8")
+
+
+def _status(payload: Any) -> Optional[str]:
+    if isinstance(payload, dict):
+        payload = payload.get("status", payload.get("message"))
+    if isinstance(payload, str) and len(payload) <= STATUS_MAX_LENGTH:
+        return payload
+    return None
+
+
+def _slug(name: str) -> str:
+    return re.sub(r"[^\w.-]+", "_", name).strip("_") or "task"
+
+
+class ResultRetention:
+    """Processor applying a retention policy to the results of the tasks.
+
+    The results are compacted once a host has completed its task, as the tasks
+    read the results of their subtasks while running. Failed results are always
+    retained in full.
+    """
+
+    def __init__(
+        self,
+        mode: str = "summary",
+        directory: Optional[str] = None,
+        spill_threshold: int = SPILL_THRESHOLD,
+    ) -> None:
+        """Initializes the processor.
+
+        Args:
+            mode (str): The retention policy. Accepted values include
+                [full, summary, spill]. `full` retains the payloads, `summary`
+                replaces them with a `ResultSummary`, and `spill` writes the
+                payloads larger than `spill_threshold` to per-host files
+                referenced from their `ResultSummary`.
+            directory (Optional[str]): The directory of the spilled payloads.
+                Required with the `spill` policy.
+            spill_threshold (int): The size (in bytes) above which the payloads
+                are spilled. Smaller payloads are retained in full.
+
+        Raises:
+            Exception: The raised exception when the policy is not valid.
+        """
+        if mode not in RESULT_RETENTION_OPTIONS:
+            raise Exception(f"Result retention {mode!r} is not valid.")
+        if mode == "spill" and directory is None:
+            raise Exception("A directory is required to spill the results.")
+        self.mode = mode
+        self.directory = directory
+        self.spill_threshold = spill_threshold
+        self._lock = threading.Lock()
+        self._starts: Dict[int, float] = {}
+        self._elapsed: Dict[int, float] = {}
+
+    def _started(self, task: Task) -> None:
+        with self._lock:
+            self._starts[id(task)] = time.monotonic()
+
+    def _completed(self, task: Task, result: MultiResult) -> None:
+        # The first result is the one of the task itself
+        with self._lock:
+            start = self._starts.pop(id(task))
+            self._elapsed[id(result[0])] = time.monotonic() - start
+
+    def _spill(self, task: Task, host: Host, index: int, r: Result, data: bytes) -> str:
+        directory = os.path.join(
+            self.directory or "", _slug(task.name), _slug(host.name)
+        )
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{index:03d}_{_slug(r.name or 'result')}.json")
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def _compact(self, task: Task, host: Host, result: MultiResult) -> None:
+        # Equal payloads of a host are spilled once
+        spilled: Dict[str, str] = {}
+        for index, r in enumerate(result):
+            with self._lock:
+                elapsed = self._elapsed.pop(id(r), None)
+            if r.failed or r.result is None or isinstance(r.result, ResultSummary):
+                continue
+
+            data = _serialize(r.result)
+            spill = self.mode == "spill" and len(data) > self.spill_threshold
+            if self.mode == "spill" and not spill:
+                continue
+            summary = ResultSummary(
+                status=_status(r.result),
+                changed=r.changed,
+                sha256=hashlib.sha256(data).hexdigest(),
+                size=len(data),
+                elapsed=elapsed,
+            )
+            if spill:
+                if summary.sha256 not in spilled:
+                    spilled[summary.sha256] = self._spill(task, host, index, r, data)
+                summary.file = spilled[summary.sha256]
+            r.result = summary
+
+    def task_started(self, task: Task) -> None:
+        """Called before starting the task.
+
+        Args:
+            task (Task): The Nornir task.
+        """
+
+    def task_completed(self, task: Task, result: AggregatedResult) -> None:
+        """Called when all the hosts have completed the task.
+
+        Args:
+            task (Task): The Nornir task.
+            result (AggregatedResult): The results of all the hosts.
+        """
+
+    def task_instance_started(self, task: Task, host: Host) -> None:
+        """Called before a host starts the task.
+
+        Args:
+            task (Task): The Nornir task.
+            host (Host): The host.
+        """
+        if self.mode != "full":
+            self._started(task)
+
+    def task_instance_completed(
+        self, task: Task, host: Host, result: MultiResult
+    ) -> None:
+        """Called when a host has completed the task, to compact its results.
+
+        Args:
+            task (Task): The Nornir task.
+            host (Host): The host.
+            result (MultiResult): The results of the task and its subtasks.
+        """
+        if self.mode != "full":
+            self._completed(task, result)
+            self._compact(task, host, result)
+
+    def subtask_instance_started(self, task: Task, host: Host) -> None:
+        """Called before a host starts a subtask.
+
+        Args:
+            task (Task): The Nornir subtask.
+            host (Host): The host.
+        """
+        if self.mode != "full":
+            self._started(task)
+
+    def subtask_instance_completed(
+        self, task: Task, host: Host, result: MultiResult
+    ) -> None:
+        """Called when a host has completed a subtask.
+
+        Args:
+            task (Task): The Nornir subtask.
+            host (Host): The host.
+            result (MultiResult): The results of the subtask and its subtasks.
+        """
+        if self.mode != "full":
+            self._completed(task, result)
@@ -1,18 +1,60 @@
-"""Nornir F5 tasks."""
-
-from nornir_f5.plugins.tasks.atc import atc, atc_info
-from nornir_f5.plugins.tasks.bigip.cm.config_sync import bigip_cm_config_sync
-from nornir_f5.plugins.tasks.bigip.cm.failover_status import bigip_cm_failover_status
-from nornir_f5.plugins.tasks.bigip.cm.sync_status import bigip_cm_sync_status
-from nornir_f5.plugins.tasks.bigip.shared.file_transfer.uploads import (
-    bigip_shared_file_transfer_uploads,
-)
-from nornir_f5.plugins.tasks.bigip.shared.iapp.package_management_tasks import (
-    bigip_shared_iapp_lx_package,
-)
-from nornir_f5.plugins.tasks.bigip.sys.version import bigip_sys_version
-from nornir_f5.plugins.tasks.bigip.util.unix_ls import bigip_util_unix_ls
-from nornir_f5.plugins.tasks.bigip.util.unix_rm import bigip_util_unix_rm
+"""Nornir F5 tasks.
+
+The task modules are only imported when their task is first accessed, so that
+importing this package is cheap.
+"""
+
+import sys
+import types
+from typing import TYPE_CHECKING, Any, List
+
+if TYPE_CHECKING:  # pragma: no cover
+    from nornir_f5.plugins.tasks.atc import atc, atc_info
+    from nornir_f5.plugins.tasks.bigip.cm.config_sync import bigip_cm_config_sync
+    from nornir_f5.plugins.tasks.bigip.cm.failover_status import (
+        bigip_cm_failover_status,
+    )
+    from nornir_f5.plugins.tasks.bigip.cm.sync_status import bigip_cm_sync_status
+    from nornir_f5.plugins.tasks.bigip.facts import bigip_facts
+    from nornir_f5.plugins.tasks.bigip.health import bigip_health_snapshot
+    from nornir_f5.plugins.tasks.bigip.ltm.data_group import bigip_ltm_data_group
+    from nornir_f5.plugins.tasks.bigip.ltm.stats import bigip_ltm_stats
+    from nornir_f5.plugins.tasks.bigip.shared.file_transfer.uploads import (
+        bigip_shared_file_transfer_uploads,
+    )
+    from nornir_f5.plugins.tasks.bigip.shared.iapp.package_management_tasks import (
+        bigip_shared_iapp_lx_package,
+    )
+    from nornir_f5.plugins.tasks.bigip.sys.crypto import bigip_sys_crypto
+    from nornir_f5.plugins.tasks.bigip.sys.software import bigip_sys_software_install
+    from nornir_f5.plugins.tasks.bigip.sys.ucs import bigip_sys_ucs_backup
+    from nornir_f5.plugins.tasks.bigip.sys.version import bigip_sys_version
+    from nornir_f5.plugins.tasks.bigip.util.unix_ls import bigip_util_unix_ls
+    from nornir_f5.plugins.tasks.bigip.util.unix_rm import bigip_util_unix_rm
+
+_TASK_MODULES = {
+    "atc": "nornir_f5.plugins.tasks.atc",
+    "atc_info": "nornir_f5.plugins.tasks.atc",
+    "bigip_cm_config_sync": "nornir_f5.plugins.tasks.bigip.cm.config_sync",
+    "bigip_cm_failover_status": "nornir_f5.plugins.tasks.bigip.cm.failover_status",
+    "bigip_cm_sync_status": "nornir_f5.plugins.tasks.bigip.cm.sync_status",
+    "bigip_facts": "nornir_f5.plugins.tasks.bigip.facts",
+    "bigip_health_snapshot": "nornir_f5.plugins.tasks.bigip.health",
+    "bigip_ltm_data_group": "nornir_f5.plugins.tasks.bigip.ltm.data_group",
+    "bigip_ltm_stats": "nornir_f5.plugins.tasks.bigip.ltm.stats",
+    "bigip_shared_file_transfer_uploads": (
+        "nornir_f5.plugins.tasks.bigip.shared.file_transfer.uploads"
+    ),
+    "bigip_shared_iapp_lx_package": (
+        "nornir_f5.plugins.tasks.bigip.shared.iapp.package_management_tasks"
+    ),
+    "bigip_sys_crypto": "nornir_f5.plugins.tasks.bigip.sys.crypto",
+    "bigip_sys_software_install": "nornir_f5.plugins.tasks.bigip.sys.software",
+    "bigip_sys_ucs_backup": "nornir_f5.plugins.tasks.bigip.sys.ucs",
+    "bigip_sys_version": "nornir_f5.plugins.tasks.bigip.sys.version",
+    "bigip_util_unix_ls": "nornir_f5.plugins.tasks.bigip.util.unix_ls",
+    "bigip_util_unix_rm": "nornir_f5.plugins.tasks.bigip.util.unix_rm",
+}
 
 __all__ = (
     "atc",
@@ -20,9 +62,40 @@ __all__ = (
     "bigip_cm_config_sync",
     "bigip_cm_failover_status",
     "bigip_cm_sync_status",
+    "bigip_facts",
+    "bigip_health_snapshot",
+    "bigip_ltm_data_group",
+    "bigip_ltm_stats",
     "bigip_shared_file_transfer_uploads",
     "bigip_shared_iapp_lx_package",
+    "bigip_sys_crypto",
+    "bigip_sys_software_install",
+    "bigip_sys_ucs_backup",
     "bigip_sys_version",
     "bigip_util_unix_ls",
     "bigip_util_unix_rm",
 )
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _TASK_MODULES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    task = getattr(__import__(_TASK_MODULES[name], fromlist=[name]), name)
+    globals()[name] = task
+    return task
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
+
+
+class _TasksModule(types.ModuleType):
+    def __setattr__(self, name: str, value: Any) -> None:
+        # Importing a submodule (e.g. `atc`) must not shadow the task of the same
+        # name
+        if name in _TASK_MODULES and isinstance(value, types.ModuleType):
+            return
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _TasksModule
@@ -2,15 +2,25 @@
 
 Allows to deploy F5 ATC declarations (AS3, DO, TS) on BIG-IP systems.
 """
+
+import hashlib
 import json
+import os
+import threading
 import time
-from typing import Optional
+from contextlib import nullcontext
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
 from urllib.parse import urlencode
 
 from nornir.core.task import Result, Task
-from packaging import version
 
-from nornir_f5.plugins.connections import f5_rest_client
+from nornir_f5.plugins.connections import (
+    f5_rest_client,
+    iter_json_object_members,
+    json_loads,
+)
+from nornir_f5.plugins.facts import get_fact, invalidate_facts
+from nornir_f5.plugins.tasks.polling import get_with_outages
 
 AS3_SHOW_OPTIONS = ["base", "full", "expanded"]
 ATC_COMPONENTS = {
@@ -47,10 +57,27 @@ ATC_COMPONENTS = {
                 "methods": ["GET", "POST"],
             },
             "info": {"uri": "/mgmt/shared/telemetry/info", "methods": ["GET"]},
+            "pullconsumer": {
+                "uri": "/mgmt/shared/telemetry/pullconsumer",
+                "methods": ["GET"],
+            },
         }
     },
 }
+ATC_RENDERS_MAX_SIZE = 1024
 ATC_SERVICE_OPTIONS = ["AS3", "Device", "Telemetry"]
+ATC_STREAM_CHUNK_SIZE = 64 * 1024  # bytes
+ATC_VALIDATIONS_MAX_SIZE = 1024
+
+# The compiled schema validators, and the errors of the validated declarations
+_validators: Dict[str, Any] = {}
+_validations: Dict[Tuple[str, str], Optional[str]] = {}
+_validations_lock = threading.Lock()
+
+# The compiled templates, and the declarations rendered from them (with their class)
+_templates: Dict[str, Any] = {}
+_renders: Dict[Tuple[str, str], Tuple[bytes, Optional[str]]] = {}
+_templates_lock = threading.Lock()
 
 
 def _build_as3_endpoint(
@@ -61,6 +88,9 @@ def _build_as3_endpoint(
     as3_show_hash: bool = False,
     as3_tenant: str = "",
 ) -> str:
+    # Only loaded when deploying AS3 declarations
+    from packaging import version
+
     # Setup AS3 endpoint with specified tenant when tenant specified
     if as3_tenant and (
         version.parse(as3_version) >= version.parse("3.14.0") or atc_method == "DELETE"
@@ -98,10 +128,143 @@ def _build_as3_endpoint(
     return atc_config_endpoint
 
 
+def _get_validator(schema_file: str) -> Any:
+    # Only loaded when validating declarations
+    from jsonschema.validators import validator_for
+
+    with _validations_lock:
+        if schema_file in _validators:
+            return _validators[schema_file]
+
+    # Compiled without the lock, the first validator stored is kept
+    with open(schema_file, "rb") as f:
+        schema = json_loads(f.read())
+    cls = validator_for(schema)
+    cls.check_schema(schema)
+    with _validations_lock:
+        return _validators.setdefault(schema_file, cls(schema))
+
+
+def _validate(
+    atc_declaration: Union[Dict[str, Any], bytes],
+    atc_schema_dir: str,
+    atc_service: str,
+    atc_service_info: Any,
+) -> None:
+    from jsonschema.exceptions import best_match
+
+    # DO returns the info of each device
+    if isinstance(atc_service_info, list):
+        atc_service_info = atc_service_info[0]
+    atc_version = atc_service_info["version"]
+    schema_file = os.path.join(atc_schema_dir, atc_service, f"{atc_version}.json")
+    if not os.path.isfile(schema_file):
+        raise Exception(f"The {atc_service} schema {atc_version!r} was not found.")
+
+    # Identical declarations are validated once
+    if isinstance(atc_declaration, bytes):
+        digest = hashlib.sha256(atc_declaration).hexdigest()
+    else:
+        digest = hashlib.sha256(
+            json.dumps(atc_declaration, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+    key = (schema_file, digest)
+    with _validations_lock:
+        cached = key in _validations
+        error_message = _validations.get(key)
+
+    # The declarations are validated concurrently, only the cache is locked
+    if not cached:
+        if isinstance(atc_declaration, bytes):
+            atc_declaration = json_loads(atc_declaration)
+        error = best_match(_get_validator(schema_file).iter_errors(atc_declaration))
+        if error is not None:
+            path = "/".join(str(p) for p in error.absolute_path)
+            error_message = f"/{path}: {error.message}"
+        with _validations_lock:
+            if len(_validations) >= ATC_VALIDATIONS_MAX_SIZE:
+                del _validations[next(iter(_validations))]
+            _validations[key] = error_message
+
+    if error_message:
+        raise Exception(f"The declaration is invalid: {error_message}")
+
+
+def _get_template(atc_template: str) -> Any:
+    # Only loaded when rendering templates
+    import jinja2
+
+    if atc_template not in _templates:
+        with open(atc_template, "r", encoding="utf-8") as f:
+            source = f.read()
+        environment = jinja2.Environment(  # noqa S701
+            keep_trailing_newline=True, undefined=jinja2.StrictUndefined
+        )
+        _templates[atc_template] = environment.from_string(source)
+    return _templates[atc_template]
+
+
+def _render(
+    atc_template: str, atc_template_vars: Dict[str, Any]
+) -> Tuple[bytes, Optional[str]]:
+    # Hosts with identical variables share the rendered declaration
+    digest = hashlib.sha256(
+        json.dumps(atc_template_vars, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+    key = (atc_template, digest)
+    with _templates_lock:
+        if key in _renders:
+            # Keep the most recently used declarations
+            _renders[key] = _renders.pop(key)
+            return _renders[key]
+        template = _get_template(atc_template)
+
+    # The class is parsed once, not by each host sharing the declaration
+    rendered = template.render(atc_template_vars).encode("utf-8")
+    atc_class = json_loads(rendered).get("class")
+    with _templates_lock:
+        if len(_renders) >= ATC_RENDERS_MAX_SIZE:
+            del _renders[next(iter(_renders))]
+        _renders[key] = (rendered, atc_class)
+    return rendered, atc_class
+
+
+def _load_declaration(
+    task: Task,
+    atc_declaration: Optional[Dict[str, Any]] = None,
+    atc_declaration_file: Optional[str] = None,
+    atc_declaration_url: Optional[str] = None,
+    atc_template: Optional[str] = None,
+    atc_template_vars: Optional[Dict[str, Any]] = None,
+) -> Tuple[Union[Dict[str, Any], bytes, None], Optional[str]]:
+    # Get ATC declaration from file
+    if atc_declaration_file:
+        with open(atc_declaration_file, "rb") as f:
+            atc_declaration = json_loads(f.read())
+    # Get ATC declaration from url
+    if atc_declaration_url:
+        atc_declaration = f5_rest_client(task).get(atc_declaration_url).json()
+    # Render ATC declaration from template, kept serialized
+    if atc_template:
+        if atc_template_vars is None:
+            atc_template_vars = dict(task.host.items())
+        return _render(atc_template, atc_template_vars)
+    return atc_declaration, (atc_declaration or {}).get("class")
+
+
+def _post(client: Any, url: str, atc_declaration: Union[Dict[str, Any], bytes]) -> Any:
+    # Rendered declarations are sent as is
+    if isinstance(atc_declaration, bytes):
+        return client.post(
+            url, data=atc_declaration, headers={"Content-Type": "application/json"}
+        )
+    return client.post(url, json=atc_declaration)
+
+
 def _send(
     task: Task,
     atc_config_endpoint: str,
-    atc_declaration: str,
+    atc_declaration: Union[Dict[str, Any], bytes, None],
     atc_method: str,
     atc_service: str,
 ) -> Result:
@@ -112,7 +275,7 @@ def _send(
     # AS3
     if atc_service == "AS3" and atc_method in ["POST", "DELETE"]:
         if atc_method == "POST":
-            resp = client.post(url, json=atc_declaration)
+            resp = _post(client, url, atc_declaration)
         if atc_method == "DELETE":
             resp = client.delete(url)
 
@@ -122,11 +285,13 @@ def _send(
 
     # Device
     if atc_service == "Device" and atc_method == "POST":
-        resp = client.post(url, json=atc_declaration)
+        resp = _post(client, url, atc_declaration)
+        # Onboarding may change the provisioning, HA and versions of the device
+        invalidate_facts(host)
 
     # Telemetry
     if atc_service == "Telemetry" and atc_method == "POST":
-        resp = client.post(url, json=atc_declaration)
+        resp = _post(client, url, atc_declaration)
 
         message = resp.json()["message"]
         if message != "success":
@@ -139,6 +304,64 @@ def _send(
     return Result(host=task.host, result=resp.json())
 
 
+def _tee(chunks: Iterator[bytes], f: Optional[BinaryIO]) -> Iterator[bytes]:
+    for chunk in chunks:
+        if f:
+            f.write(chunk)
+        yield chunk
+
+
+def _select(members: Dict[str, Any], path: str) -> Any:
+    value = members
+    for segment in path.split("/"):
+        if not isinstance(value, dict) or segment not in value:
+            return None
+        value = value[segment]
+    return value
+
+
+def _send_streamed(
+    task: Task,
+    atc_config_endpoint: str,
+    atc_output_dir: Optional[str] = None,
+    atc_select: Optional[List[str]] = None,
+) -> Result:
+    host = f"{task.host.hostname}:{task.host.port}"
+    resp = f5_rest_client(task).get(f"https://{host}{atc_config_endpoint}", stream=True)
+
+    output_file = None
+    if atc_output_dir:
+        os.makedirs(atc_output_dir, exist_ok=True)
+        output_file = os.path.join(atc_output_dir, f"{task.host.name}.json")
+
+    # Only the top-level members holding the selected paths are decoded
+    keys = {path.split("/")[0] for path in atc_select or []}
+    members: Dict[str, Any] = {}
+    with resp, open(output_file, "wb") if output_file else nullcontext() as f:
+        chunks = _tee(resp.iter_content(chunk_size=ATC_STREAM_CHUNK_SIZE), f)
+        # An empty response (204) means there is no declaration
+        if keys and resp.status_code != 204:
+            for key, value in iter_json_object_members(chunks, keys, resp.codec):
+                members[key] = value
+                # Stop reading once all members are found, unless writing the file
+                if not output_file and len(members) == len(keys):
+                    break
+        # Write the remaining chunks
+        if output_file:
+            for _chunk in chunks:
+                pass
+
+    if not atc_select:
+        return Result(
+            host=task.host,
+            result={"file": output_file, "size": os.path.getsize(output_file)},
+        )
+
+    return Result(
+        host=task.host, result={path: _select(members, path) for path in atc_select}
+    )
+
+
 def _wait_task(
     task: Task,
     atc_task_endpoint: str,
@@ -146,9 +369,10 @@ def _wait_task(
     atc_delay: int = 10,
     atc_retries: int = 30,
     as3_tenant: Optional[str] = None,
+    atc_deadline: Optional[int] = None,
 ) -> Result:
-    client = f5_rest_client(task)
     host = f"{task.host.hostname}:{task.host.port}"
+    deadline = time.monotonic() + atc_deadline if atc_deadline else None
     _return = {
         "declaration failed": {"retry": True, "result": "response", "raise": True},
         "declaration is invalid": {"retry": True, "result": "errors", "raise": True},
@@ -159,9 +383,12 @@ def _wait_task(
     }
 
     for _i in range(0, atc_retries):
-        atc_task_resp = client.get(
-            f"https://{host}{atc_task_endpoint}/{atc_task_id}"
-        ).json()
+        atc_task_resp = get_with_outages(
+            task,
+            f"https://{host}{atc_task_endpoint}/{atc_task_id}",
+            atc_delay,
+            deadline,
+        )
 
         results = (
             atc_task_resp["results"]
@@ -196,6 +423,8 @@ def _wait_task(
 def atc_info(task: Task, atc_method: str, atc_service: str) -> Result:
     """Task to verify if ATC service is available and collect service info.
 
+    The service info is read from the facts cache (`atc:<service>`), when enabled.
+
     Args:
         task (Task): The Nornir task.
         atc_method (str): The HTTP method. Accepted values include [POST, GET]
@@ -221,11 +450,14 @@ def atc_info(task: Task, atc_method: str, atc_service: str) -> Result:
     if atc_method not in atc_methods:
         raise Exception(f"ATC method {atc_method!r} is not valid.")
 
+    info_uri = ATC_COMPONENTS[atc_service]["endpoints"]["info"]["uri"]
     return Result(
         host=task.host,
-        result=client.get(
-            f"https://{host}{ATC_COMPONENTS[atc_service]['endpoints']['info']['uri']}"
-        ).json(),
+        result=get_fact(
+            host,
+            f"atc:{atc_service}",
+            lambda: client.get(f"https://{host}{info_uri}").json(),
+        ),
     )
 
 
@@ -234,13 +466,19 @@ def atc(
     as3_show: str = "base",
     as3_show_hash: bool = False,
     as3_tenant: Optional[str] = None,
+    atc_deadline: Optional[int] = None,
     atc_declaration: Optional[str] = None,
     atc_declaration_file: Optional[str] = None,
     atc_declaration_url: Optional[str] = None,
     atc_delay: int = 30,
     atc_method: str = "GET",
+    atc_output_dir: Optional[str] = None,
     atc_retries: int = 10,
+    atc_schema_dir: Optional[str] = None,
+    atc_select: Optional[List[str]] = None,
     atc_service: Optional[str] = None,
+    atc_template: Optional[str] = None,
+    atc_template_vars: Optional[Dict[str, Any]] = None,
     dry_run: Optional[bool] = None,
 ) -> Result:
     """Task to deploy declaratives on F5 devices.
@@ -259,37 +497,59 @@ def atc(
             an `optimisticLockKey` for each tenant.
         as3_tenant (Optional[str]): The AS3 tenant filter. This only updates the tenant
             specified, even if there are other tenants in the declaration.
+        atc_deadline (Optional[int]): The time (in seconds) to keep waiting for
+            the task through restarts of the device (connection errors, 401 and
+            5xx), re-opening the connection once it is back. Defaults to
+            `atc_delay * atc_retries` for DO, which may reboot the device, and to
+            no tolerance for the other services.
         atc_declaration (Optional[str]): The ATC declaration.
-            Mutually exclusive with `atc_declaration_file` and `atc_declaration_url`.
+            Mutually exclusive with `atc_declaration_file`, `atc_declaration_url`
+            and `atc_template`.
         atc_declaration_file (Optional[str]): The path of the ATC declaration.
-            Mutually exclusive with `atc_declaration` and `atc_declaration_url`.
+            Mutually exclusive with `atc_declaration`, `atc_declaration_url` and
+            `atc_template`.
         atc_declaration_url (Optional[str]): The URL of the ATC declaration.
-            Mutually exclusive with `atc_declaration` and `atc_declaration_file`.
+            Mutually exclusive with `atc_declaration`, `atc_declaration_file` and
+            `atc_template`.
         atc_delay (int): The delay (in seconds) between retries
             when checking if async call is complete.
         atc_method (str): The HTTP method. Accepted values include [POST, GET]
             for all services, and [DELETE] for AS3.
+        atc_output_dir (Optional[str]): The directory to stream the GET body to.
         atc_retries (int): The number of times the task will check
             for a finished task before failing.
+        atc_schema_dir (Optional[str]): The directory of the ATC JSON schemas,
+            named `<service>/<version>.json` (e.g. `AS3/3.22.1.json`). If provided,
+            the declaration is validated against the schema matching the version
+            of the service before being sent.
+        atc_select (Optional[List[str]]): The `Tenant[/App]` paths to GET.
         atc_service (Optional[str]): The ATC service.
             Accepted values include [AS3, Device, Telemetry].
             If not provided, this will auto select from the declaration.
+        atc_template (Optional[str]): The path of the Jinja2 template of the ATC
+            declaration. The template is compiled once, and the declaration
+            rendered for identical variables is shared by the hosts and sent
+            without being decoded. Mutually exclusive with `atc_declaration`,
+            `atc_declaration_file` and `atc_declaration_url`.
+        atc_template_vars (Optional[Dict[str, Any]]): The variables of the
+            template. Defaults to the data of the host.
         dry_run (Optional[bool]): Whether to apply changes or not.
 
     Returns:
         Result: The result.
     """
-    # Get ATC declaration from file
-    if atc_declaration_file:
-        with open(atc_declaration_file, "r") as f:
-            atc_declaration = json.loads(f.read())
-    # Get ATC declaration from url
-    if atc_declaration_url:
-        atc_declaration = f5_rest_client(task).get(atc_declaration_url).json()
+    atc_declaration, atc_class = _load_declaration(
+        task,
+        atc_declaration=atc_declaration,
+        atc_declaration_file=atc_declaration_file,
+        atc_declaration_url=atc_declaration_url,
+        atc_template=atc_template,
+        atc_template_vars=atc_template_vars,
+    )
 
     # Get ATC service from declaration
     if atc_declaration and not atc_service:
-        atc_service = atc_declaration["class"]
+        atc_service = atc_class
 
     # Get service info
     atc_service_info = task.run(
@@ -313,10 +573,25 @@ def atc(
             atc_method=atc_method,
         )
 
+    # Validate the declaration locally
+    if atc_schema_dir and atc_declaration and atc_method == "POST":
+        _validate(atc_declaration, atc_schema_dir, atc_service, atc_service_info)
+
     dry_run = task.is_dry_run(dry_run)
     if dry_run:
         return Result(host=task.host, result=None)
 
+    # Stream the declaration
+    if atc_method == "GET" and (atc_output_dir or atc_select):
+        atc_send_result = task.run(
+            name="GET the declaration (streamed)",
+            task=_send_streamed,
+            atc_config_endpoint=atc_config_endpoint,
+            atc_output_dir=atc_output_dir,
+            atc_select=atc_select,
+        ).result
+        return Result(host=task.host, result=atc_send_result)
+
     # Send the declaration
     atc_send_result = task.run(
         name=f"{atc_method} the declaration",
@@ -336,6 +611,11 @@ def atc(
         name="Wait for task to complete",
         task=_wait_task,
         as3_tenant=as3_tenant,
+        atc_deadline=(
+            atc_delay * atc_retries
+            if atc_deadline is None and atc_service == "Device"
+            else atc_deadline
+        ),
         atc_delay=atc_delay,
         atc_retries=atc_retries,
         atc_task_endpoint=ATC_COMPONENTS[atc_service]["endpoints"]["task"]["uri"],
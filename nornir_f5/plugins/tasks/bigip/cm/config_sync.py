@@ -1,24 +1,185 @@
 """Nornir F5 Configuration Synchronization tasks."""
 
 import logging
+import threading
 import time
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from nornir.core.task import Result, Task
 
 from nornir_f5.plugins.connections import f5_rest_client
-from nornir_f5.plugins.tasks.bigip.cm.sync_status import bigip_cm_sync_status
+from nornir_f5.plugins.tasks.bigip.cm.sync_status import (
+    SYNC_STATUS_URI,
+    _parse_sync_status,
+    bigip_cm_sync_status,
+)
+from nornir_f5.plugins.tasks.polling import backoff_delays
 
+DEVICE_GROUP_URI = "/mgmt/tm/cm/device-group"
 SYNC_DIRECTION_OPTIONS = ["to-group", "from-group"]
+SYNC_STATUS_POLL_INITIAL_DELAY = 0.5  # seconds
+
+
+class _SyncGroup:
+    """Shared state of a config-sync performed once per device group."""
+
+    def __init__(self, leader: str) -> None:
+        self.leader = leader
+        self.done = threading.Event()
+        self.result: Optional[Result] = None
+        self.error: Optional[str] = None
+
+
+_sync_groups: Dict[Tuple[str, Tuple[str, ...]], _SyncGroup] = {}
+_sync_groups_lock = threading.Lock()
+
+
+def _get_device_group_members(task: Task, device_group: str) -> List[str]:
+    resp = f5_rest_client(task).get(
+        f"https://{task.host.hostname}:{task.host.port}"
+        f"{DEVICE_GROUP_URI}/~Common~{device_group}/devices"
+    )
+    return [item["name"] for item in resp.json().get("items", [])]
+
+
+def _join_sync_group(
+    key: Tuple[str, Tuple[str, ...]], host_name: str
+) -> Tuple[_SyncGroup, bool]:
+    with _sync_groups_lock:
+        group = _sync_groups.get(key)
+        # Groups are only registered while their sync is in progress, so that
+        # an outcome is never reported by a later run
+        if group is None:
+            group = _SyncGroup(leader=host_name)
+            _sync_groups[key] = group
+            return group, True
+
+        return group, False
+
+
+def _leave_sync_group(key: Tuple[str, Tuple[str, ...]], group: _SyncGroup) -> None:
+    with _sync_groups_lock:
+        group.done.set()
+        del _sync_groups[key]
+
+
+def _wait_sync(
+    task: Task,
+    delay: int,
+    retries: int,
+    deadline: Optional[int] = None,
+    sync_status: Optional[str] = None,
+) -> Result:
+    url = f"https://{task.host.hostname}:{task.host.port}{SYNC_STATUS_URI}"
+    start = time.monotonic()
+    timeline: List[Dict[str, Any]] = []
+
+    delays = backoff_delays(SYNC_STATUS_POLL_INITIAL_DELAY, delay)
+    for attempt in range(1, retries + 1):
+        wait = next(delays)
+        if deadline is not None:
+            # Never sleep past the deadline
+            remaining = deadline - (time.monotonic() - start)
+            if remaining <= 0:
+                raise Exception(
+                    f"The configuration synchronization has reached the deadline ({sync_status})."  # noqa B950
+                )
+            wait = min(wait, remaining)
+        time.sleep(wait)
+        sync_status = _parse_sync_status(f5_rest_client(task).get(url).json())
+
+        # Only record status transitions
+        if not timeline or timeline[-1]["status"] != sync_status:
+            timeline.append(
+                {
+                    "attempt": attempt,
+                    "elapsed": round(time.monotonic() - start, 3),
+                    "status": sync_status,
+                }
+            )
+
+        if sync_status == "Changes Pending":
+            # TODO: Validate pending state (yellow or red)
+            pass
+        elif sync_status in [
+            "Awaiting Initial Sync",
+            "Not All Devices Synced",
+            "Syncing",
+        ]:
+            pass
+        elif sync_status == "In Sync":
+            return Result(
+                host=task.host,
+                result={
+                    "attempts": attempt,
+                    "elapsed": round(time.monotonic() - start, 3),
+                    "status": sync_status,
+                    "timeline": timeline,
+                },
+            )
+        else:
+            raise Exception(
+                f"The configuration synchronization has failed ({sync_status})."
+            )
+
+    raise Exception(
+        f"The configuration synchronization has reached maximum retries ({sync_status})."  # noqa B950
+    )
+
+
+def _config_sync(
+    task: Task,
+    deadline: Optional[int],
+    device_group: str,
+    delay: int,
+    direction: str,
+    dry_run: Optional[bool],
+    force_full_load_push: bool,
+    retries: int,
+) -> Result:
+    sync_status = task.run(
+        name="Get the sync status",
+        task=bigip_cm_sync_status,
+        severity_level=logging.DEBUG,
+    ).result
+
+    if direction not in SYNC_DIRECTION_OPTIONS:
+        raise Exception(f"Direction {direction!r} is not valid.")
+
+    dry_run = task.is_dry_run(dry_run)
+    if sync_status not in ["In Sync", "Standalone"] and not dry_run:
+        data = {
+            "command": "run",
+            "utilCmdArgs": f"config-sync {direction} {device_group}{' force-full-load-push' if force_full_load_push else ''}",  # noqa B950
+        }
+        f5_rest_client(task).post(
+            f"https://{task.host.hostname}:{task.host.port}/mgmt/tm/cm", json=data
+        )
+
+        sync_status = task.run(
+            name="Wait for the config-sync to complete",
+            task=_wait_sync,
+            deadline=deadline,
+            delay=delay,
+            retries=retries,
+            sync_status=sync_status,
+            severity_level=logging.DEBUG,
+        ).result["status"]
+        return Result(host=task.host, result=sync_status, changed=True)
+
+    return Result(host=task.host, result=sync_status)
 
 
 def bigip_cm_config_sync(
     task: Task,
     device_group: str,
+    deadline: Optional[int] = None,
     delay: int = 6,
+    device_group_members: Optional[List[str]] = None,
     direction: str = "to-group",
     dry_run: Optional[bool] = None,
     force_full_load_push: bool = False,
+    group_aware: bool = False,
     retries: int = 50,
 ) -> Result:
     """Task to synchronize the configuration between devices.
@@ -26,8 +187,15 @@ def bigip_cm_config_sync(
     Args:
         task (Task): The Nornir task.
         device_group (str): The device group on which to perform the config-sync action.
-        delay (int): The delay (in seconds) between retries when checking
-            if the sync-config is complete.
+        deadline (Optional[int]): The maximum time (in seconds) to wait for the
+            config-sync action to complete before failing.
+        delay (int): The maximum delay (in seconds) between retries when checking
+            if the sync-config is complete. The sync status is first checked after
+            a short delay, which is then doubled on each retry up to this value.
+        device_group_members (Optional[List[str]]): The members of the device group.
+            Only used when `group_aware` is set. If not provided, the members are
+            taken from the `device_group_members` host data, or else discovered
+            from the device.
         direction (str): The direction when performing the config-sync action.
             Accepted values include [to-group, from-group].
             `from-group` updates the configuration of the local device with the
@@ -38,6 +206,10 @@ def bigip_cm_config_sync(
         dry_run (Optional[bool]): Whether to apply changes or not.
         force_full_load_push (bool): It forces all other devices to pull
             all synchronizable configuration from this device.
+        group_aware (bool): Whether to synchronize once per device group.
+            The first member of the group to run the task performs the config-sync
+            action and polls the sync status; the other members running the task
+            while it is in progress wait for and report the same outcome.
         retries (int): The number of times the task will check for a finished
             config-sync action before failing.
 
@@ -47,51 +219,39 @@ def bigip_cm_config_sync(
     Raises:
         Exception: The raised exception when the task had an error.
     """
-    sync_status = task.run(
-        name="Get the sync status",
-        task=bigip_cm_sync_status,
-        severity_level=logging.DEBUG,
-    ).result
+    kwargs = {
+        "deadline": deadline,
+        "delay": delay,
+        "device_group": device_group,
+        "direction": direction,
+        "dry_run": dry_run,
+        "force_full_load_push": force_full_load_push,
+        "retries": retries,
+    }
+    if not group_aware:
+        return _config_sync(task, **kwargs)
 
-    if direction not in SYNC_DIRECTION_OPTIONS:
-        raise Exception(f"Direction {direction!r} is not valid.")
+    if device_group_members is None:
+        device_group_members = task.host.get("device_group_members")
+    if device_group_members is None:
+        device_group_members = _get_device_group_members(task, device_group)
 
-    dry_run = task.is_dry_run(dry_run)
-    if sync_status not in ["In Sync", "Standalone"] and not dry_run:
-        data = {
-            "command": "run",
-            "utilCmdArgs": f"config-sync {direction} {device_group}{' force-full-load-push' if force_full_load_push else ''}",  # noqa B950
-        }
-        f5_rest_client(task).post(
-            f"https://{task.host.hostname}:{task.host.port}/mgmt/tm/cm", json=data
-        )
-
-        for retry in range(1, retries + 1):
-            time.sleep(delay)
-            sync_status = task.run(
-                name=f"Get the sync status (attempt {retry}/{retries})",
-                task=bigip_cm_sync_status,
-                severity_level=logging.DEBUG,
-            ).result
-
-            if sync_status == "Changes Pending":
-                # TODO: Validate pending state (yellow or red)
-                pass
-            elif sync_status in [
-                "Awaiting Initial Sync",
-                "Not All Devices Synced",
-                "Syncing",
-            ]:
-                pass
-            elif sync_status == "In Sync":
-                return Result(host=task.host, result=sync_status, changed=True)
-            else:
-                raise Exception(
-                    f"The configuration synchronization has failed ({sync_status})."
-                )
+    key = (device_group, tuple(sorted(device_group_members)))
+    group, leader = _join_sync_group(key, task.host.name)
 
-        raise Exception(
-            f"The configuration synchronization has reached maximum retries ({sync_status})."  # noqa B950
-        )
+    if leader:
+        try:
+            group.result = _config_sync(task, **kwargs)
+        except Exception as e:
+            group.error = str(e)
+            raise
+        finally:
+            _leave_sync_group(key, group)
+        return group.result
 
-    return Result(host=task.host, result=sync_status)
+    group.done.wait()
+    if group.error is not None:
+        raise Exception(f"{group.error} (synchronized by {group.leader!r})")
+    return Result(
+        host=task.host, result=group.result.result, changed=group.result.changed
+    )
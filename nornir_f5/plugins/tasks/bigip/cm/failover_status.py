@@ -4,6 +4,14 @@ from nornir.core.task import Result, Task
 
 from nornir_f5.plugins.connections import f5_rest_client
 
+FAILOVER_STATUS_URI = "/mgmt/tm/cm/failover-status"
+
+
+def _parse_failover_status(data: dict) -> str:
+    return data["entries"][f"https://localhost{FAILOVER_STATUS_URI}/0"]["nestedStats"][
+        "entries"
+    ]["status"]["description"]
+
 
 def bigip_cm_failover_status(task: Task) -> Result:
     """Task to get the failover status of the device.
@@ -15,11 +23,6 @@ def bigip_cm_failover_status(task: Task) -> Result:
         Result: The failover status.
     """
     resp = f5_rest_client(task).get(
-        f"https://{task.host.hostname}:{task.host.port}/mgmt/tm/cm/failover-status",
-    )
-    return Result(
-        host=task.host,
-        result=resp.json()["entries"]["https://localhost/mgmt/tm/cm/failover-status/0"][
-            "nestedStats"
-        ]["entries"]["status"]["description"],
+        f"https://{task.host.hostname}:{task.host.port}{FAILOVER_STATUS_URI}",
     )
+    return Result(host=task.host, result=_parse_failover_status(resp.json()))
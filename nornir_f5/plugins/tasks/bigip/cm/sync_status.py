@@ -4,6 +4,14 @@ from nornir.core.task import Result, Task
 
 from nornir_f5.plugins.connections import f5_rest_client
 
+SYNC_STATUS_URI = "/mgmt/tm/cm/sync-status"
+
+
+def _parse_sync_status(data: dict) -> str:
+    return data["entries"][f"https://localhost{SYNC_STATUS_URI}/0"]["nestedStats"][
+        "entries"
+    ]["status"]["description"]
+
 
 def bigip_cm_sync_status(task: Task) -> Result:
     """Task to get the synchronization status of the device.
@@ -15,11 +23,6 @@ def bigip_cm_sync_status(task: Task) -> Result:
         Result: The sync status.
     """
     resp = f5_rest_client(task).get(
-        f"https://{task.host.hostname}:{task.host.port}/mgmt/tm/cm/sync-status",
-    )
-    return Result(
-        host=task.host,
-        result=resp.json()["entries"]["https://localhost/mgmt/tm/cm/sync-status/0"][
-            "nestedStats"
-        ]["entries"]["status"]["description"],
+        f"https://{task.host.hostname}:{task.host.port}{SYNC_STATUS_URI}",
     )
+    return Result(host=task.host, result=_parse_sync_status(resp.json()))
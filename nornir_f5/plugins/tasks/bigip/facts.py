@@ -0,0 +1,119 @@
+"""Nornir F5 Facts tasks."""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from nornir.core.task import Result, Task
+
+from nornir_f5.plugins.connections import f5_rest_client
+from nornir_f5.plugins.facts import get_facts_cache
+from nornir_f5.plugins.tasks.atc import ATC_SERVICE_OPTIONS
+from nornir_f5.plugins.tasks.bigip.cm.failover_status import (
+    FAILOVER_STATUS_URI,
+    _parse_failover_status,
+)
+from nornir_f5.plugins.tasks.bigip.health import _get, _get_atc_info
+from nornir_f5.plugins.tasks.bigip.sys.version import VERSION_URI, _parse_version
+
+DEVICE_INFO_URI = "/mgmt/shared/identified-devices/config/device-info"
+LX_PACKAGES_URI = "/mgmt/shared/iapp/global-installed-packages"
+PROVISION_URI = "/mgmt/tm/sys/provision"
+FACTS_OPTIONS = ["atc", "ha_role", "lx_packages", "modules", "platform", "version"]
+# The TTL (in seconds) of the facts changing without a task, e.g. on failover
+FACTS_TTLS = {"ha_role": 60.0}
+
+
+def _parse_lx_packages(data: dict) -> Dict[str, str]:
+    return {item["appName"]: item["version"] for item in data.get("items", [])}
+
+
+def _parse_modules(data: dict) -> List[str]:
+    return sorted(
+        item["name"]
+        for item in data.get("items", [])
+        if item.get("level", "none") != "none"
+    )
+
+
+def _get_atc(task: Task) -> Dict[str, Optional[str]]:
+    # The info of each service is cached as by `atc_info`, only its version is
+    # kept in the fact
+    host = f"{task.host.hostname}:{task.host.port}"
+    cache = get_facts_cache()
+    versions = {}
+    for atc_service in ATC_SERVICE_OPTIONS:
+        info = _get_atc_info(task, atc_service)
+        if info is not None and cache is not None:
+            cache.set(host, f"atc:{atc_service}", info)
+        versions[atc_service] = None if info is None else info["version"]
+    return versions
+
+
+def _getters(task: Task) -> Dict[str, Callable[[], Any]]:
+    return {
+        "atc": lambda: _get_atc(task),
+        "ha_role": lambda: _get(task, FAILOVER_STATUS_URI, _parse_failover_status),
+        "lx_packages": lambda: _get(task, LX_PACKAGES_URI, _parse_lx_packages),
+        "modules": lambda: _get(task, PROVISION_URI, _parse_modules),
+        "platform": lambda: _get(task, DEVICE_INFO_URI, lambda d: d["platform"]),
+        "version": lambda: _get(task, VERSION_URI, _parse_version),
+    }
+
+
+def bigip_facts(
+    task: Task,
+    facts: Optional[List[str]] = None,
+    refresh: bool = False,
+    ttl: Optional[float] = None,
+) -> Result:
+    """Task to get the facts of the device, and fill the facts cache.
+
+    The facts missing from the cache (or all of them, if refreshing) are
+    requested concurrently over the host's connection. Running this task over
+    the inventory warms up the cache for the following tasks, including the
+    info of each ATC service read by `atc_info`.
+
+    Args:
+        task (Task): The Nornir task.
+        facts (Optional[List[str]]): The facts to get. Accepted values include
+            [atc, ha_role, lx_packages, modules, platform, version].
+            Defaults to all the facts.
+        refresh (bool): Whether to get the facts from the device, even if cached.
+        ttl (Optional[float]): The time (in seconds) the cached facts are valid.
+            Defaults to the TTL of the cache, or the shorter TTL of the facts
+            changing without a task (`ha_role`).
+
+    Returns:
+        Result: The facts, by name.
+
+    Raises:
+        Exception: The raised exception when the task had an error.
+    """
+    facts = facts or FACTS_OPTIONS
+    for fact in facts:
+        if fact not in FACTS_OPTIONS:
+            raise Exception(f"Fact {fact!r} is not valid.")
+
+    host = f"{task.host.hostname}:{task.host.port}"
+    cache = get_facts_cache()
+    values: Dict[str, Any] = {}
+    if cache is not None and not refresh:
+        values = {
+            f: cache.get(host, f, FACTS_TTLS.get(f) if ttl is None else ttl)
+            for f in facts
+        }
+    missing = [f for f in facts if values.get(f) is None]
+
+    if missing:
+        # Open the connection before spawning threads, so that only one login is
+        # made
+        f5_rest_client(task)
+        getters = _getters(task)
+        with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+            futures = {f: executor.submit(getters[f]) for f in missing}
+            for fact, future in futures.items():
+                values[fact] = future.result()
+                if cache is not None:
+                    cache.set(host, fact, values[fact])
+
+    return Result(host=task.host, result={f: values[f] for f in facts})
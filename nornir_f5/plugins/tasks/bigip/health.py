@@ -0,0 +1,113 @@
+"""Nornir F5 Health tasks."""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+from nornir.core.task import Result, Task
+from requests import HTTPError
+
+from nornir_f5.plugins.connections import f5_rest_client
+from nornir_f5.plugins.tasks.atc import ATC_COMPONENTS, ATC_SERVICE_OPTIONS
+from nornir_f5.plugins.tasks.bigip.cm.failover_status import (
+    FAILOVER_STATUS_URI,
+    _parse_failover_status,
+)
+from nornir_f5.plugins.tasks.bigip.cm.sync_status import (
+    SYNC_STATUS_URI,
+    _parse_sync_status,
+)
+from nornir_f5.plugins.tasks.bigip.sys.version import VERSION_URI, _parse_version
+
+
+@dataclass
+class HealthSnapshot:
+    """Health snapshot of a BIG-IP system.
+
+    Attributes:
+        version (str): The software version.
+        sync_status (str): The configuration synchronization status.
+        failover_status (str): The failover status.
+        atc (Dict[str, Optional[str]]): The version of each ATC service,
+            or `None` when the service is not installed.
+        elapsed (float): The time (in seconds) taken to collect the snapshot.
+    """
+
+    version: str
+    sync_status: str
+    failover_status: str
+    atc: Dict[str, Optional[str]] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+
+def _get(task: Task, uri: str, parser: Callable[[dict], Any]) -> Any:
+    resp = f5_rest_client(task).get(
+        f"https://{task.host.hostname}:{task.host.port}{uri}"
+    )
+    return parser(resp.json())
+
+
+def _get_atc_info(task: Task, atc_service: str) -> Any:
+    uri = ATC_COMPONENTS[atc_service]["endpoints"]["info"]["uri"]
+    try:
+        return _get(task, uri, lambda data: data)
+    except HTTPError as e:
+        # The service is not installed
+        if e.response is not None and e.response.status_code == 404:
+            return None
+        raise
+
+
+def _get_atc_version(task: Task, atc_service: str) -> Optional[str]:
+    info = _get_atc_info(task, atc_service)
+    return None if info is None else info["version"]
+
+
+def bigip_health_snapshot(task: Task, atc_services: Optional[list] = None) -> Result:
+    """Task to get a health snapshot of the device.
+
+    The version, sync status, failover status and ATC services info are
+    requested concurrently over the host's connection, so the task takes
+    roughly as long as the slowest call.
+
+    Args:
+        task (Task): The Nornir task.
+        atc_services (Optional[list]): The ATC services to collect info for.
+            Defaults to all services [AS3, Device, Telemetry].
+
+    Returns:
+        Result: The health snapshot (`HealthSnapshot`).
+
+    Raises:
+        Exception: The raised exception when the task had an error.
+    """
+    if atc_services is None:
+        atc_services = ATC_SERVICE_OPTIONS
+
+    # Validate ATC services
+    for atc_service in atc_services:
+        if atc_service not in ATC_SERVICE_OPTIONS:
+            raise Exception(f"ATC service {atc_service!r} is not valid.")
+
+    # Open the connection before spawning threads, so that only one login is made
+    f5_rest_client(task)
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=3 + len(atc_services)) as executor:
+        version = executor.submit(_get, task, VERSION_URI, _parse_version)
+        sync_status = executor.submit(_get, task, SYNC_STATUS_URI, _parse_sync_status)
+        failover_status = executor.submit(
+            _get, task, FAILOVER_STATUS_URI, _parse_failover_status
+        )
+        atc = {s: executor.submit(_get_atc_version, task, s) for s in atc_services}
+
+        snapshot = HealthSnapshot(
+            version=version.result(),
+            sync_status=sync_status.result(),
+            failover_status=failover_status.result(),
+            atc={s: f.result() for s, f in atc.items()},
+        )
+    snapshot.elapsed = round(time.monotonic() - start, 3)
+
+    return Result(host=task.host, result=snapshot)
@@ -0,0 +1 @@
+"""Nornir F5 Local Traffic Manager (LTM) tasks."""
@@ -0,0 +1,275 @@
+"""Nornir F5 LTM Data Group tasks.
+
+Synchronizes large data groups incrementally. The records last applied to each
+host are kept in a snapshot (in memory, or in files to share them across runs),
+and only their difference with the desired records is sent to the device.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import suppress
+from typing import Dict, List, Optional, Tuple, Union
+
+from nornir.core.task import Result, Task
+
+from nornir_f5.plugins.connections import f5_rest_client
+from nornir_f5.plugins.tasks.bigip.shared.file_transfer.uploads import (
+    FILE_TRANSFER_OPTIONS,
+    bigip_shared_file_transfer_uploads,
+)
+
+DATA_GROUP_FILE_URI = "/mgmt/tm/sys/file/data-group"
+DATA_GROUP_INTERNAL_URI = "/mgmt/tm/ltm/data-group/internal"
+DATA_GROUP_PATCH_BATCH_SIZE = 100  # records
+DATA_GROUP_PATCH_THRESHOLD = 1000  # records
+DATA_GROUP_TYPE_OPTIONS = ["integer", "ip", "string"]
+
+# The records last applied to each data group of each host, when not in files
+_snapshots: Dict[Tuple[str, str], Dict[str, str]] = {}
+_snapshots_lock = threading.Lock()
+
+
+def _snapshot_path(snapshot_dir: str, host_name: str, full_path: str) -> str:
+    return os.path.join(snapshot_dir, host_name, f"{full_path[1:]}.json")
+
+
+def _load_snapshot(
+    task: Task, full_path: str, snapshot_dir: Optional[str]
+) -> Optional[Dict[str, str]]:
+    if snapshot_dir is None:
+        with _snapshots_lock:
+            return _snapshots.get((task.host.name, full_path))
+
+    path = _snapshot_path(snapshot_dir, task.host.name, full_path)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_snapshot(
+    task: Task,
+    full_path: str,
+    snapshot_dir: Optional[str],
+    records: Optional[Dict[str, str]],
+) -> None:
+    # The snapshot is removed when the records are unknown
+    if snapshot_dir is None:
+        with _snapshots_lock:
+            if records is None:
+                _snapshots.pop((task.host.name, full_path), None)
+            else:
+                _snapshots[(task.host.name, full_path)] = records
+        return
+
+    path = _snapshot_path(snapshot_dir, task.host.name, full_path)
+    if records is None:
+        with suppress(FileNotFoundError):
+            os.remove(path)
+        return
+
+    # Written under a temporary name, so that a partial snapshot is never read
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(records, f, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
+
+
+def _get_records(task: Task, url: str) -> Dict[str, str]:
+    resp = f5_rest_client(task).get(url).json()
+    return {r["name"]: r.get("data", "") for r in resp.get("records", [])}
+
+
+def _diff(
+    old: Dict[str, str], new: Dict[str, str]
+) -> List[Tuple[str, str, Optional[str]]]:
+    # The changes [(operation, name, data)], in the order of the names
+    changes: List[Tuple[str, str, Optional[str]]] = [
+        ("delete", name, None) for name in old.keys() - new.keys()
+    ]
+    for name, data in new.items():
+        if name not in old:
+            changes.append(("add", name, data))
+        elif old[name] != data:
+            changes.append(("modify", name, data))
+    return sorted(changes, key=lambda c: c[1])
+
+
+def _quote(value: str) -> str:
+    return '"{}"'.format(value.replace("\\", "\\\\").replace('"', '\\"'))
+
+
+def _patch_options(changes: List[Tuple[str, str, Optional[str]]]) -> str:
+    # e.g. `records delete { "a" } records add { "b" { data "1" } }`
+    options = []
+    for operation in ["delete", "modify", "add"]:
+        records = [
+            (
+                _quote(name)
+                if data is None
+                else f"{_quote(name)} {{ data {_quote(data)} }}"
+            )
+            for op, name, data in changes
+            if op == operation
+        ]
+        if records:
+            options.append(f"records {operation} {{ {' '.join(records)} }}")
+    return " ".join(options)
+
+
+def _render_file(records: Dict[str, str], data_group_type: str) -> str:
+    lines = []
+    for name in sorted(records):
+        if data_group_type == "ip":
+            key = f"{'network' if '/' in name else 'host'} {name}"
+        elif data_group_type == "integer":
+            key = name
+        else:
+            key = _quote(name)
+        lines.append(f"{key} := {_quote(records[name])},\n")
+    return "".join(lines)
+
+
+def _apply_internal(
+    task: Task,
+    url: str,
+    changes: List[Tuple[str, str, Optional[str]]],
+    records: Dict[str, str],
+    patch_threshold: int,
+) -> str:
+    if len(changes) > patch_threshold:
+        # Large deltas replace all the records in one call
+        f5_rest_client(task).patch(
+            url,
+            json={
+                "records": [{"name": n, "data": records[n]} for n in sorted(records)]
+            },
+        )
+        return "replace"
+
+    # Small deltas only send the changed records, in batches
+    for i in range(0, len(changes), DATA_GROUP_PATCH_BATCH_SIZE):
+        batch = changes[i : i + DATA_GROUP_PATCH_BATCH_SIZE]
+        f5_rest_client(task).patch(
+            url, params={"options": _patch_options(batch)}, json={}
+        )
+    return "patch"
+
+
+def _apply_external(
+    task: Task,
+    data_group: str,
+    partition: str,
+    records: Dict[str, str],
+    data_group_type: str,
+) -> str:
+    file_name = f"{partition}~{data_group}"
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        local_file_path = os.path.join(tmp_dir, file_name)
+        with open(local_file_path, "w") as f:
+            f.write(_render_file(records, data_group_type))
+        task.run(
+            name="Upload the data group file",
+            task=bigip_shared_file_transfer_uploads,
+            local_file_path=local_file_path,
+            severity_level=logging.DEBUG,
+        )
+
+    directory = FILE_TRANSFER_OPTIONS["file"]["directory"]
+    f5_rest_client(task).patch(
+        f"https://{task.host.hostname}:{task.host.port}"
+        f"{DATA_GROUP_FILE_URI}/~{partition}~{data_group}",
+        json={"sourcePath": f"file:{directory}/{file_name}"},
+    )
+    return "upload"
+
+
+def bigip_ltm_data_group(
+    task: Task,
+    data_group: str,
+    records: Union[Dict[str, str], List[str]],
+    data_group_type: str = "string",
+    dry_run: Optional[bool] = None,
+    external: bool = False,
+    partition: str = "Common",
+    patch_threshold: int = DATA_GROUP_PATCH_THRESHOLD,
+    refresh: bool = False,
+    snapshot_dir: Optional[str] = None,
+) -> Result:
+    """Task to synchronize the records of a data group.
+
+    The desired records are compared with a snapshot of the records last applied
+    to the host, and only the changes are applied. For an internal data group,
+    the changed records are patched, unless there are more changes than
+    `patch_threshold`, in which case all the records are replaced. When there is
+    no snapshot, it is taken from the device. An external data group can only be
+    replaced: when changed, its file is rendered and uploaded, then imported
+    into the data group file object of the same name.
+
+    Args:
+        task (Task): The Nornir task.
+        data_group (str): The name of the data group.
+        records (Union[Dict[str, str], List[str]]): The records, as a mapping of
+            their names to their data, or a list of names without data.
+        data_group_type (str): The type of the external data group file.
+            Accepted values include [integer, ip, string].
+        dry_run (Optional[bool]): Whether to apply changes or not.
+        external (bool): Whether the data group is external.
+        partition (str): The partition of the data group.
+        patch_threshold (int): The maximum number of changes patched.
+        refresh (bool): Whether to take the snapshot of an internal data group
+            from the device, even if kept.
+        snapshot_dir (Optional[str]): The directory of the snapshots. Defaults to
+            keeping the snapshots in memory, for the current run only.
+
+    Returns:
+        Result: The number of records added, modified and deleted, and the
+            method used to apply them [patch, replace, upload].
+
+    Raises:
+        Exception: The raised exception when the task had an error.
+    """
+    if data_group_type not in DATA_GROUP_TYPE_OPTIONS:
+        raise Exception(f"Data group type {data_group_type!r} is not valid.")
+
+    if isinstance(records, list):
+        records = dict.fromkeys(records, "")
+    else:
+        records = dict(records)
+    full_path = f"/{partition}/{data_group}"
+    url = (
+        f"https://{task.host.hostname}:{task.host.port}"
+        f"{DATA_GROUP_INTERNAL_URI}/~{partition}~{data_group}"
+    )
+
+    snapshot = None if refresh else _load_snapshot(task, full_path, snapshot_dir)
+    if snapshot is None and not external:
+        snapshot = _get_records(task, url)
+        _save_snapshot(task, full_path, snapshot_dir, snapshot)
+    # The records of an external data group are unknown without a snapshot
+    changes = _diff(snapshot or {}, records)
+
+    result = {
+        op: sum(1 for c in changes if c[0] == op) for op in ["add", "modify", "delete"]
+    }
+    dry_run = task.is_dry_run(dry_run)
+    if (not changes and snapshot is not None) or dry_run:
+        return Result(host=task.host, result={**result, "method": None})
+
+    try:
+        if external:
+            method = _apply_external(
+                task, data_group, partition, records, data_group_type
+            )
+        else:
+            method = _apply_internal(task, url, changes, records, patch_threshold)
+    except Exception:
+        # The records applied are unknown, the next run takes a new snapshot
+        _save_snapshot(task, full_path, snapshot_dir, None)
+        raise
+    _save_snapshot(task, full_path, snapshot_dir, records)
+
+    return Result(host=task.host, changed=True, result={**result, "method": method})
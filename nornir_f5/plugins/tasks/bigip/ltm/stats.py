@@ -0,0 +1,267 @@
+"""Nornir F5 LTM Statistics tasks.
+
+Collects the statistics of the LTM virtual servers and pools into columnar
+arrays, one array of values per statistic, so that the memory used is
+proportional to the number of objects, and computes their rates and top-N.
+"""
+
+import heapq
+import math
+import threading
+import time
+from array import array
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+
+from nornir.core.task import AggregatedResult, Result, Task
+
+from nornir_f5.plugins.connections import f5_rest_client
+
+LTM_STATS_COMPONENTS = {
+    "pool": {
+        "uri": "/mgmt/tm/ltm/pool/stats",
+        "fields": [
+            "serverside.bitsIn",
+            "serverside.bitsOut",
+            "serverside.curConns",
+            "serverside.pktsIn",
+            "serverside.pktsOut",
+            "serverside.totConns",
+        ],
+    },
+    "virtual": {
+        "uri": "/mgmt/tm/ltm/virtual/stats",
+        "fields": [
+            "clientside.bitsIn",
+            "clientside.bitsOut",
+            "clientside.curConns",
+            "clientside.pktsIn",
+            "clientside.pktsOut",
+            "clientside.totConns",
+        ],
+    },
+}
+LTM_STATS_OPTIONS = ["pool", "virtual"]
+
+# The last sample of each host, to compute the rates
+_samples: Dict[Tuple[str, str, Tuple[str, ...]], "LtmStats"] = {}
+_samples_lock = threading.Lock()
+
+
+@dataclass
+class LtmStats:
+    """Statistics of LTM objects, stored in columns.
+
+    Attributes:
+        kind (str): The kind of objects [pool, virtual].
+        timestamp (float): The time (in seconds since the epoch) of the sample.
+        names (List[str]): The full name of each object.
+        columns (Dict[str, array]): The values of each statistic, in the order of
+            `names`. Missing values are `nan`.
+    """
+
+    kind: str
+    timestamp: float
+    names: List[str] = field(default_factory=list)
+    columns: Dict[str, array] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        """Returns the number of objects.
+
+        Returns:
+            int: The number of objects.
+        """
+        return len(self.names)
+
+    def delta(self, previous: "LtmStats") -> "LtmStats":
+        """Computes the difference of the values since a previous sample.
+
+        Objects absent from the previous sample are skipped.
+
+        Args:
+            previous (LtmStats): The previous sample.
+
+        Returns:
+            LtmStats: The differences, timestamped with this sample.
+        """
+        index = {name: i for i, name in enumerate(previous.names)}
+        rows = [(i, index[n]) for i, n in enumerate(self.names) if n in index]
+        return LtmStats(
+            kind=self.kind,
+            timestamp=self.timestamp,
+            names=[self.names[i] for i, _j in rows],
+            columns={
+                f: array("d", (values[i] - previous.columns[f][j] for i, j in rows))
+                for f, values in self.columns.items()
+                if f in previous.columns
+            },
+        )
+
+    def rates(self, previous: "LtmStats") -> "LtmStats":
+        """Computes the per-second rates of the counters since a previous sample.
+
+        Args:
+            previous (LtmStats): The previous sample.
+
+        Returns:
+            LtmStats: The rates, timestamped with this sample.
+        """
+        delta = self.delta(previous)
+        interval = self.timestamp - previous.timestamp
+        for f, values in delta.columns.items():
+            delta.columns[f] = array(
+                "d", (v / interval if interval > 0 else math.nan for v in values)
+            )
+        return delta
+
+    def top(self, stat: str, n: int = 10) -> List[Tuple[str, float]]:
+        """Returns the objects with the largest values of a statistic.
+
+        Args:
+            stat (str): The statistic (e.g. `clientside.curConns`).
+            n (int): The number of objects.
+
+        Returns:
+            List[Tuple[str, float]]: The name and value of the objects, from the
+                largest value.
+        """
+        values = self.columns[stat]
+        rows = (i for i in range(len(values)) if not math.isnan(values[i]))
+        return [
+            (self.names[i], values[i])
+            for i in heapq.nlargest(n, rows, key=values.__getitem__)
+        ]
+
+    def total(self, stat: str) -> float:
+        """Returns the sum of a statistic, ignoring the missing values.
+
+        Args:
+            stat (str): The statistic (e.g. `clientside.curConns`).
+
+        Returns:
+            float: The sum.
+        """
+        return math.fsum(v for v in self.columns[stat] if not math.isnan(v))
+
+    @classmethod
+    def concat(cls, stats: Mapping[str, "LtmStats"]) -> "LtmStats":
+        """Concatenates the statistics of several hosts.
+
+        Args:
+            stats (Mapping[str, LtmStats]): The statistics of each host.
+
+        Returns:
+            LtmStats: The statistics of all the hosts, named `<host>:<name>`
+                and timestamped with the oldest sample.
+
+        Raises:
+            Exception: The raised exception when the samples are of different
+                kinds.
+        """
+        kinds = {s.kind for s in stats.values()}
+        if len(kinds) > 1:
+            raise Exception(f"LTM stats of different kinds: {sorted(kinds)}.")
+        fields = sorted({f for s in stats.values() for f in s.columns})
+
+        fleet = cls(
+            kind=kinds.pop() if kinds else "",
+            timestamp=min((s.timestamp for s in stats.values()), default=0.0),
+            columns={f: array("d") for f in fields},
+        )
+        for host, s in stats.items():
+            fleet.names.extend(f"{host}:{name}" for name in s.names)
+            for f in fields:
+                fleet.columns[f].extend(
+                    s.columns[f] if f in s.columns else array("d", [math.nan]) * len(s)
+                )
+        return fleet
+
+
+def aggregate_ltm_stats(result: AggregatedResult) -> LtmStats:
+    """Concatenates the LTM statistics of the hosts of a fleet.
+
+    Args:
+        result (AggregatedResult): The result of the `bigip_ltm_stats` task.
+            Failed hosts are skipped.
+
+    Returns:
+        LtmStats: The statistics of all the hosts, named `<host>:<name>`.
+    """
+    return LtmStats.concat(
+        {
+            host: r.result
+            for host, r in result.items()
+            if not r.failed and isinstance(r.result, LtmStats)
+        }
+    )
+
+
+def _iter_objects(entries: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    # The stats of each object are nested one or more levels deep, depending on
+    # the version
+    for entry in entries.values():
+        nested = entry.get("nestedStats", {}).get("entries", {})
+        if "tmName" in nested:
+            yield nested
+        else:
+            yield from _iter_objects(nested)
+
+
+def _parse_ltm_stats(
+    data: dict, kind: str, fields: List[str], timestamp: float
+) -> LtmStats:
+    stats = LtmStats(
+        kind=kind, timestamp=timestamp, columns={f: array("d") for f in fields}
+    )
+    for entries in _iter_objects(data.get("entries", {})):
+        stats.names.append(entries["tmName"]["description"])
+        for f in fields:
+            stats.columns[f].append(float(entries.get(f, {}).get("value", math.nan)))
+    return stats
+
+
+def bigip_ltm_stats(
+    task: Task,
+    kind: str = "virtual",
+    fields: Optional[List[str]] = None,
+    rates: bool = False,
+) -> Result:
+    """Task to get the statistics of the LTM virtual servers or pools.
+
+    Only the requested statistics are selected (`$select`), and flattened into
+    one array per statistic.
+
+    Args:
+        task (Task): The Nornir task.
+        kind (str): The kind of objects. Accepted values include [pool, virtual].
+        fields (Optional[List[str]]): The statistics to get
+            (e.g. `clientside.bitsIn`). Defaults to the traffic statistics.
+        rates (bool): Whether to return the per-second rates since the previous
+            sample of the host, rather than the values. The first sample of a
+            host returns `None`.
+
+    Returns:
+        Result: The statistics (`LtmStats`).
+
+    Raises:
+        Exception: The raised exception when the task had an error.
+    """
+    if kind not in LTM_STATS_OPTIONS:
+        raise Exception(f"LTM stats kind {kind!r} is not valid.")
+    fields = fields or LTM_STATS_COMPONENTS[kind]["fields"]
+
+    resp = f5_rest_client(task).get(
+        f"https://{task.host.hostname}:{task.host.port}"
+        f"{LTM_STATS_COMPONENTS[kind]['uri']}",
+        params={"$select": ",".join(["tmName", *fields])},
+    )
+    stats = _parse_ltm_stats(resp.json(), kind, fields, time.time())
+
+    if not rates:
+        return Result(host=task.host, result=stats)
+
+    key = (task.host.name, kind, tuple(fields))
+    with _samples_lock:
+        previous = _samples.get(key)
+        _samples[key] = stats
+    return Result(host=task.host, result=stats.rates(previous) if previous else None)
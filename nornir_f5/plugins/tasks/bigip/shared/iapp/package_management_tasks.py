@@ -1,12 +1,13 @@
 """Nornir F5 Package Management tasks."""
+
 import os
 import time
 from typing import Optional
 
 from nornir.core.task import Result, Task
-from packaging.version import Version
 
 from nornir_f5.plugins.connections import f5_rest_client
+from nornir_f5.plugins.facts import invalidate_facts
 from nornir_f5.plugins.tasks.bigip.shared.file_transfer.uploads import (
     FILE_TRANSFER_OPTIONS,
     bigip_shared_file_transfer_uploads,
@@ -73,6 +74,9 @@ def bigip_shared_iapp_lx_package(
     Raises:
         Exception: The raised exception when the task had an error.
     """
+    # Only loaded when managing LX packages
+    from packaging.version import Version
+
     client = f5_rest_client(task)
 
     # Check if LX is supported on the BIG-IP
@@ -130,6 +134,9 @@ def bigip_shared_iapp_lx_package(
         task_id=task_id,
     )
 
+    # The installed packages (e.g. ATC services) changed
+    invalidate_facts(host, "atc", "lx_packages")
+
     # Absent
     if state == "absent":
         return Result(
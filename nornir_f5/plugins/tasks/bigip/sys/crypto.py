@@ -0,0 +1,187 @@
+"""Nornir F5 Crypto tasks.
+
+Deploys certificates and keys in bulk. Each certificate is read once per
+process, however many hosts it is deployed to, and the certificates already
+installed with the same fingerprint are skipped. The keys are not kept in memory,
+they are read for each host.
+"""
+
+import base64
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from nornir.core.task import Result, Task
+
+from nornir_f5.plugins.connections import f5_rest_client
+from nornir_f5.plugins.tasks.bigip.shared.file_transfer.uploads import (
+    FILE_TRANSFER_OPTIONS,
+)
+from nornir_f5.plugins.tasks.bigip.util.unix_ls import _map
+from nornir_f5.plugins.tasks.bigip.util.unix_rm import _unix_rm
+
+CRYPTO_CERT_URI = "/mgmt/tm/sys/crypto/cert"
+CRYPTO_FILES_MAX_SIZE = 1024
+CRYPTO_KEY_URI = "/mgmt/tm/sys/crypto/key"
+CRYPTO_MAX_WORKERS = 4
+PEM_CERT_PATTERN = re.compile(
+    rb"-----BEGIN CERTIFICATE-----(.+?)-----END CERTIFICATE-----", re.DOTALL
+)
+
+# The content of the certificates read, by path, modification time and size
+_files: "OrderedDict[Tuple[str, int, int], bytes]" = OrderedDict()
+_files_lock = threading.Lock()
+
+
+def _read_file(path: str) -> bytes:
+    stat = os.stat(path)
+    key = (os.path.realpath(path), stat.st_mtime_ns, stat.st_size)
+    with _files_lock:
+        if key not in _files:
+            with open(path, "rb") as f:
+                _files[key] = f.read()
+            if len(_files) > CRYPTO_FILES_MAX_SIZE:
+                _files.popitem(last=False)
+        _files.move_to_end(key)
+        return _files[key]
+
+
+def clear_crypto_files() -> None:
+    """Clears the certificates read by the crypto task."""
+    with _files_lock:
+        _files.clear()
+
+
+def _fingerprint(path: str) -> str:
+    # The SHA-256 of the (first) certificate, as reported by the BIG-IP
+    match = PEM_CERT_PATTERN.search(_read_file(path))
+    if match is None:
+        raise Exception(f"File {path!r} is not a PEM certificate.")
+    digest = hashlib.sha256(base64.b64decode(b"".join(match[1].split()))).hexdigest()
+    return "SHA256/" + ":".join(
+        digest[i : i + 2].upper() for i in range(0, len(digest), 2)
+    )
+
+
+def _get_fingerprints(task: Task) -> Dict[str, Optional[str]]:
+    resp = f5_rest_client(task).get(
+        f"https://{task.host.hostname}:{task.host.port}{CRYPTO_CERT_URI}",
+        params={"$select": "fullPath,fingerprint"},
+    )
+    return {
+        item["fullPath"]: item.get("fingerprint")
+        for item in resp.json().get("items", [])
+    }
+
+
+def _install(task: Task, item: Dict[str, Any], uploaded: List[str]) -> float:
+    start = time.monotonic()
+    host = f"{task.host.hostname}:{task.host.port}"
+    uri = FILE_TRANSFER_OPTIONS["file"]["endpoints"]["uploads"]["uri"]
+    directory = FILE_TRANSFER_OPTIONS["file"]["directory"]
+
+    # The key is installed before its certificate
+    for kind, uri_install in [("key", CRYPTO_KEY_URI), ("cert", CRYPTO_CERT_URI)]:
+        if not item.get(kind):
+            continue
+        # The keys are not cached
+        if kind == "key":
+            with open(item[kind], "rb") as f:
+                data = f.read()
+        else:
+            data = _read_file(item[kind])
+        file_name = f"{item['partition']}~{item['name']}.{kind}"
+        f5_rest_client(task).post(
+            f"https://{host}{uri}/{file_name}",
+            data=data,
+            headers={
+                "Content-Type": "application/octet-stream",
+                "Content-Range": f"0-{len(data) - 1}/{len(data)}",
+            },
+        )
+        uploaded.append(f"{directory}/{file_name}")
+
+        install = {
+            "command": "install",
+            "name": f"/{item['partition']}/{item['name']}",
+            "from-local-file": f"{directory}/{file_name}",
+        }
+        if kind == "key" and item.get("passphrase"):
+            install["passphrase"] = item["passphrase"]
+        f5_rest_client(task).post(f"https://{host}{uri_install}", json=install)
+
+    return round(time.monotonic() - start, 3)
+
+
+def bigip_sys_crypto(
+    task: Task,
+    certificates: List[Dict[str, Any]],
+    dry_run: Optional[bool] = None,
+    max_workers: int = CRYPTO_MAX_WORKERS,
+) -> Result:
+    """Task to deploy certificates and keys to a BIG-IP system.
+
+    The fingerprints of the installed certificates are got in one call, and
+    the certificates already installed with the same fingerprint (and their
+    keys) are skipped. The others are uploaded and installed concurrently, then
+    the uploaded files are deleted.
+
+    Args:
+        task (Task): The Nornir task.
+        certificates (List[Dict[str, Any]]): The certificates to deploy, each
+            with its `name`, the path of its PEM `cert` file, and optionally the
+            path of its `key` file, the `passphrase` of the key and its
+            `partition` (defaults to `Common`).
+        dry_run (Optional[bool]): Whether to apply changes or not.
+        max_workers (int): The maximum number of certificates installed at once.
+
+    Returns:
+        Result: The status of each certificate [unchanged, missing, installed],
+            by full path, with the time (in seconds) taken to install it.
+
+    Raises:
+        Exception: The raised exception when the uploaded files are not deleted.
+    """
+    items = {}
+    for certificate in certificates:
+        item = {"partition": "Common", **certificate}
+        items[f"/{item['partition']}/{item['name']}"] = item
+
+    fingerprints = _get_fingerprints(task)
+    missing = [
+        path
+        for path, item in items.items()
+        if fingerprints.get(path) != _fingerprint(item["cert"])
+    ]
+    result: Dict[str, Dict[str, Any]] = {
+        path: {"status": "missing" if path in missing else "unchanged"}
+        for path in items
+    }
+
+    dry_run = task.is_dry_run(dry_run)
+    if dry_run or not missing:
+        return Result(host=task.host, result=result)
+
+    # The uploaded files (including the keys) are not left on the device, even
+    # if an installation failed
+    uploaded: List[str] = []
+    try:
+        installed = _map(
+            task,
+            lambda path: _install(task, items[path], uploaded),
+            missing,
+            max_workers,
+        )
+    finally:
+        errors = _unix_rm(task, uploaded) if uploaded else {}
+    if any(errors.values()):
+        raise Exception("; ".join(e for e in errors.values() if e))
+
+    for path, elapsed in installed.items():
+        result[path] = {"status": "installed", "elapsed": elapsed}
+
+    return Result(host=task.host, changed=True, result=result)
@@ -0,0 +1,321 @@
+"""Nornir F5 Software tasks.
+
+Installs software images as a pipeline of stages (upload, checksum, install and
+reboot). Only the uploads are bounded fleet-wide, by a number of concurrent
+uploads and a bandwidth, so that the upload of an image to a host overlaps with
+the installation on the others.
+"""
+
+import hashlib
+import os
+import shlex
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from nornir.core.task import Result, Task
+
+from nornir_f5.plugins.connections import f5_rest_client
+from nornir_f5.plugins.facts import invalidate_facts
+from nornir_f5.plugins.tasks.polling import backoff_delays, get_with_outages
+
+SOFTWARE_CHECKSUM_TIMEOUT = 900  # seconds
+SOFTWARE_CHUNK_SIZE = 1024 * 1024  # bytes
+SOFTWARE_IMAGE_URI = "/mgmt/tm/sys/software/image"
+SOFTWARE_IMAGES_DIRECTORY = "/shared/images"
+SOFTWARE_MAX_CONCURRENT_UPLOADS = 2
+SOFTWARE_POLL_INITIAL_DELAY = 5.0  # seconds
+SOFTWARE_UPLOADS_URI = "/mgmt/cm/autodeploy/software-image-uploads"
+SOFTWARE_VOLUME_URI = "/mgmt/tm/sys/software/volume"
+
+# The upload slots and bandwidths shared by all the hosts, by their limit
+_upload_slots: Dict[int, threading.BoundedSemaphore] = {}
+_bandwidths: Dict[float, "_Bandwidth"] = {}
+_uploads_lock = threading.Lock()
+
+# The checksums of the local images, by path, modification time and size
+_checksums: Dict[Tuple[str, int, int], str] = {}
+_checksums_lock = threading.Lock()
+
+
+class _Bandwidth:
+    """Bandwidth (in bytes per second) shared by the uploads."""
+
+    def __init__(self, rate: float) -> None:
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._available_at = time.monotonic()
+
+    def wait(self, size: int) -> None:
+        # Each chunk is scheduled after the previous ones, as per the rate
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._available_at, now)
+            self._available_at = start + size / self.rate
+        time.sleep(start - now)
+
+
+def _get_upload_slots(max_concurrent_uploads: int) -> threading.BoundedSemaphore:
+    with _uploads_lock:
+        if max_concurrent_uploads not in _upload_slots:
+            _upload_slots[max_concurrent_uploads] = threading.BoundedSemaphore(
+                max_concurrent_uploads
+            )
+        return _upload_slots[max_concurrent_uploads]
+
+
+def _get_bandwidth(bandwidth: float) -> _Bandwidth:
+    with _uploads_lock:
+        if bandwidth not in _bandwidths:
+            _bandwidths[bandwidth] = _Bandwidth(bandwidth)
+        return _bandwidths[bandwidth]
+
+
+def _sha256(file_path: str, chunk_size: int) -> str:
+    # Each image is checksummed once per process, however many hosts it is
+    # installed on
+    stat = os.stat(file_path)
+    key = (os.path.realpath(file_path), stat.st_mtime_ns, stat.st_size)
+    with _checksums_lock:
+        if key in _checksums:
+            return _checksums[key]
+
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha256.update(chunk)
+    with _checksums_lock:
+        return _checksums.setdefault(key, sha256.hexdigest())
+
+
+def _get_images(task: Task) -> Dict[str, Any]:
+    resp = f5_rest_client(task).get(
+        f"https://{task.host.hostname}:{task.host.port}{SOFTWARE_IMAGE_URI}"
+    )
+    return {item["name"]: item for item in resp.json().get("items", [])}
+
+
+def _get_checksum(task: Task, image: str) -> str:
+    # Checksumming an image of several GB takes minutes
+    command = f"sha256sum {shlex.quote(f'{SOFTWARE_IMAGES_DIRECTORY}/{image}')}"
+    resp = f5_rest_client(task).post(
+        f"https://{task.host.hostname}:{task.host.port}/mgmt/tm/util/bash",
+        json={"command": "run", "utilCmdArgs": f"-c {shlex.quote(command)}"},
+        timeout=SOFTWARE_CHECKSUM_TIMEOUT,
+    )
+    return resp.json().get("commandResult", "").split(" ")[0]
+
+
+def _upload_image(
+    task: Task,
+    local_file_path: str,
+    bandwidth: Optional[float],
+    chunk_size: int,
+    max_concurrent_uploads: int,
+) -> str:
+    url = (
+        f"https://{task.host.hostname}:{task.host.port}{SOFTWARE_UPLOADS_URI}/"
+        f"{os.path.basename(local_file_path)}"
+    )
+    file_size = os.stat(local_file_path).st_size
+    limiter = _get_bandwidth(bandwidth) if bandwidth else None
+    sha256 = hashlib.sha256()
+
+    # The image is streamed from the disk, checksummed on the way
+    with _get_upload_slots(max_concurrent_uploads), open(local_file_path, "rb") as f:
+        offset = 0
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            if limiter is not None:
+                limiter.wait(len(chunk))
+            f5_rest_client(task).post(
+                url,
+                data=chunk,
+                headers={
+                    "Content-Type": "application/octet-stream",
+                    "Content-Range": f"{offset}-{offset + len(chunk) - 1}/{file_size}",
+                },
+            )
+            sha256.update(chunk)
+            offset += len(chunk)
+
+    return sha256.hexdigest()
+
+
+def _wait_volume(
+    task: Task,
+    volume: str,
+    software: Dict[str, Any],
+    delay: int,
+    deadline: float,
+    active: bool,
+) -> Dict[str, Any]:
+    url = f"https://{task.host.hostname}:{task.host.port}{SOFTWARE_VOLUME_URI}"
+    status = None
+
+    delays = backoff_delays(SOFTWARE_POLL_INITIAL_DELAY, delay)
+    while time.monotonic() < deadline:
+        time.sleep(next(delays))
+        # The device is unreachable while rebooting
+        items = get_with_outages(task, url, delay, deadline).get("items", [])
+        item = next((i for i in items if i["name"] == volume), {})
+        status = item.get("status")
+        if status is not None and status.startswith("failed"):
+            raise Exception(
+                f"The installation on volume {volume} has failed ({status})."
+            )
+        # A volume still holding its previous software is not complete
+        installed = all(item.get(k) == v for k, v in software.items())
+        if status == "complete" and installed and (item.get("active") or not active):
+            return item
+
+    raise Exception(
+        f"The installation on volume {volume} has reached the deadline ({status})."
+    )
+
+
+def _run_stage(
+    timings: Dict[str, float], stage: str, func: Callable[..., Any], *args: Any
+) -> Any:
+    start = time.monotonic()
+    try:
+        return func(*args)
+    finally:
+        timings[stage] = round(time.monotonic() - start, 3)
+
+
+def bigip_sys_software_install(
+    task: Task,
+    local_file_path: str,
+    volume: str,
+    bandwidth: Optional[float] = None,
+    chunk_size: int = SOFTWARE_CHUNK_SIZE,
+    delay: int = 30,
+    dry_run: Optional[bool] = None,
+    max_concurrent_uploads: int = SOFTWARE_MAX_CONCURRENT_UPLOADS,
+    reboot: bool = False,
+    timeout: int = 3600,
+) -> Result:
+    """Task to install a software image on a BIG-IP system.
+
+    The image is uploaded (unless already on the device with the same
+    checksum), its checksum verified, then installed on the volume, until the
+    volume reports the version and build of the image. The device is optionally
+    rebooted to the volume, and its cached facts are invalidated. The uploads
+    are bounded fleet-wide, while the other stages are not, so that the hosts
+    waiting for their installation let the others upload.
+
+    Args:
+        task (Task): The Nornir task.
+        local_file_path (str): The full path of the image to be installed.
+        volume (str): The volume on which to install the image (e.g. `HD1.2`).
+        bandwidth (Optional[float]): The maximum bandwidth (in bytes per second)
+            of the uploads, by all the hosts. Defaults to no limit.
+        chunk_size (int): The size (in bytes) of the chunks uploaded.
+        delay (int): The maximum delay (in seconds) between retries when checking
+            if the installation or reboot is complete. The status is first
+            checked after a short delay, which is then doubled on each retry up to
+            this value.
+        dry_run (Optional[bool]): Whether to apply changes or not.
+        max_concurrent_uploads (int): The maximum number of images uploaded at
+            once, by all the hosts.
+        reboot (bool): Whether to reboot the device to the volume once installed.
+        timeout (int): The maximum time (in seconds) to wait for the installation
+            and the reboot to complete.
+
+    Returns:
+        Result: The image, volume and software version installed, whether the
+            image was uploaded, and the time (in seconds) taken by each stage.
+
+    Raises:
+        Exception: The raised exception when the task had an error.
+    """
+    host = f"{task.host.hostname}:{task.host.port}"
+    image = os.path.basename(local_file_path)
+    timings: Dict[str, float] = {}
+
+    dry_run = task.is_dry_run(dry_run)
+    if dry_run:
+        return Result(host=task.host, result=None)
+
+    # The image is only uploaded when not already on the device
+    checksum = None
+    images = _get_images(task)
+    if image in images:
+        checksum = _sha256(local_file_path, chunk_size)
+    if (
+        checksum is None
+        or _run_stage(timings, "checksum", _get_checksum, task, image) != checksum
+    ):
+        checksum = _run_stage(
+            timings,
+            "upload",
+            _upload_image,
+            task,
+            local_file_path,
+            bandwidth,
+            chunk_size,
+            max_concurrent_uploads,
+        )
+        if _run_stage(timings, "checksum", _get_checksum, task, image) != checksum:
+            raise Exception(f"The checksum of the image {image} does not match.")
+        images = _get_images(task)
+
+    # The software of the image, as reported by the volume once installed
+    software = {
+        k: v for k, v in images.get(image, {}).items() if k in ["build", "version"]
+    }
+
+    deadline = time.monotonic() + timeout
+    f5_rest_client(task).post(
+        f"https://{host}{SOFTWARE_IMAGE_URI}",
+        json={
+            "command": "install",
+            "name": image,
+            "volume": volume,
+            "options": [{"create-volume": True}],
+        },
+    )
+    # The software and its volume, then the running version, change
+    try:
+        item = _run_stage(
+            timings,
+            "install",
+            _wait_volume,
+            task,
+            volume,
+            software,
+            delay,
+            deadline,
+            False,
+        )
+
+        if reboot:
+            f5_rest_client(task).post(
+                f"https://{host}/mgmt/tm/sys",
+                json={"command": "reboot", "volume": volume},
+            )
+            item = _run_stage(
+                timings,
+                "reboot",
+                _wait_volume,
+                task,
+                volume,
+                software,
+                delay,
+                deadline,
+                True,
+            )
+    finally:
+        invalidate_facts(host)
+
+    return Result(
+        host=task.host,
+        changed=True,
+        result={
+            "image": image,
+            "timings": timings,
+            "uploaded": "upload" in timings,
+            "version": item.get("version"),
+            "volume": volume,
+        },
+    )
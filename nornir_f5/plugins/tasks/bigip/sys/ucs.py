@@ -0,0 +1,254 @@
+"""Nornir F5 UCS tasks.
+
+The UCS archives are downloaded in ranged chunks into a content-addressed store:
+each chunk is stored once under its SHA-256, so that the chunks identical across
+the backups (of the same or other devices) are not stored again. Each backup is
+described by a manifest listing its chunks, from which the archive is assembled
+(`assemble_ucs`).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from nornir.core.task import Result, Task
+
+from nornir_f5.plugins.connections import f5_rest_client
+from nornir_f5.plugins.tasks.bigip.util.unix_rm import bigip_util_unix_rm
+from nornir_f5.plugins.tasks.polling import backoff_delays
+
+UCS_CHUNK_SIZE = 1024 * 1024  # bytes
+UCS_DIRECTORY = "/var/local/ucs"
+UCS_DOWNLOADS_URI = "/mgmt/shared/file-transfer/ucs-downloads"
+UCS_MAX_CONCURRENT_DOWNLOADS = 4
+UCS_POLL_INITIAL_DELAY = 1.0  # seconds
+UCS_TASK_URI = "/mgmt/tm/task/sys/ucs"
+
+# The download slots shared by all the hosts, by maximum number of downloads
+_download_slots: Dict[int, threading.BoundedSemaphore] = {}
+_download_slots_lock = threading.Lock()
+
+
+def _get_download_slots(max_concurrent_downloads: int) -> threading.BoundedSemaphore:
+    with _download_slots_lock:
+        if max_concurrent_downloads not in _download_slots:
+            _download_slots[max_concurrent_downloads] = threading.BoundedSemaphore(
+                max_concurrent_downloads
+            )
+        return _download_slots[max_concurrent_downloads]
+
+
+def _chunk_path(store_dir: str, digest: str) -> str:
+    return os.path.join(store_dir, "chunks", digest[:2], digest)
+
+
+def _store_chunk(store_dir: str, chunk: bytes) -> bool:
+    digest = hashlib.sha256(chunk).hexdigest()
+    path = _chunk_path(store_dir, digest)
+    if os.path.exists(path):
+        return False
+
+    # Written under a temporary name, so that a partial chunk is never stored
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(chunk)
+    os.replace(tmp_path, path)
+    return True
+
+
+def _save_ucs(
+    task: Task,
+    archive_name: str,
+    delay: int,
+    retries: int,
+    no_private_key: bool,
+    passphrase: Optional[str],
+) -> Result:
+    url = f"https://{task.host.hostname}:{task.host.port}{UCS_TASK_URI}"
+    data: Dict[str, Any] = {"command": "save", "name": archive_name}
+    options = [{"no-private-key": ""}] if no_private_key else []
+    if passphrase:
+        options.append({"passphrase": passphrase})
+    if options:
+        data["options"] = options
+
+    # The archive is created by an asynchronous task, which is then polled
+    task_id = f5_rest_client(task).post(url, json=data).json()["_taskId"]
+    f5_rest_client(task).put(f"{url}/{task_id}", json={"_taskState": "VALIDATING"})
+
+    delays = backoff_delays(UCS_POLL_INITIAL_DELAY, delay)
+    for _i in range(retries):
+        time.sleep(next(delays))
+        resp = f5_rest_client(task).get(f"{url}/{task_id}").json()
+        if resp["_taskState"] == "COMPLETED":
+            return Result(host=task.host, result=task_id)
+        if resp["_taskState"] == "FAILED":
+            raise Exception(
+                f"The UCS archive creation has failed: {resp.get('errorMessage')}"
+            )
+
+    raise Exception("The UCS archive creation has reached maximum retries.")
+
+
+def _download_ucs(task: Task, name: str, chunk_size: int, store_dir: str) -> dict:
+    url = f"https://{task.host.hostname}:{task.host.port}{UCS_DOWNLOADS_URI}/{name}"
+    sha256 = hashlib.sha256()
+    chunks = []
+    new_chunks = 0
+    start = 0
+    size = None
+
+    while size is None or start < size:
+        end = start + chunk_size - 1
+        resp = f5_rest_client(task).get(url, headers={"Range": f"bytes={start}-{end}"})
+        # The Content-Range header is `<start>-<end>/<size>`
+        size = int(resp.headers["Content-Range"].split("/")[-1])
+        chunk = resp.content
+        if not chunk and start < size:
+            raise Exception(f"The download of the UCS archive {name!r} has stalled.")
+
+        sha256.update(chunk)
+        chunks.append(hashlib.sha256(chunk).hexdigest())
+        new_chunks += _store_chunk(store_dir, chunk)
+        start += len(chunk)
+
+    return {
+        "name": name,
+        "size": size,
+        "sha256": sha256.hexdigest(),
+        "chunks": chunks,
+        "new_chunks": new_chunks,
+    }
+
+
+def assemble_ucs(manifest_path: str, file_path: str) -> str:
+    """Assembles a UCS archive from its manifest and the content-addressed store.
+
+    Args:
+        manifest_path (str): The path of the manifest of the backup.
+        file_path (str): The path of the archive to write.
+
+    Returns:
+        str: The SHA-256 of the archive.
+
+    Raises:
+        Exception: The raised exception when the archive is corrupted.
+    """
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    store_dir = os.path.dirname(os.path.dirname(os.path.abspath(manifest_path)))
+
+    sha256 = hashlib.sha256()
+    with open(file_path, "wb") as archive:
+        for digest in manifest["chunks"]:
+            with open(_chunk_path(store_dir, digest), "rb") as f:
+                chunk = f.read()
+            sha256.update(chunk)
+            archive.write(chunk)
+
+    if sha256.hexdigest() != manifest["sha256"]:
+        raise Exception(f"The UCS archive {manifest['name']!r} is corrupted.")
+    return sha256.hexdigest()
+
+
+def bigip_sys_ucs_backup(
+    task: Task,
+    store_dir: str,
+    archive_name: Optional[str] = None,
+    chunk_size: int = UCS_CHUNK_SIZE,
+    cleanup: bool = True,
+    delay: int = 10,
+    dry_run: Optional[bool] = None,
+    max_concurrent_downloads: int = UCS_MAX_CONCURRENT_DOWNLOADS,
+    no_private_key: bool = False,
+    passphrase: Optional[str] = None,
+    retries: int = 60,
+) -> Result:
+    """Task to back up a BIG-IP system into a UCS archive.
+
+    The archive is created on the device, then downloaded in ranged chunks into
+    a content-addressed store (`<store_dir>/chunks`), where the chunks already
+    stored by previous backups are not written again. The manifest of the backup
+    is written to `<store_dir>/<host>/<archive_name>.json`, and the archive can
+    be assembled with `assemble_ucs`.
+
+    Args:
+        task (Task): The Nornir task.
+        store_dir (str): The directory of the content-addressed store.
+        archive_name (Optional[str]): The name of the archive. Defaults to the
+            name of the host followed by the current time.
+        chunk_size (int): The size (in bytes) of the chunks downloaded.
+        cleanup (bool): Whether to delete the archive from the device once
+            downloaded, or once the download has failed.
+        delay (int): The maximum delay (in seconds) between retries when checking
+            if the archive is created. The creation is first checked after a
+            short delay, which is then doubled on each retry up to this value.
+        dry_run (Optional[bool]): Whether to apply changes or not.
+        max_concurrent_downloads (int): The maximum number of archives downloaded
+            at once, by all the hosts. The archives are still created concurrently.
+        no_private_key (bool): Whether to exclude the private keys from the
+            archive.
+        passphrase (Optional[str]): The passphrase encrypting the archive.
+        retries (int): The number of times the task will check for the created
+            archive before failing.
+
+    Returns:
+        Result: The manifest of the backup, with the number of new chunks stored.
+    """
+    if archive_name is None:
+        archive_name = f"{task.host.name}-{time.strftime('%Y%m%d%H%M%S')}.ucs"
+    if not archive_name.endswith(".ucs"):
+        archive_name = f"{archive_name}.ucs"
+
+    dry_run = task.is_dry_run(dry_run)
+    if dry_run:
+        return Result(host=task.host, result=None)
+
+    task.run(
+        name="Create the UCS archive",
+        task=_save_ucs,
+        delay=delay,
+        no_private_key=no_private_key,
+        passphrase=passphrase,
+        retries=retries,
+        archive_name=archive_name,
+        severity_level=logging.DEBUG,
+    )
+
+    # Once created, the archive is deleted even if the backup fails
+    try:
+        # The downloads are bounded fleet-wide, not to saturate the management
+        # links
+        with _get_download_slots(max_concurrent_downloads):
+            manifest = _download_ucs(task, archive_name, chunk_size, store_dir)
+
+        manifest_path = os.path.join(store_dir, task.host.name, f"{archive_name}.json")
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        with open(manifest_path, "w") as f:
+            json.dump({k: v for k, v in manifest.items() if k != "new_chunks"}, f)
+    finally:
+        if cleanup:
+            task.run(
+                name="Delete the UCS archive",
+                task=bigip_util_unix_rm,
+                file_path=f"{UCS_DIRECTORY}/{archive_name}",
+                severity_level=logging.DEBUG,
+            )
+
+    return Result(
+        host=task.host,
+        changed=True,
+        result={
+            "chunks": len(manifest["chunks"]),
+            "manifest": manifest_path,
+            "name": archive_name,
+            "new_chunks": manifest["new_chunks"],
+            "sha256": manifest["sha256"],
+            "size": manifest["size"],
+        },
+    )
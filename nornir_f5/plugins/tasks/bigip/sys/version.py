@@ -3,20 +3,32 @@
 from nornir.core.task import Result, Task
 
 from nornir_f5.plugins.connections import f5_rest_client
+from nornir_f5.plugins.facts import get_fact
+
+VERSION_URI = "/mgmt/tm/sys/version"
+
+
+def _parse_version(data: dict) -> str:
+    return data["entries"][f"https://localhost{VERSION_URI}/0"]["nestedStats"][
+        "entries"
+    ]["Version"]["description"]
 
 
 def bigip_sys_version(task: Task) -> Result:
     """Gets the system version of the BIG-IP.
 
+    The version is read from the facts cache, when enabled.
+
     Args:
         task: (Task): The Nornir task.
 
     Returns:
         Result: The system version of the BIG-IP.
     """
-    resp = f5_rest_client(task).get(
-        f"https://{task.host.hostname}:{task.host.port}/mgmt/tm/sys/version"
-    )
-    return resp.json()["entries"]["https://localhost/mgmt/tm/sys/version/0"][
-        "nestedStats"
-    ]["entries"]["Version"]["description"]
+    host = f"{task.host.hostname}:{task.host.port}"
+
+    def get_version() -> str:
+        resp = f5_rest_client(task).get(f"https://{host}{VERSION_URI}")
+        return _parse_version(resp.json())
+
+    return get_fact(host, "version", get_version)
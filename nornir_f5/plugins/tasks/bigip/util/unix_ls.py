@@ -1,34 +1,121 @@
 """Nornir F5 Unix ls tasks."""
 
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatchcase
+from typing import Any, Callable, Dict, Iterable, List, TypeVar, Union
+
 from nornir.core.task import Result, Task
 
 from nornir_f5.plugins.connections import f5_rest_client
 
+NOT_FOUND = "No such file or directory"
+UNIX_LS_URI = "/mgmt/tm/util/unix-ls"
+UTIL_MAX_WORKERS = 8
 
-def bigip_util_unix_ls(task: Task, file_path: str) -> Result:
-    """Task to list information about the FILEs.
+T = TypeVar("T")
 
-    Args:
-        task (Task): The Nornir task.
-        file_path (str): The file or directory to be listed.
 
-    Returns:
-        Result: The result of the command.
+def _is_pattern(path: str) -> bool:
+    return any(c in path for c in "*?[")
 
-    Raises:
-        Exception: The raised exception when the task had an error.
-    """
-    data = {"command": "run", "utilCmdArgs": file_path}
+
+def _map(
+    task: Task, func: Callable[[str], T], items: Iterable[str], max_workers: int
+) -> Dict[str, T]:
+    items = list(dict.fromkeys(items))
+    if not items:
+        return {}
+
+    # Open the connection before spawning threads, so that only one login is made
+    f5_rest_client(task)
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        futures = {item: executor.submit(func, item) for item in items}
+        return {item: future.result() for item, future in futures.items()}
+
+
+def _unix_ls(task: Task, file_path: str) -> Any:
     resp = (
         f5_rest_client(task)
         .post(
-            f"https://{task.host.hostname}:{task.host.port}/mgmt/tm/util/unix-ls",
-            json=data,
+            f"https://{task.host.hostname}:{task.host.port}{UNIX_LS_URI}",
+            json={"command": "run", "utilCmdArgs": file_path},
         )
         .json()
     )
 
     if "commandResult" in resp:
-        return Result(host=task.host, result=resp["commandResult"])
+        return resp["commandResult"]
 
     raise Exception("Error while excuting the command.")
+
+
+def _file_names(command_result: Union[str, List[str]]) -> List[str]:
+    if isinstance(command_result, list):
+        return command_result
+    if NOT_FOUND in command_result:
+        return []
+    return command_result.splitlines()
+
+
+def _expand(
+    task: Task, file_paths: List[str], max_workers: int = UTIL_MAX_WORKERS
+) -> Dict[str, List[str]]:
+    # Each directory holding file name patterns is listed once
+    patterns = {p: posixpath.split(p) for p in file_paths if _is_pattern(p)}
+    for path, (directory, _name) in patterns.items():
+        if _is_pattern(directory):
+            raise Exception(f"Only the file name of {path!r} can be a pattern.")
+    listings = _map(
+        task,
+        lambda directory: _file_names(_unix_ls(task, directory)),
+        (directory for directory, _name in patterns.values()),
+        max_workers,
+    )
+
+    return {
+        path: (
+            [
+                posixpath.join(patterns[path][0], n)
+                for n in listings[patterns[path][0]]
+                if fnmatchcase(n, patterns[path][1])
+            ]
+            if path in patterns
+            else [path]
+        )
+        for path in file_paths
+    }
+
+
+def bigip_util_unix_ls(
+    task: Task,
+    file_path: Union[str, List[str]],
+    max_workers: int = UTIL_MAX_WORKERS,
+) -> Result:
+    """Task to list information about the FILEs.
+
+    Args:
+        task (Task): The Nornir task.
+        file_path (Union[str, List[str]]): The file(s) or directory(ies) to be
+            listed. The file names can be glob patterns (e.g. `/var/local/ucs/*.ucs`).
+        max_workers (int): The maximum number of concurrent calls.
+
+    Returns:
+        Result: The result of the command. When several paths or a pattern are
+            provided, the result of each path, or the files matching each pattern.
+    """
+    if isinstance(file_path, str) and not _is_pattern(file_path):
+        return Result(host=task.host, result=_unix_ls(task, file_path))
+
+    file_paths = [file_path] if isinstance(file_path, str) else file_path
+    files = _expand(task, [p for p in file_paths if _is_pattern(p)], max_workers)
+    files.update(
+        _map(
+            task,
+            lambda path: _unix_ls(task, path),
+            (p for p in file_paths if not _is_pattern(p)),
+            max_workers,
+        )
+    )
+
+    return Result(host=task.host, result={p: files[p] for p in file_paths})
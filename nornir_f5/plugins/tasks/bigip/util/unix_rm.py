@@ -1,36 +1,121 @@
 """Nornir F5 Unix rm tasks."""
 
-from typing import Optional
+import shlex
+from typing import Dict, List, Optional, Union
 
+import requests
 from nornir.core.task import Result, Task
 
 from nornir_f5.plugins.connections import f5_rest_client
+from nornir_f5.plugins.tasks.bigip.util.unix_ls import (
+    UTIL_MAX_WORKERS,
+    _expand,
+    _is_pattern,
+    _map,
+)
+
+UNIX_RM_BATCH_SIZE = 100  # files
+UNIX_RM_URI = "/mgmt/tm/util/unix-rm"
+
+
+def _unix_rm(task: Task, file_paths: List[str]) -> Dict[str, Optional[str]]:
+    # The error of each file, if any
+    try:
+        resp = (
+            f5_rest_client(task)
+            .post(
+                f"https://{task.host.hostname}:{task.host.port}{UNIX_RM_URI}",
+                json={
+                    "command": "run",
+                    "utilCmdArgs": " ".join(shlex.quote(f) for f in file_paths),
+                },
+            )
+            .json()
+        )
+    except requests.exceptions.RequestException as e:
+        return dict.fromkeys(file_paths, str(e))
+
+    # The command only outputs its errors, one per line naming the file
+    errors: Dict[str, Optional[str]] = dict.fromkeys(file_paths)
+    for line in resp.get("commandResult", "").splitlines():
+        if not line.strip():
+            continue
+        matches = [f for f in file_paths if f in line]
+        for f in [max(matches, key=len)] if matches else file_paths:
+            errors[f] = errors[f] or line.strip()
+    return errors
 
 
 def bigip_util_unix_rm(
-    task: Task, file_path: str, dry_run: Optional[bool] = None
+    task: Task,
+    file_path: Union[str, List[str]],
+    dry_run: Optional[bool] = None,
+    max_workers: int = UTIL_MAX_WORKERS,
 ) -> Result:
     """Task to delete a file from a BIG-IP system.
 
     Args:
         task (Task): The Nornir task.
-        file_path (str): The file to be deleted.
+        file_path (Union[str, List[str]]): The file(s) to be deleted. The file
+            names can be glob patterns (e.g. `/var/local/ucs/*.ucs`).
         dry_run (Optional[bool]): Whether to apply changes or not.
+        max_workers (int): The maximum number of concurrent calls.
 
     Returns:
-        Result: The result of the command.
+        Result: The result of the command. When several paths or a pattern are
+            provided, the status of the files of each path [deleted, error],
+            with the error message. The task fails if any file is not deleted.
     """
-    data = {"command": "run", "utilCmdArgs": file_path}
+    if isinstance(file_path, str) and not _is_pattern(file_path):
+        data = {"command": "run", "utilCmdArgs": shlex.quote(file_path)}
+
+        dry_run = task.is_dry_run(dry_run)
+        if dry_run:
+            return Result(host=task.host, result=None)
+
+        f5_rest_client(task).post(
+            f"https://{task.host.hostname}:{task.host.port}{UNIX_RM_URI}",
+            json=data,
+        )
+
+        return Result(
+            host=task.host, changed=True, result="The file was successfully deleted."
+        )
+
+    file_paths = [file_path] if isinstance(file_path, str) else file_path
+    files = _expand(task, file_paths, max_workers)
 
     dry_run = task.is_dry_run(dry_run)
     if dry_run:
         return Result(host=task.host, result=None)
 
-    f5_rest_client(task).post(
-        f"https://{task.host.hostname}:{task.host.port}/mgmt/tm/util/unix-rm",
-        json=data,
-    )
+    # The files are deleted in batches, each in one call. A failed batch does
+    # not stop the others, the status of each file is returned.
+    all_files = list(dict.fromkeys(f for paths in files.values() for f in paths))
+    batches = {
+        all_files[i]: all_files[i : i + UNIX_RM_BATCH_SIZE]
+        for i in range(0, len(all_files), UNIX_RM_BATCH_SIZE)
+    }
+    errors: Dict[str, Optional[str]] = {}
+    for batch_errors in _map(
+        task, lambda f: _unix_rm(task, batches[f]), batches, max_workers
+    ).values():
+        errors.update(batch_errors)
 
+    result = {
+        path: {
+            f: (
+                {"status": "error", "message": errors[f]}
+                if errors[f]
+                else {"status": "deleted"}
+            )
+            for f in paths
+        }
+        for path, paths in files.items()
+    }
     return Result(
-        host=task.host, changed=True, result="The file was successfully deleted."
+        host=task.host,
+        changed=any(e is None for e in errors.values()),
+        failed=any(errors.values()),
+        result=result,
     )
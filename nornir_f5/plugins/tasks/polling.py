@@ -0,0 +1,99 @@
+"""Nornir F5 polling helpers.
+
+Allows to poll asynchronous operations with an adaptive backoff, and through the
+outages of the devices (e.g. while rebooting).
+"""
+
+import time
+from contextlib import suppress
+from typing import Any, Dict, Iterator, Optional
+
+import requests
+from nornir.core.task import Task
+
+from nornir_f5.plugins.connections import CONNECTION_NAME, f5_rest_client
+
+OUTAGE_MAX_DELAY = 60  # seconds
+OUTAGE_STATUSES = [401, 500, 502, 503, 504]
+
+
+def backoff_delays(
+    delay: float, max_delay: float, factor: float = 2.0
+) -> Iterator[float]:
+    """Yields exponentially increasing delays, capped at `max_delay`.
+
+    Short operations are detected quickly, while long operations are not
+    polled more often than every `max_delay` seconds.
+
+    Args:
+        delay (float): The first delay (in seconds).
+        max_delay (float): The maximum delay (in seconds).
+        factor (float): The multiplier applied to the delay after each attempt.
+
+    Yields:
+        float: The delay (in seconds) to wait before the next attempt.
+    """
+    delay = min(delay, max_delay)
+    while True:
+        yield delay
+        delay = min(delay * factor, max_delay)
+
+
+def is_outage(e: Exception) -> bool:
+    """Returns whether an error is caused by an outage of the device.
+
+    Args:
+        e (Exception): The error of a request.
+
+    Returns:
+        bool: Whether the device or its REST service (restjavad) is restarting.
+    """
+    if isinstance(e, requests.exceptions.HTTPError):
+        return e.response is not None and e.response.status_code in OUTAGE_STATUSES
+    return isinstance(
+        e,
+        (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.RetryError,
+            requests.exceptions.Timeout,
+        ),
+    )
+
+
+def get_with_outages(
+    task: Task, url: str, delay: float, deadline: Optional[float]
+) -> Dict[str, Any]:
+    """Gets a resource, waiting for the device to come back from outages.
+
+    On an outage, the connection is re-opened (new token) and the request
+    retried after a delay, doubled on each outage, until the deadline.
+
+    Args:
+        task (Task): The Nornir task.
+        url (str): The URL of the resource.
+        delay (float): The first delay (in seconds) after an outage.
+        deadline (Optional[float]): The monotonic time after which the outages
+            are no longer waited for. Defaults to not waiting for them.
+
+    Returns:
+        Dict[str, Any]: The resource.
+
+    Raises:
+        requests.exceptions.RequestException: The error of the request, when not
+            an outage or after the deadline.
+    """
+    while True:
+        try:
+            return f5_rest_client(task).get(url).json()
+        except requests.exceptions.RequestException as e:
+            if deadline is None or not is_outage(e) or time.monotonic() >= deadline:
+                raise
+
+        # Re-open the connection (new token) once the device is back, including
+        # when shared with the aliases of the device. The token of the previous
+        # connection may not be deleted.
+        with suppress(Exception):
+            task.host.connections[CONNECTION_NAME].invalidate()
+            task.host.close_connection(CONNECTION_NAME)
+        time.sleep(max(min(delay, deadline - time.monotonic()), 0))
+        delay = min(delay * 2, OUTAGE_MAX_DELAY)
@@ -0,0 +1,25 @@
+"""Nornir F5 Telemetry receiver."""
+
+from nornir_f5.plugins.telemetry.receiver import (
+    TelemetryMetrics,
+    TelemetryReceiver,
+    TelemetryScraper,
+    decode_events,
+)
+from nornir_f5.plugins.telemetry.sinks import (
+    CallbackSink,
+    JSONLinesSink,
+    RingBufferSink,
+    Sink,
+)
+
+__all__ = (
+    "CallbackSink",
+    "JSONLinesSink",
+    "RingBufferSink",
+    "Sink",
+    "TelemetryMetrics",
+    "TelemetryReceiver",
+    "TelemetryScraper",
+    "decode_events",
+)
@@ -0,0 +1,407 @@
+"""Nornir F5 Telemetry receiver.
+
+Receives the events of Telemetry Streaming (TS) from many BIG-IP systems, pushed
+to an HTTP listener (`Generic_HTTP` consumer) or pulled from the pull consumers
+(`Telemetry_Pull_Consumer`), and writes them in batches to sinks.
+
+The payloads waiting to be written are bounded: when the limit is reached, the
+listener stops reading the requests (`block`), or rejects them (`drop`).
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Union
+
+from nornir.core import Nornir
+from nornir.core.inventory import Host
+
+from nornir_f5.plugins.connections import CONNECTION_NAME, json_loads
+from nornir_f5.plugins.tasks.atc import ATC_COMPONENTS
+from nornir_f5.plugins.telemetry.sinks import Sink
+
+TELEMETRY_OVERFLOW_OPTIONS = ["block", "drop"]
+MAX_BODY_SIZE = 16 * 1024 * 1024  # bytes
+
+
+@dataclass
+class TelemetryMetrics:
+    """Throughput metrics of the receiver.
+
+    Attributes:
+        payloads (int): The number of payloads received.
+        events (int): The number of events decoded.
+        bytes (int): The number of bytes received.
+        batches (int): The number of batches written.
+        written (int): The number of events written.
+        dropped (int): The number of payloads dropped when the receiver was full.
+        errors (int): The number of payloads, pulls and writes that failed.
+        last_error (Optional[str]): The last error.
+        started (float): The time (monotonic, in seconds) the receiver started.
+    """
+
+    payloads: int = 0
+    events: int = 0
+    bytes: int = 0  # noqa A003
+    batches: int = 0
+    written: int = 0
+    dropped: int = 0
+    errors: int = 0
+    last_error: Optional[str] = None
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def events_per_sec(self) -> float:
+        """The number of events decoded per second since the receiver started.
+
+        Returns:
+            float: The rate.
+        """
+        return self.events / max(time.monotonic() - self.started, 1e-9)
+
+
+def decode_events(data: bytes) -> List[Any]:
+    """Decodes the events of a TS payload.
+
+    A `ValueError` is raised when the payload is not valid JSON.
+
+    Args:
+        data (bytes): A JSON event, a JSON array of events, or JSON lines.
+
+    Returns:
+        List[Any]: The events.
+    """
+    try:
+        events = json_loads(data)
+    except ValueError:
+        # One event per line
+        return [json_loads(line) for line in data.splitlines() if line.strip()]
+    return events if isinstance(events, list) else [events]
+
+
+async def _read_headers(reader: asyncio.StreamReader) -> Dict[str, str]:
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            return headers
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+
+async def _read_chunked(reader: asyncio.StreamReader) -> Optional[bytes]:
+    # None when the body is too large, before reading the exceeding chunk
+    parts = []
+    total = 0
+    while True:
+        size = int((await reader.readline()).split(b";")[0], 16)
+        if size == 0:
+            await reader.readline()
+            return b"".join(parts)
+        total += size
+        if total > MAX_BODY_SIZE:
+            return None
+        parts.append(await reader.readexactly(size))
+        await reader.readline()
+
+
+class TelemetryReceiver:
+    """Receiver of the TS events.
+
+    Attributes:
+        metrics (TelemetryMetrics): The throughput metrics.
+    """
+
+    def __init__(
+        self,
+        sinks: Sequence[Sink],
+        host: str = "0.0.0.0",  # noqa S104
+        port: int = 8080,
+        batch_size: int = 1000,
+        batch_interval: float = 1.0,
+        max_pending: int = 1000,
+        overflow: str = "block",
+    ) -> None:
+        """Initializes the receiver.
+
+        Args:
+            sinks (Sequence[Sink]): The sinks the events are written to.
+            host (str): The address the HTTP listener is bound to.
+            port (int): The port of the HTTP listener. `0` picks a free port.
+            batch_size (int): The maximum number of events per batch.
+            batch_interval (float): The maximum time (in seconds) an event waits
+                for its batch to be written.
+            max_pending (int): The maximum number of payloads waiting to be
+                written.
+            overflow (str): The behavior when `max_pending` is reached. Accepted
+                values include [block, drop]. `block` stops reading the payloads
+                until there is room, `drop` rejects them (HTTP 503).
+
+        Raises:
+            Exception: The raised exception when the overflow is not valid.
+        """
+        if overflow not in TELEMETRY_OVERFLOW_OPTIONS:
+            raise Exception(f"Overflow {overflow!r} is not valid.")
+        self.sinks = list(sinks)
+        self.host = host
+        self.port = port
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.max_pending = max_pending
+        self.overflow = overflow
+        self.metrics = TelemetryMetrics()
+        self._queue: Optional["asyncio.Queue[Optional[List[Any]]]"] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writer: Optional["asyncio.Task[None]"] = None
+        self._connections: Set[asyncio.StreamWriter] = set()
+
+    async def __aenter__(self) -> "TelemetryReceiver":
+        """Starts the receiver.
+
+        Returns:
+            TelemetryReceiver: The receiver.
+        """
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        """Stops the receiver.
+
+        Args:
+            *args (Any): The exception raised in the context, if any.
+        """
+        await self.stop()
+
+    async def start(self, listen: bool = True) -> None:
+        """Starts writing the events, and listening for pushed events.
+
+        Args:
+            listen (bool): Whether to start the HTTP listener.
+        """
+        self.metrics = TelemetryMetrics()
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._writer = asyncio.ensure_future(self._write_batches(self._queue))
+        if listen:
+            self._server = await asyncio.start_server(
+                self._handle, self.host, self.port
+            )
+            self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        """Stops listening, writes the pending events and closes the sinks."""
+        if self._server:
+            self._server.close()
+            # Idle keep-alive connections would keep the server open
+            for connection in list(self._connections):
+                connection.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._queue and self._writer:
+            await self._queue.put(None)
+            await self._writer
+            self._queue = self._writer = None
+        for sink in self.sinks:
+            sink.close()
+
+    async def ingest(self, data: bytes) -> bool:
+        """Decodes a TS payload and queues its events to be written.
+
+        Args:
+            data (bytes): The payload.
+
+        Returns:
+            bool: Whether the events were queued, or dropped.
+
+        Raises:
+            Exception: The raised exception when the receiver is not started.
+            ValueError: The raised exception when the payload is not valid JSON.
+        """
+        if self._queue is None:
+            raise Exception("The Telemetry receiver is not started.")
+        self.metrics.payloads += 1
+        self.metrics.bytes += len(data)
+        try:
+            events = decode_events(data)
+        except ValueError as e:
+            self._error(f"Invalid payload: {e}")
+            raise
+
+        if self.overflow == "drop" and self._queue.full():
+            self.metrics.dropped += 1
+            return False
+        await self._queue.put(events)
+        self.metrics.events += len(events)
+        return True
+
+    async def replay(self, payloads: Iterable[Union[bytes, str]]) -> None:
+        """Ingests sample TS payloads, e.g. to test the sinks offline.
+
+        Args:
+            payloads (Iterable[Union[bytes, str]]): The payloads, or the paths
+                of the files holding them.
+        """
+        for payload in payloads:
+            if isinstance(payload, str):
+                with open(payload, "rb") as f:
+                    payload = f.read()
+            await self.ingest(payload)
+
+    def _error(self, error: str) -> None:
+        self.metrics.errors += 1
+        self.metrics.last_error = error
+
+    async def _write_batches(self, queue: "asyncio.Queue[Optional[List[Any]]]") -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            events = await queue.get()
+            deadline = loop.time() + self.batch_interval
+            batch: List[Any] = []
+            # Batch the queued events, then those received until the deadline
+            while events is not None:
+                batch.extend(events)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    events = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    try:
+                        events = await asyncio.wait_for(
+                            queue.get(), deadline - loop.time()
+                        )
+                    except asyncio.TimeoutError:
+                        break
+            stopping = events is None
+            if batch:
+                await self._write(batch)
+
+    async def _write(self, events: List[Any]) -> None:
+        loop = asyncio.get_running_loop()
+        for i in range(0, len(events), self.batch_size):
+            batch = events[i : i + self.batch_size]
+            for sink in self.sinks:
+                try:
+                    await loop.run_in_executor(None, sink.write, batch)
+                except Exception as e:
+                    self._error(f"{type(sink).__name__}: {e}")
+            self.metrics.batches += 1
+            self.metrics.written += len(batch)
+
+    async def _receive(self, method: bytes, body: bytes) -> HTTPStatus:
+        if method != b"POST":
+            return HTTPStatus.METHOD_NOT_ALLOWED
+        try:
+            queued = await self.ingest(body)
+        except ValueError:
+            return HTTPStatus.BAD_REQUEST
+        return HTTPStatus.OK if queued else HTTPStatus.SERVICE_UNAVAILABLE
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self._connections.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = await _read_headers(reader)
+
+                body: Optional[bytes] = None
+                if headers.get("transfer-encoding", "").lower() == "chunked":
+                    body = await _read_chunked(reader)
+                else:
+                    length = int(headers.get("content-length", 0))
+                    if length <= MAX_BODY_SIZE:
+                        body = await reader.readexactly(length)
+                if body is None:
+                    await self._respond(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+                    break
+
+                method = request_line.split(b" ", 1)[0]
+                await self._respond(writer, await self._receive(method, body))
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: HTTPStatus) -> None:
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            "Content-Length: 0\r\n\r\n".encode("latin-1")
+        )
+        await writer.drain()
+
+
+class TelemetryScraper:
+    """Scraper of the TS pull consumers of the hosts of an inventory."""
+
+    def __init__(
+        self,
+        receiver: TelemetryReceiver,
+        nornir: Nornir,
+        consumer: str,
+        interval: float = 60.0,
+        max_workers: int = 32,
+    ) -> None:
+        """Initializes the scraper.
+
+        Args:
+            receiver (TelemetryReceiver): The receiver of the events.
+            nornir (Nornir): The Nornir object holding the hosts to scrape.
+            consumer (str): The name of the pull consumer.
+            interval (float): The time (in seconds) between two scrapes.
+            max_workers (int): The maximum number of concurrent pulls.
+        """
+        self.receiver = receiver
+        self.nornir = nornir
+        self.consumer = consumer
+        self.interval = interval
+        self.max_workers = max_workers
+
+    def _pull(self, host: Host) -> bytes:
+        client = host.get_connection(CONNECTION_NAME, self.nornir.config)
+        uri = ATC_COMPONENTS["Telemetry"]["endpoints"]["pullconsumer"]["uri"]
+        return client.get(
+            f"https://{host.hostname}:{host.port}{uri}/{self.consumer}"
+        ).content
+
+    async def _scrape_host(self, executor: ThreadPoolExecutor, host: Host) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            data = await loop.run_in_executor(executor, self._pull, host)
+            await self.receiver.ingest(data)
+        except Exception as e:
+            self.receiver._error(f"{host.name}: {e}")
+
+    async def scrape(self) -> None:
+        """Pulls the events of all the hosts once, concurrently."""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            await asyncio.gather(
+                *(
+                    self._scrape_host(executor, host)
+                    for host in self.nornir.inventory.hosts.values()
+                )
+            )
+
+    async def run(self, scrapes: Optional[int] = None) -> None:
+        """Pulls the events of all the hosts at each interval.
+
+        Args:
+            scrapes (Optional[int]): The number of scrapes. If not provided,
+                scrapes until cancelled.
+        """
+        loop = asyncio.get_running_loop()
+        count = 0
+        while scrapes is None or count < scrapes:
+            start = loop.time()
+            await self.scrape()
+            count += 1
+            if scrapes is None or count < scrapes:
+                await asyncio.sleep(max(0, self.interval - (loop.time() - start)))
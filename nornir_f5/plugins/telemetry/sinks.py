@@ -0,0 +1,111 @@
+"""Nornir F5 Telemetry sinks.
+
+The sinks write the batches of events ingested by the Telemetry receiver.
+"""
+
+import collections
+import threading
+from typing import Any, Callable, Deque, List
+
+from nornir_f5.plugins.connections.codec import json_dumps
+
+
+class Sink:
+    """Base class of the sinks.
+
+    The batches are written from a worker thread, one at a time.
+    """
+
+    def write(self, events: List[Any]) -> None:
+        """Writes a batch of events.
+
+        Args:
+            events (List[Any]): The events.
+
+        Raises:
+            NotImplementedError: The raised exception when the sink does not
+                implement it.
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Closes the sink."""
+
+
+class JSONLinesSink(Sink):
+    """Sink appending the events to a JSON lines file."""
+
+    def __init__(self, path: str) -> None:
+        """Opens the file.
+
+        Args:
+            path (str): The path of the file.
+        """
+        self.path = path
+        self._file = open(path, "ab")
+
+    def write(self, events: List[Any]) -> None:
+        """Appends a batch of events, one per line.
+
+        Args:
+            events (List[Any]): The events.
+        """
+        self._file.write(b"".join(json_dumps(e) + b"\n" for e in events))
+        self._file.flush()
+
+    def close(self) -> None:
+        """Closes the file."""
+        self._file.close()
+
+
+class CallbackSink(Sink):
+    """Sink passing the batches of events to a callback."""
+
+    def __init__(self, callback: Callable[[List[Any]], None]) -> None:
+        """Initializes the sink.
+
+        Args:
+            callback (Callable[[List[Any]], None]): The function called with
+                each batch of events.
+        """
+        self.callback = callback
+
+    def write(self, events: List[Any]) -> None:
+        """Passes a batch of events to the callback.
+
+        Args:
+            events (List[Any]): The events.
+        """
+        self.callback(events)
+
+
+class RingBufferSink(Sink):
+    """Sink keeping the most recent events in memory."""
+
+    def __init__(self, size: int = 10000) -> None:
+        """Initializes the buffer.
+
+        Args:
+            size (int): The maximum number of events kept.
+        """
+        self._events: Deque[Any] = collections.deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def write(self, events: List[Any]) -> None:
+        """Appends a batch of events, discarding the oldest ones.
+
+        Args:
+            events (List[Any]): The events.
+        """
+        with self._lock:
+            self._events.extend(events)
+
+    @property
+    def events(self) -> List[Any]:
+        """The events kept, from the oldest.
+
+        Returns:
+            List[Any]: The events.
+        """
+        with self._lock:
+            return list(self._events)
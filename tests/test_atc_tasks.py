@@ -1,13 +1,29 @@
+import importlib
+import itertools
 import json
 import re
+import types
 
 import pytest
+import requests
 
 import responses
+from nornir_f5.plugins.connections import F5RestClient
+from nornir_f5.plugins.connections.retry import DEFAULT_RETRY_POLICY
 from nornir_f5.plugins.tasks import atc
 
 from .conftest import assert_result, base_decl_dir, base_resp_dir, load_json
 
+base_schema_dir = "./tests/schemas/atc"
+atc_module = importlib.import_module("nornir_f5.plugins.tasks.atc")
+polling_module = importlib.import_module("nornir_f5.plugins.tasks.polling")
+
+
+@pytest.fixture(autouse=True)
+def _reset_validations():
+    atc_module._validators.clear()
+    atc_module._validations.clear()
+
 
 @pytest.mark.parametrize(
     ("kwargs", "resp", "task_statuses", "expected"),
@@ -360,6 +376,105 @@ def test_do_deploy(nornir, kwargs, resp, task_statuses, expected):
     assert_result(result, expected)
 
 
+@pytest.mark.parametrize(
+    ("atc_deadline", "outage", "expected", "expected_opened"),
+    [
+        # The device reboots, and restjavad restarts
+        (
+            None,
+            [requests.exceptions.ConnectionError("Connection refused")]
+            + [503] * 4
+            + [401],
+            {"result": "ATC declaration successfully deployed.", "changed": True},
+            3,
+        ),
+        # The device does not come back before the deadline
+        (
+            5,
+            [requests.exceptions.ConnectionError("Connection refused")],
+            {"result": "Connection refused", "failed": True},
+            0,
+        ),
+        # Not an outage
+        (
+            None,
+            [404],
+            {
+                "result": "404 Client Error: Not Found for url: https://bigip1.localhost:443/mgmt/shared/declarative-onboarding/task/5eb601c4-7f06-4fd7-b8d5-947e7b206a38",  # noqa B950
+                "failed": True,
+            },
+            0,
+        ),
+    ],
+)
+@responses.activate
+def test_do_deploy_outage(
+    nornir, monkeypatch, atc_deadline, outage, expected, expected_opened
+):
+    task_url = (
+        "https://bigip1.localhost:443/mgmt/shared/declarative-onboarding/task"
+        "/5eb601c4-7f06-4fd7-b8d5-947e7b206a38"
+    )
+    monkeypatch.setattr(DEFAULT_RETRY_POLICY, "backoff_factor", 0)
+    opened = []
+    f5_open = F5RestClient.open
+    monkeypatch.setattr(
+        F5RestClient,
+        "open",
+        lambda self, *args, **kwargs: opened.append(f5_open(self, *args, **kwargs)),
+    )
+    # Each call to the clock takes 10 seconds
+    clock = itertools.count(0, 10)
+    for module in [atc_module, polling_module]:
+        monkeypatch.setattr(
+            module,
+            "time",
+            types.SimpleNamespace(monotonic=lambda: next(clock), sleep=lambda s: None),
+        )
+
+    # Register mock responses
+    responses.add(
+        responses.GET,
+        "https://bigip1.localhost:443/mgmt/shared/declarative-onboarding/info",
+        json=load_json(f"{base_resp_dir}/atc/device/version_3.22.1.json"),
+        status=200,
+    )
+    responses.add(
+        responses.POST,
+        "https://bigip1.localhost:443/mgmt/shared/declarative-onboarding",
+        json=load_json(f"{base_resp_dir}/atc/device/task_processing.json"),
+        status=200,
+    )
+    for error in outage:
+        if isinstance(error, int):
+            responses.add(responses.GET, task_url, json={}, status=error)
+        else:
+            responses.add(responses.GET, task_url, body=error)
+    responses.add(
+        responses.GET,
+        task_url,
+        json=load_json(f"{base_resp_dir}/atc/device/task_success.json"),
+        status=200,
+    )
+
+    # Run task
+    nornir = nornir.filter(name="bigip1.localhost")
+    result = nornir.run(
+        task=atc,
+        atc_declaration_file=f"{base_decl_dir}/atc/device/basic.json",
+        atc_deadline=atc_deadline,
+        atc_delay=10,
+        atc_method="POST",
+        atc_retries=30,
+        atc_service="Device",
+    )
+
+    # Assert result
+    assert_result(result, expected)
+    # The connection is re-opened after each outage
+    assert len(opened) >= expected_opened
+
+
 @pytest.mark.parametrize(
     ("kwargs", "resp", "expected"),
     [
@@ -425,3 +540,345 @@ def test_ts_deploy(nornir, kwargs, resp, expected):
 
     # Assert result
     assert_result(result, expected)
+
+
+streamed_declaration = load_json(f"{base_decl_dir}/atc/as3/simple_01.json")
+streamed_declaration["Simple_02"] = {"class": "Tenant", "A2": {"class": "Application"}}
+
+
+@pytest.mark.parametrize(
+    ("kwargs", "resp", "expected"),
+    [
+        # Select one tenant
+        (
+            {"atc_select": ["Simple_01"]},
+            {"status_code": 200, "body": "declaration"},
+            {"result": {"Simple_01": streamed_declaration["Simple_01"]}},
+        ),
+        # Select several tenants and nested paths
+        (
+            {"atc_select": ["Simple_01/A1/class", "Simple_02/A2", "Missing/A1"]},
+            {"status_code": 200, "body": "declaration"},
+            {
+                "result": {
+                    "Simple_01/A1/class": "Application",
+                    "Simple_02/A2": {"class": "Application"},
+                    "Missing/A1": None,
+                }
+            },
+        ),
+        # Empty declaration
+        (
+            {"atc_select": ["Simple_01"]},
+            {"status_code": 204, "body": ""},
+            {"result": {"Simple_01": None}},
+        ),
+        # Truncated body
+        (
+            {"atc_select": ["Simple_02"]},
+            {"status_code": 200, "body": "truncated"},
+            {"result": "Unexpected end of the JSON document.", "failed": True},
+        ),
+        # Non-object body
+        (
+            {"atc_select": ["Simple_01"]},
+            {"status_code": 200, "body": "[]"},
+            {"result": "The JSON document is not an object.", "failed": True},
+        ),
+    ],
+)
+@responses.activate
+def test_as3_get_streamed(nornir, kwargs, resp, expected):
+    body = json.dumps(streamed_declaration, indent=2)
+    bodies = {"declaration": body, "truncated": body[: body.index("Simple_02")]}
+
+    # Register mock responses
+    responses.add(
+        responses.GET,
+        "https://bigip1.localhost:443/mgmt/shared/appsvcs/info",
+        json=load_json(f"{base_resp_dir}/atc/as3/version_3.22.1.json"),
+        status=200,
+    )
+    responses.add(
+        responses.GET,
+        "https://bigip1.localhost:443/mgmt/shared/appsvcs/declare",
+        body=bodies.get(resp["body"], resp["body"]),
+        status=resp["status_code"],
+    )
+
+    # Run task
+    nornir = nornir.filter(name="bigip1.localhost")
+    result = nornir.run(
+        name="Get AS3 Declaration", task=atc, atc_service="AS3", **kwargs
+    )
+
+    # Assert result
+    assert_result(result, expected)
+
+
+@pytest.mark.parametrize("atc_select", [None, ["Simple_01"]])
+@responses.activate
+def test_as3_get_streamed_to_file(nornir, tmp_path, atc_select):
+    body = json.dumps(streamed_declaration, indent=2)
+
+    # Register mock responses
+    responses.add(
+        responses.GET,
+        "https://bigip1.localhost:443/mgmt/shared/appsvcs/info",
+        json=load_json(f"{base_resp_dir}/atc/as3/version_3.22.1.json"),
+        status=200,
+    )
+    responses.add(
+        responses.GET,
+        "https://bigip1.localhost:443/mgmt/shared/appsvcs/declare",
+        body=body,
+        status=200,
+    )
+
+    # Run task
+    output_dir = str(tmp_path / "declarations")
+    nornir = nornir.filter(name="bigip1.localhost")
+    result = nornir.run(
+        name="Get AS3 Declaration",
+        task=atc,
+        atc_output_dir=output_dir,
+        atc_select=atc_select,
+        atc_service="AS3",
+    )
+
+    # Assert result
+    output_file = f"{output_dir}/bigip1.localhost.json"
+    if atc_select:
+        expected = {"Simple_01": streamed_declaration["Simple_01"]}
+    else:
+        expected = {"file": output_file, "size": len(body)}
+    assert_result(result, {"result": expected})
+    with open(output_file, "r") as f:
+        assert f.read() == body
+
+
+invalid_declaration = load_json(f"{base_decl_dir}/atc/as3/simple_01.json")
+invalid_declaration["Simple_01"]["class"] = "Tenants"
+
+
+@pytest.mark.parametrize(
+    ("kwargs", "info", "expected"),
+    [
+        # Valid AS3 declaration
+        (
+            {"atc_declaration_file": f"{base_decl_dir}/atc/as3/simple_01.json"},
+            {"version": "3.22.1"},
+            {"result": None},
+        ),
+        # Valid DO declaration, with the info of each device
+        (
+            {"atc_declaration_file": f"{base_decl_dir}/atc/device/basic.json"},
+            [{"version": "1.0.0"}],
+            {"result": None},
+        ),
+        # Invalid AS3 declaration
+        (
+            {"atc_declaration": invalid_declaration},
+            {"version": "3.22.1"},
+            {
+                "result": "The declaration is invalid: /Simple_01/class: "
+                "'Tenant' was expected",
+                "failed": True,
+            },
+        ),
+        # Schema not found
+        (
+            {"atc_declaration_file": f"{base_decl_dir}/atc/as3/simple_01.json"},
+            {"version": "3.4.0"},
+            {"result": "The AS3 schema '3.4.0' was not found.", "failed": True},
+        ),
+    ],
+)
+@responses.activate
+def test_atc_validate(nornir, kwargs, info, expected):
+    atc_service = kwargs.get("atc_declaration", {}).get("class", "AS3")
+    if "device" in kwargs.get("atc_declaration_file", ""):
+        atc_service = "Device"
+    info_uri = atc_module.ATC_COMPONENTS[atc_service]["endpoints"]["info"]["uri"]
+
+    # Register mock responses
+    responses.add(
+        responses.GET, f"https://bigip1.localhost:443{info_uri}", json=info, status=200
+    )
+
+    # Run task
+    nornir = nornir.filter(name="bigip1.localhost")
+    result = nornir.run(
+        task=atc,
+        atc_method="POST",
+        atc_schema_dir=base_schema_dir,
+        dry_run=True,
+        **kwargs,
+    )
+
+    # Assert result
+    assert_result(result, expected)
+
+
+@responses.activate
+def test_atc_validate_once(nornir, monkeypatch):
+    validated = []
+    get_validator = atc_module._get_validator
+
+    def counting_get_validator(schema_file):
+        # The declarations are validated without holding the lock
+        assert not atc_module._validations_lock.locked()
+        validated.append(schema_file)
+        return get_validator(schema_file)
+
+    monkeypatch.setattr(atc_module, "_get_validator", counting_get_validator)
+
+    # Register mock responses
+    responses.add(
+        responses.GET,
+        re.compile("https://bigip(1|2).localhost:443/mgmt/shared/appsvcs/info"),
+        json=load_json(f"{base_resp_dir}/atc/as3/version_3.22.1.json"),
+        status=200,
+    )
+
+    # Run task twice on two hosts, before any device is sent the declaration
+    nornir = nornir.filter(filter_func=lambda h: h.name != "bigip3.localhost")
+    for i in range(2):
+        result = nornir.run(
+            task=atc,
+            atc_declaration=invalid_declaration,
+            atc_method="POST",
+            atc_schema_dir=base_schema_dir,
+        )
+        assert set(result.failed_hosts) == {"bigip1.localhost", "bigip2.localhost"}
+        nornir.data.reset_failed_hosts()
+        if i == 0:
+            first_run = list(validated)
+
+    # The declaration is validated by the first run only (concurrently at most)
+    assert validated == first_run
+    assert set(validated) == {f"{base_schema_dir}/AS3/3.22.1.json"}
+    assert len(atc_module._validators) == 1
+
+
+def test_atc_validations_max_size(monkeypatch):
+    monkeypatch.setattr(atc_module, "ATC_VALIDATIONS_MAX_SIZE", 1)
+    info = {"version": "3.22.1"}
+    declaration = load_json(f"{base_decl_dir}/atc/as3/simple_01.json")
+
+    atc_module._validate(declaration, base_schema_dir, "AS3", info)
+    with pytest.raises(Exception, match="The declaration is invalid"):
+        atc_module._validate(invalid_declaration, base_schema_dir, "AS3", info)
+
+    # The oldest validation is evicted
+    assert len(atc_module._validations) == 1
+
+
+template_file = "./tests/templates/atc/as3/simple.json.j2"
+
+
+@pytest.fixture
+def _reset_templates():
+    atc_module._templates.clear()
+    atc_module._renders.clear()
+
+
+@pytest.mark.parametrize(
+    ("atc_template_vars", "expected_remark"),
+    [
+        # Host data
+        (None, "Simple HTTP application for device_sync_group"),
+        (
+            {"device_group": "dg1", "virtual_addresses": ["10.20.1.11"]},
+            "Simple HTTP application for dg1",
+        ),
+    ],
+)
+@pytest.mark.usefixtures("_reset_templates")
+@responses.activate
+def test_atc_template(nornir, atc_template_vars, expected_remark):
+    # Register mock responses
+    responses.add(
+        responses.GET,
+        re.compile("https://bigip(1|2).localhost:443/mgmt/shared/appsvcs/info"),
+        json=load_json(f"{base_resp_dir}/atc/as3/version_3.22.1.json"),
+        status=200,
+    )
+    responses.add(
+        responses.POST,
+        re.compile("https://bigip(1|2).localhost:443/mgmt/shared/appsvcs/declare"),
+        json=load_json(
+            f"{base_resp_dir}/atc/as3/declaration_successfully_submitted.json"
+        ),
+        status=200,
+    )
+    responses.add(
+        responses.GET,
+        re.compile("https://bigip(1|2).localhost:443/mgmt/shared/appsvcs/task/.*"),
+        json=load_json(f"{base_resp_dir}/atc/as3/task_success.json"),
+        status=200,
+    )
+
+    # Run task
+    nornir = nornir.filter(filter_func=lambda h: h.name != "bigip3.localhost")
+    result = nornir.run(
+        task=atc,
+        atc_delay=0,
+        atc_method="POST",
+        atc_template=template_file,
+        atc_template_vars=atc_template_vars,
+    )
+
+    # Assert result
+    assert_result(
+        result, {"result": "ATC declaration successfully deployed.", "changed": True}
+    )
+    posts = [c.request for c in responses.calls if c.request.method == "POST"]
+    posts = [p for p in posts if "/declare" in p.url]
+    assert len(posts) == 2
+    assert posts[0].body == posts[1].body
+    assert posts[0].headers["Content-Type"] == "application/json"
+    declaration = json.loads(posts[0].body)
+    assert declaration["remark"] == expected_remark
+    # The template is compiled once
+    assert list(atc_module._templates) == [template_file]
+
+
+@pytest.mark.usefixtures("_reset_templates")
+@responses.activate
+def test_atc_template_undefined(nornir):
+    nornir = nornir.filter(name="bigip1.localhost")
+    result = nornir.run(
+        task=atc, atc_method="POST", atc_template=template_file, atc_template_vars={}
+    )
+
+    assert_result(result, {"result": "'device_group' is undefined", "failed": True})
+
+
+@pytest.mark.usefixtures("_reset_templates")
+def test_atc_template_renders(monkeypatch):
+    monkeypatch.setattr(atc_module, "ATC_RENDERS_MAX_SIZE", 2)
+    renders = [
+        atc_module._render(template_file, {"device_group": dg})[0]
+        for dg in ["dg1", "dg2", "dg1", "dg3"]
+    ]
+
+    # Identical variables share the rendered declaration, and its parsed class
+    assert renders[0] is renders[2]
+    assert {c for _r, c in atc_module._renders.values()} == {"AS3"}
+    # The least recently used declaration is evicted
+    assert [json.loads(r)["remark"][-3:] for r, _c in atc_module._renders.values()] == [
+        "dg1",
+        "dg3",
+    ]
+
+    # Rendered declarations are validated without being re-serialized
+    info = {"version": "3.22.1"}
+    atc_module._validate(renders[0], base_schema_dir, "AS3", info)
+    with pytest.raises(Exception, match="The declaration is invalid"):
+        atc_module._validate(
+            json.dumps(invalid_declaration).encode("utf-8"),
+            base_schema_dir,
+            "AS3",
+            info,
+        )
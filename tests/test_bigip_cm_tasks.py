@@ -1,4 +1,6 @@
 import json
+import re
+import threading
 
 import pytest
 
@@ -8,10 +10,38 @@ from nornir_f5.plugins.tasks import (
     bigip_cm_failover_status,
     bigip_cm_sync_status,
 )
+from nornir_f5.plugins.tasks.bigip.cm import config_sync
 
 from .conftest import assert_result, base_resp_dir, load_json
 
 
+@pytest.fixture(autouse=True)
+def _reset_sync_groups():
+    yield
+    config_sync._sync_groups.clear()
+
+
+# Callback to provide dynamic sync status responses, one per request
+def sync_status_callback(sync_statuses):
+    def callback(request):
+        calls = [
+            d for d in responses.calls if "/mgmt/tm/cm/sync-status" in d.request.url
+        ]
+        current_sync_status = sync_statuses[min(len(calls), len(sync_statuses) - 1)]
+        current_sync_status = current_sync_status.replace(" ", "_").lower()
+        return (
+            200,
+            {},
+            json.dumps(
+                load_json(
+                    f"{base_resp_dir}/bigip/cm/sync_status_{current_sync_status}.json"
+                )
+            ),
+        )
+
+    return callback
+
+
 @pytest.mark.parametrize(
     ("resp", "expected"),
     [
@@ -120,58 +150,187 @@ def test_get_sync_status(nornir, resp, expected):
                 "failed": True,
             },
         ),
+        # Successful sync before the deadline
+        (
+            {"deadline": 60},
+            ["Changes Pending", "Syncing", "In Sync"],
+            {"result": "In Sync", "changed": True},
+        ),
+        # Fail sync, deadline reached
+        (
+            {"deadline": 0},
+            ["Changes Pending", "Syncing", "In Sync"],
+            {
+                "result": "The configuration synchronization has reached the deadline (Changes Pending).",  # noqa B950
+                "failed": True,
+            },
+        ),
     ],
 )
 @responses.activate
 def test_post_config_sync(nornir, kwargs, sync_statuses, expected):
-    last_sync_status = sync_statuses[len(sync_statuses) - 1]
+    # Register mock responses
+    responses.add_callback(
+        responses.GET,
+        "https://bigip1.localhost:443/mgmt/tm/cm/sync-status",
+        callback=sync_status_callback(sync_statuses),
+    )
+    responses.add(
+        responses.POST,
+        "https://bigip1.localhost:443/mgmt/tm/cm",
+        status=200,
+    )
 
-    # Callback to provide dynamic sync status responses
-    def get_sync_status_callback(request):
-        calls = [
-            d for d in responses.calls if "/mgmt/tm/cm/sync-status" in d.request.url
-        ]
+    # Run task
+    nornir = nornir.filter(name="bigip1.localhost")
+    result = nornir.run(
+        name="Sync config",
+        task=bigip_cm_config_sync,
+        delay=0,
+        device_group="device_sync_group",
+        retries=3,
+        **kwargs,
+    )
 
-        if len(calls) == 0:
-            current_sync_status = sync_statuses[0]
-        elif len(calls) > len(sync_statuses):
-            current_sync_status = last_sync_status
-        else:
-            current_sync_status = sync_statuses[len(calls) - 1]
+    # Assert result
+    assert_result(result, expected)
+    if not result.failed:
+        # The intermediate sync status polls are collapsed into one sub-result
+        assert len(result["bigip1.localhost"]) <= 3
 
-        current_sync_status = current_sync_status.replace(" ", "_").lower()
-        return (
-            200,
-            {},
-            json.dumps(
-                load_json(
-                    f"{base_resp_dir}/bigip/cm/sync_status_{current_sync_status}.json"
-                )
-            ),
-        )
+
+@responses.activate
+def test_post_config_sync_timeline(nornir):
+    sync_statuses = ["Changes Pending", "Syncing", "Syncing", "In Sync"]
 
     # Register mock responses
     responses.add_callback(
         responses.GET,
         "https://bigip1.localhost:443/mgmt/tm/cm/sync-status",
-        callback=get_sync_status_callback,
+        callback=sync_status_callback(sync_statuses),
+    )
+    responses.add(responses.POST, "https://bigip1.localhost:443/mgmt/tm/cm", status=200)
+
+    # Run task
+    nornir = nornir.filter(name="bigip1.localhost")
+    result = nornir.run(
+        name="Sync config",
+        task=bigip_cm_config_sync,
+        delay=0,
+        device_group="device_sync_group",
+    )
+
+    # Assert result
+    multi_result = result["bigip1.localhost"]
+    assert multi_result.result == "In Sync"
+    assert len(multi_result) == 3
+    wait_result = multi_result[2].result
+    assert wait_result["attempts"] == 3
+    assert [t["status"] for t in wait_result["timeline"]] == ["Syncing", "In Sync"]
+    assert [t["attempt"] for t in wait_result["timeline"]] == [1, 3]
+
+
+@pytest.mark.parametrize(
+    ("kwargs", "sync_statuses", "expected"),
+    [
+        # Members from task arguments
+        (
+            {"device_group_members": ["bigip1.localhost", "bigip2.localhost"]},
+            ["Changes Pending", "In Sync"],
+            {"result": "In Sync", "changed": True},
+        ),
+        # Members discovered from the device
+        (
+            {},
+            ["Changes Pending", "In Sync"],
+            {"result": "In Sync", "changed": True},
+        ),
+        # Fail sync, disconnected
+        (
+            {"device_group_members": ["bigip1.localhost", "bigip2.localhost"]},
+            ["Changes Pending", "Disconnected"],
+            {
+                "result": "The configuration synchronization has failed (Disconnected).",  # noqa B950
+                "failed": True,
+            },
+        ),
+    ],
+)
+@responses.activate
+def test_post_config_sync_group_aware(
+    nornir, monkeypatch, kwargs, sync_statuses, expected
+):
+    # Hold the config-sync action until both members have joined the group
+    joined = []
+    all_joined = threading.Event()
+    join_sync_group = config_sync._join_sync_group
+
+    def _join_sync_group(key, host_name):
+        group, leader = join_sync_group(key, host_name)
+        joined.append(host_name)
+        if len(joined) == 2:
+            all_joined.set()
+        return group, leader
+
+    def post_config_sync_callback(request):
+        all_joined.wait(timeout=5)
+        return (200, {}, "")
+
+    monkeypatch.setattr(config_sync, "_join_sync_group", _join_sync_group)
+
+    # Register mock responses
+    responses.add_callback(
+        responses.GET,
+        re.compile("https://bigip(1|2).localhost:443/mgmt/tm/cm/sync-status"),
+        callback=sync_status_callback(sync_statuses),
     )
     responses.add(
-        responses.POST,
-        "https://bigip1.localhost:443/mgmt/tm/cm",
+        responses.GET,
+        re.compile(
+            "https://bigip(1|2).localhost:443/mgmt/tm/cm/device-group/~Common~device_sync_group/devices"  # noqa B950
+        ),
+        json={"items": [{"name": "bigip2.localhost"}, {"name": "bigip1.localhost"}]},
         status=200,
     )
+    responses.add_callback(
+        responses.POST,
+        re.compile("https://bigip(1|2).localhost:443/mgmt/tm/cm"),
+        callback=post_config_sync_callback,
+    )
 
     # Run task
-    nornir = nornir.filter(name="bigip1.localhost")
+    nornir = nornir.filter(filter_func=lambda h: h.name != "bigip3.localhost")
     result = nornir.run(
         name="Sync config",
         task=bigip_cm_config_sync,
         delay=0,
         device_group="device_sync_group",
+        group_aware=True,
         retries=3,
         **kwargs,
     )
 
     # Assert result
     assert_result(result, expected)
+    assert (
+        len(
+            [
+                c
+                for c in responses.calls
+                if c.request.method == "POST" and c.request.url.endswith("/mgmt/tm/cm")
+            ]
+        )
+        == 1
+    )
+    assert (
+        len(
+            {
+                c.request.url.split("/mgmt")[0]
+                for c in responses.calls
+                if "/mgmt/tm/cm/sync-status" in c.request.url
+            }
+        )
+        == 1
+    )
+    # The outcome is not kept once the config-sync has completed
+    assert not config_sync._sync_groups
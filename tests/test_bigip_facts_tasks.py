@@ -0,0 +1,216 @@
+import types
+
+import pytest
+
+import responses
+from nornir_f5.plugins.facts import (
+    FactsCache,
+    cache,
+    get_fact,
+    invalidate_facts,
+    set_facts_cache,
+)
+from nornir_f5.plugins.tasks import atc_info, bigip_facts, bigip_sys_version
+
+from .conftest import assert_result, base_resp_dir, load_json
+
+host = "bigip1.localhost:443"
+
+
+@pytest.fixture
+def facts_cache():
+    facts = FactsCache()
+    set_facts_cache(facts)
+    yield facts
+    set_facts_cache(None)
+    facts.close()
+
+
+def add_facts_responses(atc_statuses=None):
+    atc_statuses = atc_statuses or {"AS3": 200, "Device": 200, "Telemetry": 404}
+    for uri, data in [
+        ("/mgmt/tm/sys/version", "bigip/sys/version_13.1.1.4.json"),
+        ("/mgmt/tm/sys/provision", "bigip/sys/provision.json"),
+        (
+            "/mgmt/shared/identified-devices/config/device-info",
+            "bigip/shared/identified_devices/device_info.json",
+        ),
+        (
+            "/mgmt/shared/iapp/global-installed-packages",
+            "bigip/shared/iapp/global_installed_packages.json",
+        ),
+        ("/mgmt/tm/cm/failover-status", "bigip/cm/failover_status_active.json"),
+    ]:
+        responses.add(
+            responses.GET,
+            f"https://{host}{uri}",
+            json=load_json(f"{base_resp_dir}/{data}"),
+            status=200,
+        )
+    info = {
+        "AS3": ("appsvcs", "atc/as3/version_3.22.1.json"),
+        "Device": ("declarative-onboarding", "atc/device/version_3.22.1.json"),
+        "Telemetry": ("telemetry", "atc/telemetry/version_1.17.0.json"),
+    }
+    for atc_service, status in atc_statuses.items():
+        responses.add(
+            responses.GET,
+            f"https://{host}/mgmt/shared/{info[atc_service][0]}/info",
+            json=load_json(f"{base_resp_dir}/{info[atc_service][1]}"),
+            status=status,
+        )
+
+
+expected_facts = {
+    "atc": {"AS3": "3.22.1", "Device": "3.22.1", "Telemetry": None},
+    "ha_role": "ACTIVE",
+    "lx_packages": {"f5-appsvcs": "3.22.1", "f5-declarative-onboarding": "1.15.0"},
+    "modules": ["asm", "ltm"],
+    "platform": "Z100",
+    "version": "13.1.1.4",
+}
+
+
+@responses.activate
+def test_facts_without_cache(nornir):
+    add_facts_responses()
+
+    # Run task
+    nornir = nornir.filter(name="bigip1.localhost")
+    result = nornir.run(name="Get facts", task=bigip_facts)
+
+    # Assert result
+    assert_result(result, {"result": expected_facts})
+
+
+@responses.activate
+def test_facts_warm_up(nornir, facts_cache):
+    add_facts_responses()
+    nornir = nornir.filter(name="bigip1.localhost")
+
+    # The first run fills the cache
+    result = nornir.run(task=bigip_facts)
+    assert_result(result, {"result": expected_facts})
+    calls = len(responses.calls)
+    assert facts_cache.get_all(host) == {
+        **expected_facts,
+        "atc:AS3": load_json(f"{base_resp_dir}/atc/as3/version_3.22.1.json"),
+        "atc:Device": load_json(f"{base_resp_dir}/atc/device/version_3.22.1.json"),
+    }
+
+    # The following runs and tasks read the cache
+    result = nornir.run(task=bigip_facts, facts=["version", "modules"])
+    assert_result(
+        result, {"result": {"version": "13.1.1.4", "modules": ["asm", "ltm"]}}
+    )
+    result = nornir.run(task=bigip_sys_version)
+    assert_result(result, {"result": "13.1.1.4"})
+    assert len(responses.calls) == calls
+
+    # Refreshing gets the facts from the device
+    nornir.run(task=bigip_facts, facts=["version"], refresh=True)
+    assert len(responses.calls) == calls + 1
+
+
+@responses.activate
+def test_facts_atc_info(nornir, facts_cache):
+    add_facts_responses(atc_statuses={"AS3": 200})
+    nornir = nornir.filter(name="bigip1.localhost")
+
+    for _i in range(2):
+        result = nornir.run(task=atc_info, atc_method="GET", atc_service="AS3")
+        assert_result(
+            result, {"result_file": f"{base_resp_dir}/atc/as3/version_3.22.1.json"}
+        )
+    info_calls = [c for c in responses.calls if c.request.url.endswith("/info")]
+    assert len(info_calls) == 1
+
+    # Installing packages invalidates the ATC info
+    invalidate_facts(host, "atc")
+    assert facts_cache.get(host, "atc:AS3") is None
+    nornir.run(task=atc_info, atc_method="GET", atc_service="AS3")
+    assert responses.calls[-1].request.url.endswith("/info")
+
+
+@responses.activate
+def test_facts_warm_up_atc_info(nornir, facts_cache):
+    add_facts_responses()
+    nornir = nornir.filter(name="bigip1.localhost")
+
+    # The facts task caches the info read by `atc_info`
+    nornir.run(task=bigip_facts, facts=["atc"])
+    calls = len(responses.calls)
+    for atc_service in ["AS3", "Device"]:
+        result = nornir.run(task=atc_info, atc_method="GET", atc_service=atc_service)
+        assert result["bigip1.localhost"].result["version"] == "3.22.1"
+    assert len(responses.calls) == calls
+
+
+@responses.activate
+def test_facts_ha_role_ttl(nornir, facts_cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache, "time", types.SimpleNamespace(time=lambda: now[0]))
+    add_facts_responses()
+    nornir = nornir.filter(name="bigip1.localhost")
+    nornir.run(task=bigip_facts, facts=["ha_role", "version"])
+    calls = len(responses.calls)
+
+    # The HA role expires before the other facts, as it changes on failover
+    now[0] += 120
+    nornir.run(task=bigip_facts, facts=["ha_role", "version"])
+    assert [c.request.url for c in responses.calls[calls:]] == [
+        f"https://{host}/mgmt/tm/cm/failover-status"
+    ]
+
+
+@responses.activate
+def test_facts_invalid(nornir):
+    nornir = nornir.filter(name="bigip1.localhost")
+    result = nornir.run(task=bigip_facts, facts=["serial"])
+
+    assert_result(result, {"result": "Fact 'serial' is not valid.", "failed": True})
+
+
+def test_facts_cache(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache, "time", types.SimpleNamespace(time=lambda: now[0]))
+    path = str(tmp_path / "facts.db")
+
+    # The facts are shared across runs
+    facts = FactsCache(path, ttl=60)
+    facts.set(host, "version", "13.1.1.4")
+    facts.set(host, "atc:AS3", {"version": "3.22.1"})
+    facts.set("bigip2.localhost:443", "version", "15.1.0")
+    facts.close()
+    facts = FactsCache(path, ttl=60)
+    assert facts.get(host, "version") == "13.1.1.4"
+
+    # The facts expire
+    now[0] += 30
+    assert facts.get(host, "version", ttl=10) is None
+    now[0] += 30
+    assert facts.get_all(host) == {}
+    assert facts.get_all(host, ttl=120) == {
+        "atc:AS3": {"version": "3.22.1"},
+        "version": "13.1.1.4",
+    }
+
+    # Invalidate the facts of a device
+    facts.invalidate(host, "atc")
+    assert list(facts.get_all(host, ttl=120)) == ["version"]
+    facts.invalidate(host)
+    assert facts.get_all(host, ttl=120) == {}
+    assert facts.get("bigip2.localhost:443", "version", ttl=120) == "15.1.0"
+
+    # Only the facts found are cached
+    set_facts_cache(facts)
+    try:
+        assert get_fact(host, "serial", lambda: None) is None
+        assert facts.get_all(host, ttl=120) == {}
+    finally:
+        set_facts_cache(None)
+        facts.close()
+
+    # Disabled cache
+    invalidate_facts(host)
+    assert get_fact(host, "version", lambda: "13.1.1.4") == "13.1.1.4"
@@ -0,0 +1,133 @@
+import pytest
+
+import responses
+from nornir_f5.plugins.tasks import bigip_health_snapshot
+
+from .conftest import assert_result, base_resp_dir, load_json
+
+
+@pytest.mark.parametrize(
+    ("kwargs", "atc_statuses", "expected"),
+    [
+        # All ATC services installed
+        (
+            {},
+            {"AS3": 200, "Device": 200, "Telemetry": 200},
+            {"AS3": "3.22.1", "Device": "3.22.1", "Telemetry": "1.17.0"},
+        ),
+        # Telemetry not installed
+        (
+            {},
+            {"AS3": 200, "Device": 200, "Telemetry": 404},
+            {"AS3": "3.22.1", "Device": "3.22.1", "Telemetry": None},
+        ),
+        # AS3 only
+        (
+            {"atc_services": ["AS3"]},
+            {"AS3": 200},
+            {"AS3": "3.22.1"},
+        ),
+    ],
+)
+@responses.activate
+def test_health_snapshot(nornir, kwargs, atc_statuses, expected):
+    # Register mock responses
+    responses.add(
+        responses.GET,
+        "https://bigip1.localhost:443/mgmt/tm/sys/version",
+        json=load_json(f"{base_resp_dir}/bigip/sys/version_13.1.1.4.json"),
+        status=200,
+    )
+    responses.add(
+        responses.GET,
+        "https://bigip1.localhost:443/mgmt/tm/cm/sync-status",
+        json=load_json(f"{base_resp_dir}/bigip/cm/sync_status_in_sync.json"),
+        status=200,
+    )
+    responses.add(
+        responses.GET,
+        "https://bigip1.localhost:443/mgmt/tm/cm/failover-status",
+        json=load_json(f"{base_resp_dir}/bigip/cm/failover_status_active.json"),
+        status=200,
+    )
+    info = {
+        "AS3": ("appsvcs", f"{base_resp_dir}/atc/as3/version_3.22.1.json"),
+        "Device": (
+            "declarative-onboarding",
+            f"{base_resp_dir}/atc/device/version_3.22.1.json",
+        ),
+        "Telemetry": (
+            "telemetry",
+            f"{base_resp_dir}/atc/telemetry/version_1.17.0.json",
+        ),
+    }
+    for atc_service, status in atc_statuses.items():
+        responses.add(
+            responses.GET,
+            f"https://bigip1.localhost:443/mgmt/shared/{info[atc_service][0]}/info",
+            json=load_json(info[atc_service][1]) if status == 200 else {},
+            status=status,
+        )
+
+    # Run task
+    nornir = nornir.filter(name="bigip1.localhost")
+    result = nornir.run(name="Health snapshot", task=bigip_health_snapshot, **kwargs)
+
+    # Assert result
+    assert not result.failed
+    snapshot = result["bigip1.localhost"].result
+    assert snapshot.version == "13.1.1.4"
+    assert snapshot.sync_status == "In Sync"
+    assert snapshot.failover_status == "ACTIVE"
+    assert snapshot.atc == expected
+    assert snapshot.elapsed >= 0
+
+
+@pytest.mark.parametrize(
+    ("kwargs", "status", "expected"),
+    [
+        # Invalid ATC service
+        (
+            {"atc_services": ["AS2"]},
+            200,
+            {"result": "ATC service 'AS2' is not valid.", "failed": True},
+        ),
+        # ATC info error
+        (
+            {"atc_services": ["AS3"]},
+            400,
+            {
+                "result": "400 Client Error: Bad Request for url: https://bigip1.localhost:443/mgmt/shared/appsvcs/info",  # noqa B950
+                "failed": True,
+            },
+        ),
+    ],
+)
+@responses.activate
+def test_health_snapshot_failed(nornir, kwargs, status, expected):
+    # Register mock responses
+    for uri, file in [
+        ("/mgmt/tm/sys/version", "bigip/sys/version_13.1.1.4.json"),
+        ("/mgmt/tm/cm/sync-status", "bigip/cm/sync_status_in_sync.json"),
+        ("/mgmt/tm/cm/failover-status", "bigip/cm/failover_status_active.json"),
+    ]:
+        responses.add(
+            responses.GET,
+            f"https://bigip1.localhost:443{uri}",
+            json=load_json(f"{base_resp_dir}/{file}"),
+            status=200,
+        )
+    responses.add(
+        responses.GET,
+        "https://bigip1.localhost:443/mgmt/shared/appsvcs/info",
+        json={},
+        status=status,
+    )
+
+    # Run task
+    nornir = nornir.filter(name="bigip1.localhost")
+    result = nornir.run(name="Health snapshot", task=bigip_health_snapshot, **kwargs)
+
+    # Assert result
+    assert_result(result, expected)
+    assert str(result["bigip1.localhost"].exception) == expected["result"]
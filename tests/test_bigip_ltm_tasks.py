@@ -0,0 +1,383 @@
+import importlib
+import json
+import math
+import re
+import types
+from array import array
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+import responses
+from nornir_f5.plugins.tasks import bigip_ltm_data_group, bigip_ltm_stats
+
+from .conftest import assert_result, base_resp_dir, load_json
+
+data_group_module = importlib.import_module(
+    "nornir_f5.plugins.tasks.bigip.ltm.data_group"
+)
+stats_module = importlib.import_module("nornir_f5.plugins.tasks.bigip.ltm.stats")
+LtmStats = stats_module.LtmStats
+
+virtual_stats = load_json(f"{base_resp_dir}/bigip/ltm/virtual_stats.json")
+fields = ["clientside.bitsIn", "clientside.curConns"]
+
+
+@pytest.fixture(autouse=True)
+def _reset_samples():
+    data_group_module._snapshots.clear()
+    stats_module._samples.clear()
+
+
+def scaled_virtual_stats(factor: int) -> dict:
+    # The virtual stats, with the values multiplied by `factor`
+    def scale(data):
+        if isinstance(data, dict):
+            return {
+                k: (v * factor if k == "value" else scale(v)) for k, v in data.items()
+            }
+        return data
+
+    return scale(virtual_stats)
+
+
+@responses.activate
+def test_ltm_stats(nornir):
+    # Register mock responses
+    responses.add(
+        responses.GET,
+        "https://bigip1.localhost:443/mgmt/tm/ltm/virtual/stats",
+        json=virtual_stats,
+        status=200,
+    )
+
+    # Run task
+    nornir = nornir.filter(name="bigip1.localhost")
+    result = nornir.run(name="Get LTM stats", task=bigip_ltm_stats, fields=fields)
+
+    # Assert result
+    stats = result["bigip1.localhost"].result
+    assert stats.kind == "virtual"
+    assert stats.names == ["/Common/vs_http", "/Common/vs_https", "/Common/vs_new"]
+    assert list(stats.columns) == fields
+    assert stats.columns["clientside.bitsIn"][:2] == array("d", [1000, 4000])
+    assert math.isnan(stats.columns["clientside.bitsIn"][2])
+    assert stats.columns["clientside.curConns"] == array("d", [5, 20, 1])
+    assert len(stats) == 3
+    assert stats.total("clientside.bitsIn") == 5000
+    assert stats.top("clientside.bitsIn", 1) == [("/Common/vs_https", 4000)]
+    # Only the requested stats are selected
+    assert responses.calls[-1].request.params == {
+        "$select": "tmName,clientside.bitsIn,clientside.curConns"
+    }
+
+
+@responses.activate
+def test_ltm_stats_rates(nornir, monkeypatch):
+    timestamps = iter([100.0, 110.0])
+    monkeypatch.setattr(
+        stats_module, "time", types.SimpleNamespace(time=lambda: next(timestamps))
+    )
+
+    # Register mock responses
+    for factor in [1, 3]:
+        responses.add(
+            responses.GET,
+            "https://bigip1.localhost:443/mgmt/tm/ltm/pool/stats",
+            json=scaled_virtual_stats(factor),
+            status=200,
+        )
+
+    # Run task twice
+    nornir = nornir.filter(name="bigip1.localhost")
+    results = [
+        nornir.run(task=bigip_ltm_stats, kind="pool", fields=fields, rates=True)
+        for _i in range(2)
+    ]
+
+    # Assert result
+    assert results[0]["bigip1.localhost"].result is None
+    rates = results[1]["bigip1.localhost"].result
+    assert rates.kind == "pool"
+    assert rates.timestamp == 110.0
+    assert rates.columns["clientside.bitsIn"][:2] == array("d", [200, 800])
+    assert rates.columns["clientside.curConns"] == array("d", [1, 4, 0.2])
+
+
+@responses.activate
+def test_ltm_stats_invalid_kind(nornir):
+    nornir = nornir.filter(name="bigip1.localhost")
+    result = nornir.run(task=bigip_ltm_stats, kind="node")
+
+    assert_result(
+        result, {"result": "LTM stats kind 'node' is not valid.", "failed": True}
+    )
+
+
+@responses.activate
+def test_aggregate_ltm_stats(nornir):
+    # Register mock responses
+    responses.add(
+        responses.GET,
+        re.compile("https://bigip(1|2).localhost:443/mgmt/tm/ltm/virtual/stats"),
+        json=virtual_stats,
+        status=200,
+    )
+
+    # Run task
+    nornir = nornir.filter(filter_func=lambda h: h.name != "bigip3.localhost")
+    result = nornir.run(task=bigip_ltm_stats)
+
+    # Assert result
+    fleet = stats_module.aggregate_ltm_stats(result)
+    assert len(fleet) == 6
+    assert fleet.names[:3] == [
+        "bigip1.localhost:/Common/vs_http",
+        "bigip1.localhost:/Common/vs_https",
+        "bigip1.localhost:/Common/vs_new",
+    ]
+    assert fleet.total("clientside.totConns") == 1000
+    assert fleet.top("clientside.curConns", 2) == [
+        ("bigip1.localhost:/Common/vs_https", 20),
+        ("bigip2.localhost:/Common/vs_https", 20),
+    ]
+
+
+def test_ltm_stats_columns():
+    previous = LtmStats(
+        kind="virtual",
+        timestamp=10.0,
+        names=["a", "b"],
+        columns={"x": array("d", [1, 2]), "y": array("d", [1, 1])},
+    )
+    current = LtmStats(
+        kind="virtual",
+        timestamp=10.0,
+        names=["c", "b"],
+        columns={"x": array("d", [5, 6])},
+    )
+
+    # Objects and stats absent from the previous sample are skipped
+    delta = current.delta(previous)
+    assert delta.names == ["b"]
+    assert delta.columns == {"x": array("d", [4])}
+    # No interval
+    assert math.isnan(current.rates(previous).columns["x"][0])
+
+    # Stats missing from a host
+    fleet = LtmStats.concat({"h1": previous, "h2": current})
+    assert fleet.columns["x"] == array("d", [1, 2, 5, 6])
+    assert fleet.columns["y"][:2] == array("d", [1, 1])
+    assert all(math.isnan(v) for v in fleet.columns["y"][2:])
+
+    assert len(LtmStats.concat({})) == 0
+    with pytest.raises(Exception, match="LTM stats of different kinds"):
+        LtmStats.concat({"h1": previous, "h2": LtmStats(kind="pool", timestamp=0)})
+
+
+dg_url = "https://bigip1.localhost:443/mgmt/tm/ltm/data-group/internal/~Common~blocklist"  # noqa B950
+dg_records = {"10.0.0.1/32": "scanner", "10.0.0.3/32": "bot", "192.168.0.0/16": "lan"}
+
+
+def patch_options(call) -> str:
+    return parse_qs(urlsplit(call.request.url).query)["options"][0]
+
+
+@responses.activate
+def test_data_group_internal(nornir):
+    responses.add(
+        responses.GET,
+        dg_url,
+        json=load_json(f"{base_resp_dir}/bigip/ltm/data_group_internal.json"),
+        status=200,
+    )
+    responses.add(responses.PATCH, re.compile(f"{dg_url}.*"), json={}, status=200)
+    nornir = nornir.filter(name="bigip1.localhost")
+
+    # The snapshot is taken from the device, and the changes are patched
+    result = nornir.run(
+        task=bigip_ltm_data_group, data_group="blocklist", records=dg_records
+    )
+    assert_result(
+        result,
+        {
+            "changed": True,
+            "result": {"add": 1, "modify": 1, "delete": 1, "method": "patch"},
+        },
+    )
+    assert len(responses.calls) == 2
+    assert patch_options(responses.calls[1]) == (
+        'records delete { "10.0.0.2/32" } '
+        'records modify { "192.168.0.0/16" { data "lan" } } '
+        'records add { "10.0.0.3/32" { data "bot" } }'
+    )
+
+    # Nothing is sent without changes
+    result = nornir.run(
+        task=bigip_ltm_data_group, data_group="blocklist", records=dg_records
+    )
+    assert_result(
+        result, {"result": {"add": 0, "modify": 0, "delete": 0, "method": None}}
+    )
+    assert len(responses.calls) == 2
+
+    # All the records are replaced above the threshold
+    result = nornir.run(
+        task=bigip_ltm_data_group,
+        data_group="blocklist",
+        patch_threshold=1,
+        records=["10.0.0.4/32", "10.0.0.5/32"],
+    )
+    assert_result(
+        result,
+        {
+            "changed": True,
+            "result": {"add": 2, "modify": 0, "delete": 3, "method": "replace"},
+        },
+    )
+    assert json.loads(responses.calls[2].request.body) == {
+        "records": [
+            {"name": "10.0.0.4/32", "data": ""},
+            {"name": "10.0.0.5/32", "data": ""},
+        ]
+    }
+
+
+@responses.activate
+def test_data_group_snapshot_dir(nornir, tmp_path, monkeypatch):
+    monkeypatch.setattr(data_group_module, "DATA_GROUP_PATCH_BATCH_SIZE", 2)
+    responses.add(
+        responses.GET,
+        dg_url,
+        json=load_json(f"{base_resp_dir}/bigip/ltm/data_group_internal.json"),
+        status=200,
+    )
+    for status in [200, 200, 400]:
+        responses.add(
+            responses.PATCH, re.compile(f"{dg_url}.*"), json={}, status=status
+        )
+    nornir = nornir.filter(name="bigip1.localhost")
+    kwargs = {"data_group": "blocklist", "snapshot_dir": str(tmp_path)}
+    snapshot = tmp_path / "bigip1.localhost" / "Common" / "blocklist.json"
+
+    # The dry-run only takes the snapshot
+    result = nornir.run(
+        task=bigip_ltm_data_group, dry_run=True, records=dg_records, **kwargs
+    )
+    assert_result(
+        result, {"result": {"add": 1, "modify": 1, "delete": 1, "method": None}}
+    )
+    assert json.loads(snapshot.read_text())["10.0.0.2/32"] == "scanner"
+
+    # The snapshot is shared across runs
+    data_group_module._snapshots.clear()
+    result = nornir.run(task=bigip_ltm_data_group, records=dg_records, **kwargs)
+    assert_result(
+        result,
+        {
+            "changed": True,
+            "result": {"add": 1, "modify": 1, "delete": 1, "method": "patch"},
+        },
+    )
+    assert json.loads(snapshot.read_text()) == dg_records
+
+    # The changes are patched in batches, and the snapshot is removed on error
+    result = nornir.run(
+        task=bigip_ltm_data_group,
+        records=["10.0.0.1/32", "10.0.0.3/32", "10.0.0.4/32", "10.0.0.5/32"],
+        **kwargs,
+    )
+    assert result["bigip1.localhost"].failed
+    assert len(responses.calls) == 4
+    assert not snapshot.exists()
+
+
+@responses.activate
+def test_data_group_external(nornir):
+    responses.add(
+        responses.POST,
+        "https://bigip1.localhost:443/mgmt/shared/file-transfer/uploads/Common~blocklist",  # noqa B950
+        json={},
+        status=200,
+    )
+    responses.add(
+        responses.PATCH,
+        "https://bigip1.localhost:443/mgmt/tm/sys/file/data-group/~Common~blocklist",
+        json={},
+        status=200,
+    )
+    nornir = nornir.filter(name="bigip1.localhost")
+    kwargs = {"data_group": "blocklist", "data_group_type": "ip", "external": True}
+
+    # The file is uploaded in full
+    for _i in range(2):
+        result = nornir.run(task=bigip_ltm_data_group, records=dg_records, **kwargs)
+        assert_result(
+            result,
+            {
+                "changed": True,
+                "result": {"add": 3, "modify": 0, "delete": 0, "method": "upload"},
+            },
+        )
+        assert responses.calls[0].request.body == (
+            b'network 10.0.0.1/32 := "scanner",\n'
+            b'network 10.0.0.3/32 := "bot",\n'
+            b'network 192.168.0.0/16 := "lan",\n'
+        )
+        assert json.loads(responses.calls[1].request.body) == {
+            "sourcePath": "file:/var/config/rest/downloads/Common~blocklist"
+        }
+
+        # Unless there is no change since the last upload
+        result = nornir.run(task=bigip_ltm_data_group, records=dg_records, **kwargs)
+        assert_result(
+            result, {"result": {"add": 0, "modify": 0, "delete": 0, "method": None}}
+        )
+        assert len(responses.calls) == 2
+        responses.calls.reset()
+        data_group_module._snapshots.clear()
+
+
+@responses.activate
+def test_data_group_external_error(nornir):
+    responses.add(
+        responses.POST,
+        "https://bigip1.localhost:443/mgmt/shared/file-transfer/uploads/Common~blocklist",  # noqa B950
+        json={},
+        status=400,
+    )
+    nornir = nornir.filter(name="bigip1.localhost")
+    data_group_module._snapshots[("bigip1.localhost", "/Common/blocklist")] = {}
+
+    # The snapshot is removed on error
+    result = nornir.run(
+        task=bigip_ltm_data_group, data_group="blocklist", external=True, records=["a"]
+    )
+    assert result["bigip1.localhost"].failed
+    assert not data_group_module._snapshots
+
+
+@pytest.mark.parametrize(
+    ("data_group_type", "expected"),
+    [
+        ("integer", b'1 := "",\n'),
+        ("string", b'"a \\"b\\"" := "",\n'),
+    ],
+)
+def test_data_group_file(data_group_type, expected):
+    records = {"1": ""} if data_group_type == "integer" else {'a "b"': ""}
+    assert data_group_module._render_file(records, data_group_type) == expected.decode()
+
+
+def test_data_group_invalid(nornir):
+    nornir = nornir.filter(name="bigip1.localhost")
+    result = nornir.run(
+        task=bigip_ltm_data_group,
+        data_group="blocklist",
+        data_group_type="address",
+        records=[],
+    )
+
+    assert_result(
+        result, {"result": "Data group type 'address' is not valid.", "failed": True}
+    )
@@ -4,6 +4,7 @@ import os
 import pytest
 
 import responses
+from nornir_f5.plugins.connections.retry import DEFAULT_RETRY_POLICY
 from nornir_f5.plugins.tasks import (
     bigip_shared_file_transfer_uploads,
     bigip_shared_iapp_lx_package,
@@ -42,18 +43,28 @@ from .conftest import assert_result, base_resp_dir, load_json
                 "failed": True,
             },
         ),
+        (
+            {"local_file_path": "./tests/files/myfile.txt"},
+            {"status_code": 400},
+            {
+                "result": "400 Client Error: Bad Request for url: https://bigip1.localhost:443/mgmt/shared/file-transfer/uploads/myfile.txt",  # noqa B950
+                "failed": True,
+            },
+        ),
+        # The chunks are retried
         (
             {"local_file_path": "./tests/files/myfile.txt"},
             {"status_code": 500},
             {
-                "result": "500 Server Error: Internal Server Error for url: https://bigip1.localhost:443/mgmt/shared/file-transfer/uploads/myfile.txt",  # noqa B950
+                "result": "None: Max retries exceeded with url: https://bigip1.localhost:443/mgmt/shared/file-transfer/uploads/myfile.txt (Caused by ResponseError('too many 500 error responses'))",  # noqa B950
                 "failed": True,
             },
         ),
     ],
 )
 @responses.activate
-def test_upload_file(nornir, kwargs, resp, expected):
+def test_upload_file(nornir, monkeypatch, kwargs, resp, expected):
+    monkeypatch.setattr(DEFAULT_RETRY_POLICY, "backoff_factor", 0)
     if "destination_file_name" in kwargs:
         file_name = kwargs["destination_file_name"]
     else:
@@ -1,10 +1,32 @@
+import hashlib
+import importlib
+import json
+import os
+import re
+import shlex
+import types
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
 import pytest
+import requests
 
 import responses
-from nornir_f5.plugins.tasks import bigip_sys_version
+from nornir_f5.plugins.connections.retry import DEFAULT_RETRY_POLICY
+from nornir_f5.plugins.facts import FactsCache, set_facts_cache
+from nornir_f5.plugins.tasks import (
+    bigip_sys_crypto,
+    bigip_sys_software_install,
+    bigip_sys_ucs_backup,
+    bigip_sys_version,
+)
 
 from .conftest import assert_result, base_resp_dir, load_json
 
+polling_module = importlib.import_module("nornir_f5.plugins.tasks.polling")
+ucs_module = importlib.import_module("nornir_f5.plugins.tasks.bigip.sys.ucs")
+assemble_ucs = ucs_module.assemble_ucs
+
 
 @pytest.mark.parametrize(
     ("resp", "expected"),
@@ -34,3 +56,676 @@ def test_get_version(nornir, resp, expected):
 
     # Assert result
     assert_result(result, expected)
+
+
+ucs_url = "https://bigip1.localhost:443/mgmt/tm/task/sys/ucs"
+ucs_archive = b"0123456789" * 5 + b"abc"
+
+
+def add_ucs_responses(states, archive=ucs_archive):
+    responses.add(
+        responses.POST,
+        ucs_url,
+        json={"_taskId": "1234", "_taskState": "CREATED"},
+        status=200,
+    )
+    responses.add(
+        responses.PUT,
+        f"{ucs_url}/1234",
+        json={"_taskId": "1234", "_taskState": "VALIDATING"},
+        status=200,
+    )
+    for state in states:
+        responses.add(
+            responses.GET,
+            f"{ucs_url}/1234",
+            json={"_taskState": state, "errorMessage": "disk full"},
+            status=200,
+        )
+
+    def download_callback(request):
+        start, end = map(int, request.headers["Range"][6:].split("-"))
+        chunk = archive[start : end + 1]
+        content_range = f"{start}-{start + len(chunk) - 1}/{len(ucs_archive)}"
+        return 206, {"Content-Range": content_range}, chunk
+
+    responses.add_callback(
+        responses.GET,
+        re.compile(
+            r"https://bigip1.localhost:443/mgmt/shared/file-transfer/ucs-downloads/.*"
+        ),
+        callback=download_callback,
+    )
+    responses.add(
+        responses.POST,
+        "https://bigip1.localhost:443/mgmt/tm/util/unix-rm",
+        json={},
+        status=200,
+    )
+
+
+@responses.activate
+def test_ucs_backup(nornir, tmp_path):
+    nornir = nornir.filter(name="bigip1.localhost")
+    store_dir = str(tmp_path / "store")
+
+    # The identical chunks are stored once, in the same archive or across runs
+    for new_chunks in [2, 0]:
+        responses.reset()
+        add_ucs_responses(["STARTED", "COMPLETED"])
+        result = nornir.run(
+            task=bigip_sys_ucs_backup,
+            chunk_size=10,
+            delay=0,
+            archive_name="backup",
+            no_private_key=True,
+            passphrase="secret",  # noqa S106
+            store_dir=store_dir,
+        )
+
+        manifest = f"{store_dir}/bigip1.localhost/backup.ucs.json"
+        assert_result(
+            result,
+            {
+                "changed": True,
+                "result": {
+                    "chunks": 6,
+                    "manifest": manifest,
+                    "name": "backup.ucs",
+                    "new_chunks": new_chunks,
+                    "sha256": hashlib.sha256(ucs_archive).hexdigest(),
+                    "size": len(ucs_archive),
+                },
+            },
+        )
+        assert json.loads(responses.calls[0].request.body) == {
+            "command": "save",
+            "name": "backup.ucs",
+            "options": [{"no-private-key": ""}, {"passphrase": "secret"}],  # noqa S105
+        }
+        assert json.loads(responses.calls[-1].request.body) == {
+            "command": "run",
+            "utilCmdArgs": "/var/local/ucs/backup.ucs",
+        }
+
+    # The archive is assembled from the store
+    assemble_ucs(manifest, str(tmp_path / "backup.ucs"))
+    assert (tmp_path / "backup.ucs").read_bytes() == ucs_archive
+
+    # A corrupted chunk is detected
+    digest = hashlib.sha256(ucs_archive[:10]).hexdigest()
+    (tmp_path / "store" / "chunks" / digest[:2] / digest).write_bytes(b"x")
+    with pytest.raises(Exception, match="The UCS archive 'backup.ucs' is corrupted."):
+        assemble_ucs(manifest, str(tmp_path / "backup.ucs"))
+
+
+@pytest.mark.parametrize(
+    ("kwargs", "states", "archive", "expected", "deleted"),
+    [
+        # The archive is kept on the device
+        (
+            {"cleanup": False},
+            ["COMPLETED"],
+            ucs_archive,
+            {
+                "changed": True,
+                "result": {
+                    "chunks": 1,
+                    "manifest": "bigip1.localhost/bigip1.localhost-20201231235959.ucs.json",  # noqa B950
+                    "name": "bigip1.localhost-20201231235959.ucs",
+                    "new_chunks": 1,
+                    "sha256": hashlib.sha256(ucs_archive).hexdigest(),
+                    "size": len(ucs_archive),
+                },
+            },
+            False,
+        ),
+        (
+            {},
+            ["STARTED", "FAILED"],
+            ucs_archive,
+            {
+                "result": "The UCS archive creation has failed: disk full",
+                "failed": True,
+            },
+            False,
+        ),
+        (
+            {"retries": 2},
+            ["STARTED", "STARTED"],
+            ucs_archive,
+            {
+                "result": "The UCS archive creation has reached maximum retries.",
+                "failed": True,
+            },
+            False,
+        ),
+        # The archive is deleted when the download fails
+        (
+            {},
+            ["COMPLETED"],
+            ucs_archive[:20],
+            {
+                "result": "The download of the UCS archive 'bigip1.localhost-20201231235959.ucs' has stalled.",  # noqa B950
+                "changed": True,
+                "failed": True,
+            },
+            True,
+        ),
+        # Dry-run
+        ({"dry_run": True}, [], ucs_archive, {"result": None}, False),
+    ],
+)
+@responses.activate
+def test_ucs_backup_errors(
+    nornir, monkeypatch, tmp_path, kwargs, states, archive, expected, deleted
+):
+    monkeypatch.setattr(
+        ucs_module,
+        "time",
+        types.SimpleNamespace(
+            sleep=lambda s: None, strftime=lambda fmt: "20201231235959"
+        ),
+    )
+    add_ucs_responses(states, archive)
+
+    nornir = nornir.filter(name="bigip1.localhost")
+    result = nornir.run(
+        task=bigip_sys_ucs_backup, delay=0, store_dir=str(tmp_path), **kwargs
+    )
+
+    # The manifest path is relative to the store
+    for r in result.values():
+        if isinstance(r.result, dict):
+            r.result["manifest"] = os.path.relpath(r.result["manifest"], tmp_path)
+    assert_result(result, expected)
+    unix_rm_calls = [c for c in responses.calls if c.request.url.endswith("unix-rm")]
+    assert len(unix_rm_calls) == deleted
+
+
+crypto_module = importlib.import_module("nornir_f5.plugins.tasks.bigip.sys.crypto")
+example_fingerprint = (
+    "SHA256/8B:8F:08:47:94:5B:8B:F8:65:2D:20:59:2D:BC:CF:F6"
+    ":84:39:14:9E:F8:5F:CC:0F:32:3F:D6:06:7B:21:9A:3C"
+)
+certificates = [
+    {"name": "example.com", "cert": "./tests/files/example.crt"},
+    {
+        "name": "old.example.com",
+        "cert": "./tests/files/example.crt",
+        "key": "./tests/files/example.key",
+        "passphrase": "secret",  # noqa S106
+    },
+    {
+        "name": "new.example.com",
+        "cert": "./tests/files/example.crt",
+        "partition": "Tenant",
+    },
+]
+
+
+def add_crypto_responses():
+    responses.add(
+        responses.GET,
+        "https://bigip1.localhost:443/mgmt/tm/sys/crypto/cert",
+        json={
+            "items": [
+                {"fullPath": "/Common/example.com", "fingerprint": example_fingerprint},
+                {"fullPath": "/Common/old.example.com", "fingerprint": "SHA256/00"},
+            ]
+        },
+        status=200,
+    )
+    for uri in [
+        "/mgmt/shared/file-transfer/uploads/.*",
+        "/mgmt/tm/sys/crypto/cert",
+        "/mgmt/tm/sys/crypto/key",
+        "/mgmt/tm/util/unix-rm",
+    ]:
+        responses.add(
+            responses.POST,
+            re.compile(f"https://bigip1.localhost:443{uri}"),
+            json={},
+            status=200,
+        )
+
+
+@responses.activate
+def test_crypto(nornir, monkeypatch):
+    monkeypatch.setattr(
+        crypto_module, "time", types.SimpleNamespace(monotonic=lambda: 0.0)
+    )
+    monkeypatch.setattr(crypto_module, "_files", OrderedDict())
+    add_crypto_responses()
+    nornir = nornir.filter(name="bigip1.localhost")
+
+    # The certificates with a different or no fingerprint are installed
+    result = nornir.run(task=bigip_sys_crypto, certificates=certificates)
+    assert_result(
+        result,
+        {
+            "changed": True,
+            "result": {
+                "/Common/example.com": {"status": "unchanged"},
+                "/Common/old.example.com": {"status": "installed", "elapsed": 0.0},
+                "/Tenant/new.example.com": {"status": "installed", "elapsed": 0.0},
+            },
+        },
+    )
+    installs = [
+        json.loads(c.request.body)
+        for c in responses.calls
+        if "/sys/crypto/" in c.request.url and c.request.method == "POST"
+    ]
+    assert sorted(installs, key=lambda i: (i["name"], i["from-local-file"])) == [
+        {
+            "command": "install",
+            "name": "/Common/old.example.com",
+            "from-local-file": "/var/config/rest/downloads/Common~old.example.com.cert",
+        },
+        {
+            "command": "install",
+            "name": "/Common/old.example.com",
+            "from-local-file": "/var/config/rest/downloads/Common~old.example.com.key",
+            "passphrase": "secret",  # noqa S105
+        },
+        {
+            "command": "install",
+            "name": "/Tenant/new.example.com",
+            "from-local-file": "/var/config/rest/downloads/Tenant~new.example.com.cert",
+        },
+    ]
+
+    # The uploaded files are deleted in one call
+    assert sorted(
+        shlex.split(json.loads(responses.calls[-1].request.body)["utilCmdArgs"])
+    ) == [
+        "/var/config/rest/downloads/Common~old.example.com.cert",
+        "/var/config/rest/downloads/Common~old.example.com.key",
+        "/var/config/rest/downloads/Tenant~new.example.com.cert",
+    ]
+
+    # Each certificate is read once, the keys are not kept
+    assert [k[0] for k in crypto_module._files] == [
+        os.path.realpath("./tests/files/example.crt")
+    ]
+    crypto_module.clear_crypto_files()
+    assert not crypto_module._files
+
+
+def test_crypto_files_max_size(monkeypatch):
+    monkeypatch.setattr(crypto_module, "_files", OrderedDict())
+    monkeypatch.setattr(crypto_module, "CRYPTO_FILES_MAX_SIZE", 1)
+
+    # The least recently read certificate is evicted
+    crypto_module._read_file("./tests/files/example.crt")
+    crypto_module._read_file("./tests/files/example.crt")
+    crypto_module._read_file("./tests/files/myfile.txt")
+    assert [k[0] for k in crypto_module._files] == [
+        os.path.realpath("./tests/files/myfile.txt")
+    ]
+
+
+@responses.activate
+def test_crypto_install_error(nornir):
+    responses.add(
+        responses.POST,
+        "https://bigip1.localhost:443/mgmt/tm/sys/crypto/cert",
+        json={},
+        status=400,
+    )
+    add_crypto_responses()
+    nornir = nornir.filter(name="bigip1.localhost")
+
+    # The files uploaded before the failure are deleted
+    result = nornir.run(task=bigip_sys_crypto, certificates=certificates[1:2])
+    assert result["bigip1.localhost"].failed
+    assert "400 Client Error" in str(result["bigip1.localhost"].exception)
+    assert shlex.split(json.loads(responses.calls[-1].request.body)["utilCmdArgs"]) == [
+        "/var/config/rest/downloads/Common~old.example.com.key",
+        "/var/config/rest/downloads/Common~old.example.com.cert",
+    ]
+
+
+@responses.activate
+def test_crypto_cleanup_error(nornir):
+    responses.add(
+        responses.POST,
+        "https://bigip1.localhost:443/mgmt/tm/util/unix-rm",
+        json={"commandResult": "rm: cannot remove 'x': Permission denied\n"},
+        status=200,
+    )
+    add_crypto_responses()
+    nornir = nornir.filter(name="bigip1.localhost")
+
+    # The certificates are installed, but the uploaded files are not deleted
+    result = nornir.run(task=bigip_sys_crypto, certificates=certificates[2:])
+    assert_result(
+        result,
+        {"result": "rm: cannot remove 'x': Permission denied", "failed": True},
+    )
+
+
+@pytest.mark.parametrize(
+    ("kwargs", "expected"),
+    [
+        (
+            {"certificates": certificates[:1]},
+            {"result": {"/Common/example.com": {"status": "unchanged"}}},
+        ),
+        # Dry-run
+        (
+            {"certificates": certificates[1:2], "dry_run": True},
+            {"result": {"/Common/old.example.com": {"status": "missing"}}},
+        ),
+        (
+            {"certificates": [{"name": "a", "cert": "./tests/files/myfile.txt"}]},
+            {
+                "result": "File './tests/files/myfile.txt' is not a PEM certificate.",  # noqa B950
+                "failed": True,
+            },
+        ),
+    ],
+)
+@responses.activate
+def test_crypto_unchanged(nornir, kwargs, expected):
+    add_crypto_responses()
+    nornir = nornir.filter(name="bigip1.localhost")
+
+    result = nornir.run(task=bigip_sys_crypto, **kwargs)
+
+    assert_result(result, expected)
+    assert [c.request.method for c in responses.calls] == ["GET"]
+
+
+software_module = importlib.import_module("nornir_f5.plugins.tasks.bigip.sys.software")
+software_image = b"BIG-IP-15.1.0.iso" + b"0" * 8
+software_checksum = hashlib.sha256(software_image).hexdigest()
+software_version = {"version": "15.1.0", "build": "0.0.31"}
+volumes_url = "https://bigip1.localhost:443/mgmt/tm/sys/software/volume"
+
+
+@pytest.fixture
+def _software_clock(monkeypatch):
+    clock = types.SimpleNamespace(monotonic=lambda: 0.0, sleep=lambda s: None)
+    monkeypatch.setattr(software_module, "time", clock)
+    monkeypatch.setattr(polling_module, "time", clock)
+
+
+def add_software_responses(images=None, checksum=software_checksum, volumes=()):
+    host = "https://bigip1.localhost:443"
+    # The image is listed once uploaded
+    for names in [images or [], ["BIGIP-15.1.0.iso"]]:
+        responses.add(
+            responses.GET,
+            f"{host}/mgmt/tm/sys/software/image",
+            json={
+                "items": [
+                    {"name": n, "version": "15.1.0", "build": "0.0.31"} for n in names
+                ]
+            },
+            status=200,
+        )
+    responses.add(
+        responses.POST,
+        re.compile(f"{host}/mgmt/cm/autodeploy/software-image-uploads/.*"),
+        json={},
+        status=200,
+    )
+    responses.add(
+        responses.POST,
+        f"{host}/mgmt/tm/util/bash",
+        json={"commandResult": f"{checksum}  /shared/images/BIGIP-15.1.0.iso\n"},
+        status=200,
+    )
+    responses.add(
+        responses.POST, f"{host}/mgmt/tm/sys/software/image", json={}, status=200
+    )
+    responses.add(responses.POST, f"{host}/mgmt/tm/sys", json={}, status=200)
+    for volume in volumes:
+        if isinstance(volume, Exception):
+            responses.add(responses.GET, volumes_url, body=volume)
+        else:
+            responses.add(
+                responses.GET,
+                volumes_url,
+                json={"items": [{"name": "HD1.1", "active": True}, volume]},
+                status=200,
+            )
+
+
+@pytest.fixture
+def software_file(tmp_path):
+    path = tmp_path / "BIGIP-15.1.0.iso"
+    path.write_bytes(software_image)
+    return str(path)
+
+
+@pytest.mark.usefixtures("_software_clock")
+@responses.activate
+def test_software_install(nornir, monkeypatch, software_file):
+    monkeypatch.setattr(DEFAULT_RETRY_POLICY, "backoff_factor", 0)
+    add_software_responses(
+        volumes=[
+            # The volume still holds its previous software
+            {"name": "HD1.2", "status": "complete", "version": "14.1.0"},
+            {"name": "HD1.2", "status": "installing 10.000 pct"},
+            {"name": "HD1.2", "status": "complete", **software_version},
+            # The device reboots
+            requests.exceptions.ConnectionError("Connection refused"),
+            {"name": "HD1.2", "status": "complete", **software_version, "active": True},
+        ]
+    )
+    facts_cache = FactsCache()
+    facts_cache.set("bigip1.localhost:443", "version", "14.1.0")
+    set_facts_cache(facts_cache)
+
+    nornir = nornir.filter(name="bigip1.localhost")
+    try:
+        result = nornir.run(
+            task=bigip_sys_software_install,
+            chunk_size=10,
+            delay=0,
+            local_file_path=software_file,
+            reboot=True,
+            volume="HD1.2",
+        )
+        # The facts of the device are invalidated
+        assert facts_cache.get_all("bigip1.localhost:443") == {}
+    finally:
+        set_facts_cache(None)
+        facts_cache.close()
+
+    assert_result(
+        result,
+        {
+            "changed": True,
+            "result": {
+                "image": "BIGIP-15.1.0.iso",
+                "timings": {
+                    "checksum": 0.0,
+                    "install": 0.0,
+                    "reboot": 0.0,
+                    "upload": 0.0,
+                },
+                "uploaded": True,
+                "version": "15.1.0",
+                "volume": "HD1.2",
+            },
+        },
+    )
+    uploads = [c.request for c in responses.calls if "uploads" in c.request.url]
+    assert [r.headers["Content-Range"] for r in uploads] == [
+        "0-9/25",
+        "10-19/25",
+        "20-24/25",
+    ]
+    assert b"".join(r.body for r in uploads) == software_image
+    install, reboot = [
+        json.loads(c.request.body)
+        for c in responses.calls
+        if c.request.url.endswith(("/software/image", "/tm/sys"))
+        and c.request.method == "POST"
+    ]
+    assert install == {
+        "command": "install",
+        "name": "BIGIP-15.1.0.iso",
+        "volume": "HD1.2",
+        "options": [{"create-volume": True}],
+    }
+    assert reboot == {"command": "reboot", "volume": "HD1.2"}
+
+    # The checksum is computed by the device, with a long timeout
+    checksum = next(c.request for c in responses.calls if "/util/bash" in c.request.url)
+    assert json.loads(checksum.body)["utilCmdArgs"] == (
+        "-c 'sha256sum /shared/images/BIGIP-15.1.0.iso'"
+    )
+    assert checksum.req_kwargs["timeout"] == software_module.SOFTWARE_CHECKSUM_TIMEOUT
+
+
+@pytest.mark.parametrize(
+    ("kwargs", "images", "checksum", "volumes", "expected"),
+    [
+        # The image is already on the device
+        (
+            {},
+            ["BIGIP-15.1.0.iso"],
+            software_checksum,
+            [{"name": "HD1.2", "status": "complete", **software_version}],
+            {
+                "changed": True,
+                "result": {
+                    "image": "BIGIP-15.1.0.iso",
+                    "timings": {"checksum": 0.0, "install": 0.0},
+                    "uploaded": False,
+                    "version": "15.1.0",
+                    "volume": "HD1.2",
+                },
+            },
+        ),
+        (
+            {},
+            ["BIGIP-15.1.0.iso"],
+            "0" * 64,
+            [],
+            {
+                "result": "The checksum of the image BIGIP-15.1.0.iso does not match.",
+                "failed": True,
+            },
+        ),
+        (
+            {},
+            [],
+            software_checksum,
+            [{"name": "HD1.2", "status": "failed (Disk full)"}],
+            {
+                "result": "The installation on volume HD1.2 has failed (failed (Disk full)).",  # noqa B950
+                "failed": True,
+            },
+        ),
+        (
+            {"timeout": 0},
+            [],
+            software_checksum,
+            [],
+            {
+                "result": "The installation on volume HD1.2 has reached the deadline (None).",  # noqa B950
+                "failed": True,
+            },
+        ),
+        # Dry-run
+        ({"dry_run": True}, [], "", [], {"result": None}),
+    ],
+)
+@pytest.mark.usefixtures("_software_clock")
+@responses.activate
+def test_software_install_stages(
+    nornir, software_file, kwargs, images, checksum, volumes, expected
+):
+    add_software_responses(images=images, checksum=checksum, volumes=volumes)
+
+    nornir = nornir.filter(name="bigip1.localhost")
+    result = nornir.run(
+        task=bigip_sys_software_install,
+        delay=0,
+        local_file_path=software_file,
+        volume="HD1.2",
+        **kwargs,
+    )
+
+    assert_result(result, expected)
+
+
+@pytest.mark.usefixtures("_software_clock")
+@responses.activate
+def test_software_install_uploads(nornir, software_file):
+    uploads = []
+
+    def upload_callback(request):
+        uploads.append(urlsplit(request.url).hostname)
+        return 200, {}, "{}"
+
+    responses.add(
+        responses.GET,
+        re.compile(".*/mgmt/tm/sys/software/image"),
+        json={"items": []},
+        status=200,
+    )
+    responses.add_callback(
+        responses.POST,
+        re.compile(".*/mgmt/cm/autodeploy/software-image-uploads/.*"),
+        callback=upload_callback,
+    )
+    responses.add(
+        responses.POST,
+        re.compile(".*/mgmt/tm/util/bash"),
+        json={"commandResult": "0" * 64},
+        status=200,
+    )
+
+    # The uploads are bounded fleet-wide
+    nornir = nornir.filter(
+        filter_func=lambda h: h.name in ["bigip1.localhost", "bigip2.localhost"]
+    )
+    nornir.run(
+        task=bigip_sys_software_install,
+        bandwidth=1000,
+        chunk_size=5,
+        local_file_path=software_file,
+        max_concurrent_uploads=1,
+        volume="HD1.2",
+    )
+
+    assert len(uploads) == 10
+    assert len(set(uploads[:5])) == len(set(uploads[5:])) == 1
+
+
+def test_software_checksum_once(monkeypatch, software_file):
+    monkeypatch.setattr(software_module, "_checksums", {})
+
+    # Each image is checksummed once, until modified
+    assert software_module._sha256(software_file, 10) == software_checksum
+    key = next(iter(software_module._checksums))
+    software_module._checksums[key] = "cached"
+    assert software_module._sha256(software_file, 10) == "cached"
+    os.utime(software_file, ns=(0, 0))
+    assert software_module._sha256(software_file, 10) == software_checksum
+
+
+def test_software_bandwidth(monkeypatch):
+    now = [0.0]
+    sleeps = []
+    monkeypatch.setattr(
+        software_module,
+        "time",
+        types.SimpleNamespace(monotonic=lambda: now[0], sleep=sleeps.append),
+    )
+    bandwidth = software_module._Bandwidth(10)
+
+    # The chunks are delayed as per the bandwidth
+    for _i in range(3):
+        bandwidth.wait(5)
+    now[0] = 10.0
+    bandwidth.wait(5)
+
+    assert sleeps == [0.0, 0.5, 1.0, 0.0]
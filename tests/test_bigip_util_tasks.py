@@ -1,3 +1,6 @@
+import importlib
+import json
+
 import pytest
 
 import responses
@@ -5,6 +8,22 @@ from nornir_f5.plugins.tasks import bigip_util_unix_ls, bigip_util_unix_rm
 
 from .conftest import assert_result, base_resp_dir, load_json
 
+unix_rm_module = importlib.import_module("nornir_f5.plugins.tasks.bigip.util.unix_rm")
+
+# The output of `ls` for each path
+listings = {
+    "/var/local/ucs": "a.ucs\nb.ucs\nnotes.txt\n",
+    "/var/log/ltm": "/var/log/ltm\n",
+    "/var/list": ["a.ucs", "notes.txt"],
+    "/var/spool": "my file.txt\nnotes.txt\n",
+    "/missing": "/bin/ls: cannot access /missing: No such file or directory\n",
+}
+
+
+def unix_ls_callback(request):
+    path = json.loads(request.body)["utilCmdArgs"]
+    return 200, {}, json.dumps({"commandResult": listings[path]})
+
 
 @pytest.mark.parametrize(
     ("file", "resp", "expected"),
@@ -85,3 +104,228 @@ def test_remove_file(nornir, kwargs, resp, expected):
 
     # Assert result
     assert_result(result, expected)
+
+
+@pytest.mark.parametrize(
+    ("file", "expected"),
+    [
+        # Paths and patterns
+        (
+            ["/var/log/ltm", "/var/local/ucs/*.ucs", "/var/list/*.ucs"],
+            {
+                "result": {
+                    "/var/log/ltm": "/var/log/ltm\n",
+                    "/var/local/ucs/*.ucs": [
+                        "/var/local/ucs/a.ucs",
+                        "/var/local/ucs/b.ucs",
+                    ],
+                    "/var/list/*.ucs": ["/var/list/a.ucs"],
+                }
+            },
+        ),
+        # Pattern without match
+        ("/missing/*.ucs", {"result": {"/missing/*.ucs": []}}),
+        # Pattern in the directory
+        (
+            ["/var/*/ltm"],
+            {
+                "result": "Only the file name of '/var/*/ltm' can be a pattern.",
+                "failed": True,
+            },
+        ),
+    ],
+)
+@responses.activate
+def test_list_files_batch(nornir, file, expected):
+    # Register mock responses
+    responses.add_callback(
+        responses.POST,
+        "https://bigip1.localhost:443/mgmt/tm/util/unix-ls",
+        callback=unix_ls_callback,
+    )
+
+    # Run task
+    nornir = nornir.filter(name="bigip1.localhost")
+    result = nornir.run(name="List files", task=bigip_util_unix_ls, file_path=file)
+
+    # Assert result
+    assert_result(result, expected)
+
+
+@pytest.mark.parametrize(
+    ("kwargs", "batch_size", "rm_result", "expected_calls", "expected"),
+    [
+        # Paths and patterns, in one call
+        (
+            {"file_path": ["/var/local/ucs/*.ucs", "/var/log/ltm.1"]},
+            100,
+            "",
+            ["/var/local/ucs/a.ucs /var/local/ucs/b.ucs /var/log/ltm.1"],
+            {
+                "result": {
+                    "/var/local/ucs/*.ucs": {
+                        "/var/local/ucs/a.ucs": {"status": "deleted"},
+                        "/var/local/ucs/b.ucs": {"status": "deleted"},
+                    },
+                    "/var/log/ltm.1": {"/var/log/ltm.1": {"status": "deleted"}},
+                },
+                "changed": True,
+            },
+        ),
+        # In batches
+        (
+            {"file_path": "/var/local/ucs/*"},
+            2,
+            "",
+            [
+                "/var/local/ucs/a.ucs /var/local/ucs/b.ucs",
+                "/var/local/ucs/notes.txt",
+            ],
+            {
+                "result": {
+                    "/var/local/ucs/*": {
+                        "/var/local/ucs/a.ucs": {"status": "deleted"},
+                        "/var/local/ucs/b.ucs": {"status": "deleted"},
+                        "/var/local/ucs/notes.txt": {"status": "deleted"},
+                    }
+                },
+                "changed": True,
+            },
+        ),
+        # Quoted paths
+        (
+            {"file_path": "/var/spool/*"},
+            100,
+            "",
+            ["'/var/spool/my file.txt' /var/spool/notes.txt"],
+            {
+                "result": {
+                    "/var/spool/*": {
+                        "/var/spool/my file.txt": {"status": "deleted"},
+                        "/var/spool/notes.txt": {"status": "deleted"},
+                    }
+                },
+                "changed": True,
+            },
+        ),
+        # Pattern without match
+        (
+            {"file_path": ["/missing/*.ucs"]},
+            100,
+            "",
+            [],
+            {"result": {"/missing/*.ucs": {}}},
+        ),
+        # Dry-run
+        (
+            {"file_path": ["/var/local/ucs/*.ucs"], "dry_run": True},
+            100,
+            "",
+            [],
+            {"result": None},
+        ),
+        # Error, on some files only
+        (
+            {"file_path": ["/var/log/ltm.1", "/var/log/ltm.10"]},
+            100,
+            "rm: cannot remove '/var/log/ltm.10': Permission denied\n\n",
+            ["/var/log/ltm.1 /var/log/ltm.10"],
+            {
+                "result": {
+                    "/var/log/ltm.1": {"/var/log/ltm.1": {"status": "deleted"}},
+                    "/var/log/ltm.10": {
+                        "/var/log/ltm.10": {
+                            "status": "error",
+                            "message": "rm: cannot remove '/var/log/ltm.10': "
+                            "Permission denied",
+                        }
+                    },
+                },
+                "changed": True,
+                "failed": True,
+            },
+        ),
+        # Error, on unknown files
+        (
+            {"file_path": ["/var/log/ltm.1"]},
+            100,
+            "rm: missing operand\n",
+            ["/var/log/ltm.1"],
+            {
+                "result": {
+                    "/var/log/ltm.1": {
+                        "/var/log/ltm.1": {
+                            "status": "error",
+                            "message": "rm: missing operand",
+                        }
+                    },
+                },
+                "failed": True,
+            },
+        ),
+        # Error, on a batch only
+        (
+            {"file_path": "/var/local/ucs/*"},
+            2,
+            500,
+            [
+                "/var/local/ucs/a.ucs /var/local/ucs/b.ucs",
+                "/var/local/ucs/notes.txt",
+            ],
+            {
+                "result": {
+                    "/var/local/ucs/*": {
+                        "/var/local/ucs/a.ucs": {
+                            "status": "error",
+                            "message": "500 Server Error: Internal Server Error "
+                            "for url: https://bigip1.localhost:443"
+                            "/mgmt/tm/util/unix-rm",
+                        },
+                        "/var/local/ucs/b.ucs": {
+                            "status": "error",
+                            "message": "500 Server Error: Internal Server Error "
+                            "for url: https://bigip1.localhost:443"
+                            "/mgmt/tm/util/unix-rm",
+                        },
+                        "/var/local/ucs/notes.txt": {"status": "deleted"},
+                    }
+                },
+                "changed": True,
+                "failed": True,
+            },
+        ),
+    ],
+)
+@responses.activate
+def test_remove_files_batch(
+    nornir, monkeypatch, kwargs, batch_size, rm_result, expected_calls, expected
+):
+    monkeypatch.setattr(unix_rm_module, "UNIX_RM_BATCH_SIZE", batch_size)
+    calls = []
+
+    def unix_rm_callback(request):
+        calls.append(json.loads(request.body)["utilCmdArgs"])
+        # The batch of the first file fails on a status code
+        if isinstance(rm_result, int):
+            return (rm_result if "a.ucs" in calls[-1] else 200), {}, "{}"
+        return 200, {}, json.dumps({"commandResult": rm_result} if rm_result else {})
+
+    # Register mock responses
+    responses.add_callback(
+        responses.POST,
+        "https://bigip1.localhost:443/mgmt/tm/util/unix-ls",
+        callback=unix_ls_callback,
+    )
+    responses.add_callback(
+        responses.POST,
+        "https://bigip1.localhost:443/mgmt/tm/util/unix-rm",
+        callback=unix_rm_callback,
+    )
+
+    # Run task
+    nornir = nornir.filter(name="bigip1.localhost")
+    result = nornir.run(name="Remove files", task=bigip_util_unix_rm, **kwargs)
+
+    # Assert result
+    assert_result(result, expected)
+    assert sorted(calls) == expected_calls
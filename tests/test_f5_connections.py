@@ -1,11 +1,66 @@
+import gzip
+import importlib
+import itertools
+import json
 import re
+import socket
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
 
+import pytest
+import requests
+from nornir.core.inventory import ConnectionOptions
 from nornir.core.task import Result, Task
 
 import responses
-from nornir_f5.plugins.connections import CONNECTION_NAME, f5_rest_client
+from nornir_f5.plugins.connections import (
+    CONNECTION_NAME,
+    CassettePlayer,
+    CircuitBreaker,
+    CompressionMetrics,
+    CompressionStats,
+    F5RestClient,
+    RetryBudget,
+    RetryPolicy,
+    RetryRule,
+    Transport,
+    breaker,
+    cassette,
+    f5_rest_client,
+    get_json_codec,
+    iter_json_object_members,
+    json_dumps,
+    json_loads,
+    probe,
+    probe_hosts,
+    registry,
+    retry,
+)
 
-from .conftest import assert_result
+from .conftest import assert_result, base_decl_dir, base_resp_dir, load_json
+
+polling_module = importlib.import_module("nornir_f5.plugins.tasks.polling")
+
+
+@pytest.fixture(autouse=True)
+def _reset_cassettes():
+    yield
+    cassette._recorders.clear()
+    cassette._players.clear()
+
+
+def open_client(hostname="bigip1.localhost", **extras):
+    client = F5RestClient()
+    client.open(
+        hostname=hostname,
+        username="admin",
+        password="admin",  # noqa S106
+        port=443,
+        platform="f5_bigip",
+        extras=extras,
+    )
+    return client
 
 
 @responses.activate
@@ -47,3 +102,725 @@ def test_close_connection(nornir):
 
     # Assert result
     assert_result(result, {})
+
+
+@responses.activate
+def test_compression():
+    body = json.dumps({"class": "AS3", "data": "x" * 100000}).encode("utf-8")
+    compressed_body = gzip.compress(body)
+
+    # Register mock responses
+    responses.add(
+        responses.GET,
+        "https://bigip1.localhost:443/mgmt/shared/appsvcs/declare",
+        body=compressed_body,
+        headers={"Content-Encoding": "gzip"},
+        content_type="application/json",
+        status=200,
+    )
+    responses.add(
+        responses.POST,
+        "https://bigip1.localhost:443/mgmt/shared/appsvcs/declare",
+        json={},
+        status=200,
+    )
+
+    client = F5RestClient()
+    client.open(
+        hostname="bigip1.localhost",
+        username="admin",
+        password="admin",  # noqa S106
+        port=443,
+        platform="f5_bigip",
+        extras={"basic_auth": True, "compress_requests": True},
+    )
+    url = "https://bigip1.localhost:443/mgmt/shared/appsvcs/declare"
+
+    # Compressed response
+    resp = client.connection.get(url)
+    assert resp.json()["class"] == "AS3"
+    assert "gzip" in responses.calls[0].request.headers["Accept-Encoding"]
+    assert resp.compression_metrics.encoding == "gzip"
+    assert resp.compression_metrics.wire_bytes == len(compressed_body)
+    assert resp.compression_metrics.decoded_bytes == len(body)
+    assert resp.compression_metrics.ratio > 10
+
+    # Compressed request
+    resp = client.connection.post(url, json={"data": "x" * 100000})
+    request = responses.calls[1].request
+    assert request.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(request.body))["data"] == "x" * 100000
+    assert resp.compression_metrics.ratio == 1.0
+
+    # Small request, not compressed
+    client.connection.post(url, json={"data": "x"})
+    assert "Content-Encoding" not in responses.calls[2].request.headers
+
+    # Streamed response, no metrics
+    resp = client.connection.get(url, stream=True)
+    assert not hasattr(resp, "compression_metrics")
+
+    stats = client.compression_stats
+    assert stats.responses == 3
+    assert stats.compressed_responses == 1
+    assert stats.compressed_requests == 1
+    assert stats.request_wire_bytes < stats.request_raw_bytes
+    assert stats.ratio > 1
+
+    client.close()
+
+
+def test_compression_stats_empty():
+    stats = CompressionStats()
+    assert stats.ratio == 1.0
+    metrics = CompressionMetrics(url="", encoding=None, wire_bytes=0, decoded_bytes=0)
+    assert metrics.ratio == 1.0
+
+
+@pytest.mark.parametrize("cassette_name", ["f5.jsonl", "f5.jsonl.gz"])
+def test_cassette(tmp_path, cassette_name):
+    path = str(tmp_path / cassette_name)
+    sync_status_url = "https://bigip1.localhost:443/mgmt/tm/cm/sync-status"
+    download_url = "https://bigip1.localhost:443/mgmt/shared/file-transfer/bulk"
+
+    @responses.activate
+    def record():
+        for status in ["changes_pending", "in_sync"]:
+            responses.add(
+                responses.GET,
+                sync_status_url,
+                json=load_json(f"{base_resp_dir}/bigip/cm/sync_status_{status}.json"),
+                status=200,
+            )
+        responses.add(responses.GET, download_url, body=b"\xff\x00", status=200)
+
+        client = open_client(record_cassette=path, token_timeout=600)
+        client.connection.get(sync_status_url)
+        client.connection.get(sync_status_url)
+        client.connection.get(download_url)
+        client.close()
+
+    record()
+    # The connections recording into the same file share the recorder
+    assert cassette.get_recorder(path) is cassette._recorders[path]
+
+    # The tokens are redacted
+    with cassette._open(path, "rb") as f:
+        recorded = f.read()
+    assert b"LMOYA2ZQUSRJULHHHVK44BGV3O" not in recorded
+    assert b"/mgmt/shared/authz/tokens/REDACTED" in recorded
+
+    # Replay, on the recorded host and on another host
+    for hostname in ["bigip1.localhost", "bigip9.localhost"]:
+        client = open_client(
+            hostname, replay_cassette=path, replay_latency_scale=0, token_timeout=600
+        )
+        url = f"https://{hostname}:443"
+        statuses = [
+            client.connection.get(f"{url}/mgmt/tm/cm/sync-status").json()
+            for _ in range(3)
+        ]
+        assert [
+            list(s["entries"].values())[0]["nestedStats"]["entries"]["status"][
+                "description"
+            ]
+            for s in statuses
+        ] == ["Changes Pending", "In Sync", "In Sync"]
+        assert (
+            client.connection.get(f"{url}/mgmt/shared/file-transfer/bulk").content
+            == b"\xff\x00"
+        )
+        with pytest.raises(Exception, match="No recorded response for GET /mgmt/toc."):
+            client.connection.get(f"{url}/mgmt/toc")
+        client.close()
+
+
+@pytest.mark.parametrize(
+    ("latency_scale", "expected"), [(1.0, "Changes Pending"), (0.001, "In Sync")]
+)
+def test_cassette_timeline(tmp_path, latency_scale, expected):
+    path = str(tmp_path / "f5.jsonl")
+    interactions = [{"version": 1}]
+    for offset, status in [(0.0, "changes_pending"), (1.0, "in_sync")]:
+        interactions.append(
+            {
+                "host": "bigip1.localhost:443",
+                "method": "GET",
+                "url": "/mgmt/tm/cm/sync-status",
+                "offset": offset,
+                "elapsed": 0.0,
+                "status": 200,
+                "headers": {"Content-Type": "application/json"},
+                "body": json.dumps(
+                    load_json(f"{base_resp_dir}/bigip/cm/sync_status_{status}.json")
+                ),
+            }
+        )
+    with open(path, "w") as f:
+        f.write("\n".join(json.dumps(i) for i in interactions))
+
+    client = open_client(
+        basic_auth=True, replay_cassette=path, replay_latency_scale=latency_scale
+    )
+    statuses = []
+    for _ in range(2):
+        resp = client.connection.get(
+            "https://bigip1.localhost:443/mgmt/tm/cm/sync-status"
+        ).json()
+        entries = list(resp["entries"].values())[0]["nestedStats"]["entries"]
+        statuses.append(entries["status"]["description"])
+        time.sleep(0.01)
+    client.close()
+
+    # The first request starts the timeline
+    assert statuses == ["Changes Pending", expected]
+
+
+def test_cassette_invalid(tmp_path):
+    path = tmp_path / "f5.jsonl"
+    path.write_text("{}")
+    with pytest.raises(Exception, match="is not valid."):
+        CassettePlayer(str(path))
+
+
+def test_transport():
+    class StaticTransport(Transport):
+        def __init__(self):
+            self.requests = []
+
+        def send(self, adapter, request, **kwargs):
+            self.requests.append((request.method, request.url, kwargs["timeout"]))
+            if request.url.endswith("/mgmt/shared/authn/login"):
+                token = {"token": "LMOYA2ZQUSRJULHHHVK44BGV3O"}  # noqa S105
+                body = json.dumps({"token": token}).encode("utf-8")
+                return self.build_response(adapter, request, 200, body)
+            if request.method == "DELETE":
+                return self.build_response(adapter, request, 200)
+            return self.build_response(
+                adapter,
+                request,
+                200,
+                gzip.compress(b'{"version": "3.22.1"}'),
+                {"Content-Encoding": "gzip"},
+            )
+
+    transport = StaticTransport()
+    client = F5RestClient()
+    client.open(
+        hostname="bigip1.localhost",
+        username="admin",
+        password="admin",  # noqa S106
+        port=443,
+        platform="f5_bigip",
+        extras={"transport": transport, "validate_certs": True},
+    )
+    resp = client.connection.get(
+        "https://bigip1.localhost:443/mgmt/shared/appsvcs/info"
+    )
+    client.close()
+
+    assert resp.json() == {"version": "3.22.1"}
+    assert resp.reason == "OK"
+    assert resp.compression_metrics.encoding == "gzip"
+    assert [method for method, _url, _timeout in transport.requests] == [
+        "POST",
+        "GET",
+        "DELETE",
+    ]
+    assert transport.requests[1][2] == 5
+
+
+@pytest.mark.parametrize("json_backend", [None, "json", "orjson"])
+@responses.activate
+def test_json_codec(json_backend):
+    if json_backend == "orjson":
+        pytest.importorskip("orjson")
+
+    # Register mock responses
+    responses.add(
+        responses.POST,
+        "https://bigip1.localhost:443/mgmt/shared/appsvcs/declare",
+        json={"results": [{"message": "success"}]},
+        status=200,
+    )
+
+    extras = {"basic_auth": True}
+    if json_backend:
+        extras["json_backend"] = json_backend
+    client = F5RestClient()
+    client.open(
+        hostname="bigip1.localhost",
+        username="admin",
+        password="admin",  # noqa S106
+        port=443,
+        platform="f5_bigip",
+        extras=extras,
+    )
+
+    resp = client.connection.post(
+        "https://bigip1.localhost:443/mgmt/shared/appsvcs/declare",
+        json={"class": "AS3", "tenant": "é"},
+    )
+    request = responses.calls[0].request
+    assert request.headers["Content-Type"] == "application/json"
+    assert json.loads(request.body) == {"class": "AS3", "tenant": "é"}
+    assert resp.json() == {"results": [{"message": "success"}]}
+    assert resp.codec.name == (json_backend or get_json_codec().name)
+
+    client.close()
+
+
+def test_json_codec_not_available():
+    with pytest.raises(Exception, match="JSON backend 'simplejson' is not available."):
+        get_json_codec("simplejson")
+    assert json_loads(json_dumps({"a": [1, 2]})) == {"a": [1, 2]}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 1024 * 1024])
+@pytest.mark.parametrize("keys", [None, {"Simple_01", 'we"ird\\'}])
+def test_iter_json_object_members(chunk_size, keys):
+    document = load_json(f"{base_decl_dir}/atc/as3/simple_01.json")
+    document['we"ird\\'] = {"a": ['x\\"y', "}", "{", "\\\\"], "b": [1, {"c": None}]}
+    document["empty"] = {}
+    document["escaped"] = 'a\\"b'
+    raw = json.dumps(document, indent=2).encode("utf-8")
+    chunks = [b""] + [raw[i : i + chunk_size] for i in range(0, len(raw), chunk_size)]
+
+    members = dict(iter_json_object_members(chunks, keys))
+
+    if keys is None:
+        assert members == document
+    else:
+        assert members == {k: document[k] for k in keys}
+
+
+@pytest.mark.parametrize(
+    ("document", "expected"),
+    [
+        (b" { } ", None),
+        (b"[1]", "The JSON document is not an object."),
+        (b'{"a" 1}', "The JSON document is malformed."),
+        (b'{"a": 1]', "The JSON document is malformed."),
+        (b"{1: 2}", "The JSON document is malformed."),
+        (b'{"a": "\\', "Unexpected end of the JSON document."),
+        (b"", "Unexpected end of the JSON document."),
+    ],
+)
+def test_iter_json_object_members_invalid(document, expected):
+    if expected is None:
+        assert not dict(iter_json_object_members([document]))
+    else:
+        with pytest.raises(ValueError, match=re.escape(expected)):
+            _ = dict(iter_json_object_members([document]))
+
+
+@pytest.fixture
+def listening_port():
+    # A port accepting TCP connections, but never completing the TLS handshake
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        s.listen(8)
+        yield s.getsockname()[1]
+
+
+def closed_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.mark.parametrize(
+    ("tls", "expected_error"), [(False, None), (True, "Timed out after 0.2 seconds")]
+)
+def test_probe_hosts(nornir, monkeypatch, listening_port, tls, expected_error):
+    monkeypatch.setattr(probe, "_unreachable", {})
+    refused_port = closed_port()
+    hosts = nornir.inventory.hosts
+    for name, port in [
+        ("bigip1.localhost", listening_port),
+        ("bigip2.localhost", refused_port),
+    ]:
+        monkeypatch.setattr(hosts[name], "hostname", "127.0.0.1")
+        monkeypatch.setattr(hosts[name], "port", port)
+
+    # Probe the hosts
+    nr = nornir.filter(filter_func=lambda h: h.name != "bigip3.localhost")
+    errors = probe_hosts(nr, timeout=0.2, tls=tls)
+
+    # Assert result
+    assert errors["bigip1.localhost"] == expected_error
+    assert errors["bigip2.localhost"]
+    expected_failed = {"bigip2.localhost"}
+    if expected_error:
+        expected_failed.add("bigip1.localhost")
+    assert nornir.data.failed_hosts == expected_failed
+
+    # Opening a connection to an unreachable host fails immediately
+    with pytest.raises(
+        Exception, match=f"Host 127.0.0.1:{refused_port} is unreachable"
+    ):
+        F5RestClient().open(
+            hostname="127.0.0.1",
+            username="admin",
+            password="admin",  # noqa S106
+            port=refused_port,
+            platform="f5_bigip",
+            extras={},
+        )
+
+
+def test_probe_hosts_expiry(nornir, monkeypatch, listening_port):
+    monkeypatch.setattr(probe, "_unreachable", {})
+    host = nornir.inventory.hosts["bigip1.localhost"]
+    monkeypatch.setattr(host, "hostname", "127.0.0.1")
+    monkeypatch.setattr(host, "port", closed_port())
+    nr = nornir.filter(name="bigip1.localhost")
+    target = f"127.0.0.1:{host.port}"
+
+    # The unreachable host is forgotten after the TTL
+    probe_hosts(nr, tls=False, ttl=0)
+    assert probe._unreachable
+    assert probe.get_probe_error(target) is None
+    assert not probe._unreachable
+
+    # A reachable host is forgotten immediately
+    probe_hosts(nr, tls=False)
+    assert probe.get_probe_error(target)
+    monkeypatch.setattr(host, "port", listening_port)
+    probe._unreachable[f"127.0.0.1:{listening_port}"] = (time.monotonic() + 60, "x")
+    assert probe_hosts(nr, tls=False) == {"bigip1.localhost": None}
+    assert probe.get_probe_error(f"127.0.0.1:{listening_port}") is None
+
+
+def test_probe_hosts_connection_options(nornir, monkeypatch):
+    monkeypatch.setattr(probe, "_unreachable", {})
+    refused_port = closed_port()
+    host = nornir.inventory.hosts["bigip3.localhost"]
+    monkeypatch.setitem(
+        host.connection_options,
+        CONNECTION_NAME,
+        ConnectionOptions(hostname="127.0.0.1", port=refused_port),
+    )
+
+    # The host is probed, and remembered, with its F5 connection parameters
+    errors = probe_hosts(nornir.filter(name="bigip3.localhost"), tls=False)
+    assert errors["bigip3.localhost"]
+    assert list(probe._unreachable) == [f"127.0.0.1:{refused_port}"]
+
+    params = host.get_connection_parameters(CONNECTION_NAME)
+    with pytest.raises(Exception, match="is unreachable"):
+        F5RestClient().open(
+            hostname=params.hostname,
+            username=params.username,
+            password=params.password,
+            port=params.port,
+            platform=params.platform,
+            extras={},
+        )
+
+
+def test_circuit_breaker(monkeypatch):
+    monkeypatch.setattr(breaker, "_breakers", {})
+    now = [0.0]
+    monkeypatch.setattr(
+        breaker, "time", types.SimpleNamespace(monotonic=lambda: now[0])
+    )
+
+    class FlakyTransport(Transport):
+        def __init__(self):
+            self.statuses = [503, None]
+            self.sent = 0
+
+        def send(self, adapter, request, **kwargs):
+            self.sent += 1
+            status = self.statuses.pop(0)
+            if status is None:
+                raise requests.exceptions.ConnectionError("Connection refused")
+            return self.build_response(adapter, request, status, b"{}")
+
+    transport = FlakyTransport()
+    client = F5RestClient()
+    client.open(
+        hostname="bigip1.localhost",
+        username="admin",
+        password="admin",  # noqa S106
+        port=443,
+        platform="f5_bigip",
+        extras={
+            "basic_auth": True,
+            "circuit_breaker": True,
+            "circuit_breaker_threshold": 2,
+            "circuit_breaker_cool_down": 10,
+            "transport": transport,
+        },
+    )
+    url = "https://bigip1.localhost:443/mgmt/tm/sys/version"
+
+    # The breaker opens after 2 consecutive failures
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.connection.get(url)
+    assert client.circuit_breaker.state == "closed"
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.connection.get(url)
+    assert client.circuit_breaker.state == "open"
+
+    # The requests fail fast while open
+    with pytest.raises(Exception, match="The circuit breaker of bigip1.localhost:443"):
+        client.connection.get(url)
+    assert (transport.sent, client.circuit_breaker.rejected) == (2, 1)
+
+    # A failed probe opens the breaker again
+    now[0] = 10.0
+    assert client.circuit_breaker.state == "half-open"
+    transport.statuses = [503]
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.connection.get(url)
+    now[0] = 15.0
+    assert client.circuit_breaker.state == "open"
+
+    # A successful probe closes the breaker
+    now[0] = 20.0
+    transport.statuses = [200]
+    assert client.connection.get(url).json() == {}
+    assert client.circuit_breaker.state == "closed"
+    assert client.circuit_breaker.failures == 0
+
+    # The breaker of a host is shared by its connections
+    assert breaker.get_circuit_breaker("bigip1.localhost:443") is client.circuit_breaker
+
+
+def test_circuit_breaker_single_probe():
+    circuit_breaker = CircuitBreaker("bigip1.localhost:443", 1, cool_down=0)
+    ok = types.SimpleNamespace(status_code=200)
+
+    def fail():
+        raise ValueError("Failed.")
+
+    def probe():
+        # Other requests are rejected while probing
+        assert circuit_breaker.state == "half-open"
+        with pytest.raises(Exception, match="is open"):
+            circuit_breaker.call(lambda: ok)
+        return ok
+
+    with pytest.raises(ValueError, match="Failed."):
+        circuit_breaker.call(fail)
+    assert circuit_breaker.call(probe) is ok
+    assert circuit_breaker.state == "closed"
+
+
+@responses.activate
+def test_retry_policy():
+    budget = RetryBudget(ratio=0.5, min_retries=0, window=60)
+    client = open_client(retry_policy=RetryPolicy(backoff_factor=0, budget=budget))
+    base_url = "https://bigip1.localhost:443"
+
+    # Register mock responses
+    for status in [503, 200]:
+        responses.add(
+            responses.GET, f"{base_url}/mgmt/tm/sys/version", json={}, status=status
+        )
+    responses.add(
+        responses.POST, f"{base_url}/mgmt/shared/appsvcs/declare", json={}, status=503
+    )
+    for status in [503, 200]:
+        responses.add(
+            responses.POST,
+            f"{base_url}/mgmt/shared/appsvcs/declare",
+            json={},
+            headers={"Retry-After": "0"},
+            status=status,
+        )
+    responses.add(
+        responses.GET, f"{base_url}/mgmt/tm/cm/sync-status", json={}, status=503
+    )
+
+    # The reads are retried
+    client.connection.get(f"{base_url}/mgmt/tm/sys/version")
+    # The writes are not retried, unless rejected with a Retry-After header
+    with pytest.raises(requests.exceptions.HTTPError, match="503"):
+        client.connection.post(f"{base_url}/mgmt/shared/appsvcs/declare", json={})
+    client.connection.post(f"{base_url}/mgmt/shared/appsvcs/declare", json={})
+    assert [c.response.status_code for c in responses.calls[1:]] == [
+        503,
+        200,
+        503,
+        503,
+        200,
+    ]
+
+    # The retries stop once the budget is exhausted
+    with pytest.raises(requests.exceptions.RetryError, match="retry budget exhausted"):
+        client.connection.get(f"{base_url}/mgmt/tm/cm/sync-status")
+    assert (budget.requests, budget.retries, budget.rejected) == (5, 3, 1)
+
+
+def test_retry_rules(monkeypatch):
+    def prepare(method, url, headers=None):
+        return requests.Request(method, url, headers=headers).prepare()
+
+    upload_url = "https://bigip1.localhost:443/mgmt/shared/file-transfer/uploads/f"
+    policy = RetryPolicy()
+    assert policy.for_request(prepare("POST", upload_url)).read is False
+    chunk = prepare("POST", upload_url, {"Content-Range": "0-9/10"})
+    assert policy.for_request(chunk).read is None
+    assert RetryRule(methods=["DELETE"], path="/mgmt/tm/ltm/").matches(
+        prepare("DELETE", "https://bigip1.localhost:443/mgmt/tm/ltm/pool/~Common~p")
+    )
+
+    # The Retry-After header is honoured up to a maximum
+    strategy = retry.F5Retry(max_retry_after=5)
+    assert strategy.get_retry_after(types.SimpleNamespace(headers={})) is None
+    retry_after = types.SimpleNamespace(headers={"Retry-After": "3600"})
+    assert strategy.get_retry_after(retry_after) == 5
+    assert strategy.new(total=1).max_retry_after == 5
+
+    # The budget is renewed at each window
+    now = [0.0]
+    monkeypatch.setattr(retry, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    budget = RetryBudget(ratio=0, min_retries=1, window=10)
+    assert budget.withdraw()
+    assert not budget.withdraw()
+    now[0] = 10.0
+    assert budget.withdraw()
+
+
+@responses.activate
+def test_shared_connection():
+    url = "https://bigip1.localhost:443/mgmt/toc"
+    responses.add(responses.GET, url, json={}, status=200)
+
+    # The aliases of a device share one connection, and one token
+    clients = [open_client(shared_connection=True) for _i in range(3)]
+    assert len({id(c.connection) for c in clients}) == 1
+    assert clients[0].shared_key == ("bigip1.localhost", 443, "admin", "tmos")
+
+    # But not with another authentication mode
+    client = open_client(basic_auth=True, shared_connection=True)
+    assert client.connection is not clients[0].connection
+    client.close()
+
+    # The connection is closed by the last alias
+    for c in clients[:2]:
+        c.close()
+    clients[2].connection.get(url)
+    clients[2].close()
+    assert [c.request.method for c in responses.calls] == ["POST", "GET", "DELETE"]
+    assert not registry._connections
+
+    # Invalidating a closed connection does nothing
+    clients[2].invalidate()
+    assert not registry._connections
+
+
+@responses.activate
+def test_shared_connection_restart(nornir, monkeypatch):
+    base_url = "https://bigip3.localhost:443"
+    tokens = []
+    valid = []
+
+    def login_callback(request):
+        tokens.append(f"token{len(tokens)}")
+        valid[:] = [tokens[-1]]
+        return 200, {}, json.dumps({"token": {"token": tokens[-1]}})
+
+    def toc_callback(request):
+        token = request.headers.get("X-F5-Auth-Token")
+        return (200 if token in valid else 401), {}, "{}"
+
+    # Two aliases of the device share the connection
+    nr = nornir.filter(
+        filter_func=lambda h: h.name in ["bigip2.localhost", "bigip3.localhost"]
+    )
+    for host in nr.inventory.hosts.values():
+        host.close_connections()
+        monkeypatch.setattr(host, "hostname", "bigip3.localhost")
+        monkeypatch.setitem(
+            host.connection_options,
+            CONNECTION_NAME,
+            ConnectionOptions(extras={"shared_connection": True}),
+        )
+    # Each call to the clock takes 1 second
+    clock = itertools.count(0, 1)
+    monkeypatch.setattr(
+        polling_module,
+        "time",
+        types.SimpleNamespace(monotonic=lambda: next(clock), sleep=lambda s: None),
+    )
+    responses.reset()
+    responses.add_callback(
+        responses.POST, f"{base_url}/mgmt/shared/authn/login", callback=login_callback
+    )
+    responses.add_callback(responses.GET, f"{base_url}/mgmt/toc", callback=toc_callback)
+    responses.add(
+        responses.DELETE,
+        re.compile(f"{base_url}/mgmt/shared/authz/tokens/.*"),
+        json={},
+        status=200,
+    )
+
+    def get_toc(task: Task) -> Result:
+        result = polling_module.get_with_outages(task, f"{base_url}/mgmt/toc", 1, 10)
+        return Result(host=task.host, result=result)
+
+    try:
+        assert not nr.run(task=get_toc).failed
+        assert tokens == ["token0"]
+
+        # The device restarts, the token is no longer valid
+        valid.clear()
+        for name in ["bigip2.localhost", "bigip3.localhost"]:
+            result = nr.filter(name=name).run(task=get_toc)
+            assert not result.failed
+        # The connection is re-opened once, for both aliases
+        assert tokens == ["token0", "token1"]
+    finally:
+        for host in nr.inventory.hosts.values():
+            host.close_connections()
+    assert not registry._connections
+
+
+@responses.activate
+def test_shared_connection_concurrent():
+    login_url = "https://bigip2.localhost:443/mgmt/shared/authn/login"
+    responses.reset()
+    responses.add(responses.POST, login_url, json={}, status=401)
+    responses.add(
+        responses.DELETE,
+        re.compile("https://bigip2.localhost:443/mgmt/shared/authz/tokens/.*"),
+        json={},
+        status=200,
+    )
+
+    # A failed login is not shared
+    for _i in range(2):
+        with pytest.raises(requests.exceptions.HTTPError):
+            open_client(hostname="bigip2.localhost", shared_connection=True)
+    assert not registry._connections
+
+    # The aliases opening the connection at once wait for the first one
+    responses.upsert(
+        responses.POST,
+        login_url,
+        json=load_json(f"{base_resp_dir}/bigip/shared/authn/login_success.json"),
+        status=200,
+    )
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        clients = list(
+            executor.map(
+                lambda _i: open_client(
+                    hostname="bigip2.localhost", shared_connection=True
+                ),
+                range(8),
+            )
+        )
+    assert len({id(c.connection) for c in clients}) == 1
+    for c in clients:
+        c.close()
+    assert [c.request.method for c in responses.calls] == [
+        "POST",
+        "POST",
+        "POST",
+        "DELETE",
+    ]
+    assert not registry._connections
@@ -0,0 +1,76 @@
+import subprocess  # noqa S404
+import sys
+
+import pytest
+
+from nornir_f5.plugins import tasks
+
+
+def importtime(code: str) -> dict:
+    # Returns the cumulative import time (in us) of each module imported by `code`
+    proc = subprocess.run(  # noqa S603
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _self, cumulative, module = line[len("import time:") :].split("|")
+            if cumulative.strip().isdigit():
+                modules[module.strip()] = int(cumulative)
+    return modules
+
+
+@pytest.mark.parametrize(
+    ("code", "expected", "not_expected"),
+    [
+        # No task module, nor heavy dependency
+        (
+            "import nornir_f5.plugins.tasks",
+            ["nornir_f5.plugins.tasks"],
+            [
+                "nornir_f5.plugins.tasks.atc",
+                "nornir_f5.plugins.tasks.bigip",
+                "nornir_f5.plugins.connections",
+                "packaging",
+                "requests_toolbelt",
+            ],
+        ),
+        # Only the module of the task
+        (
+            "from nornir_f5.plugins.tasks import bigip_sys_version",
+            ["nornir_f5.plugins.tasks.bigip.sys.version"],
+            [
+                "nornir_f5.plugins.tasks.atc",
+                "nornir_f5.plugins.tasks.bigip.cm",
+                "packaging",
+                "requests_toolbelt",
+            ],
+        ),
+        # The connection does not load its debugging dependencies
+        (
+            "import nornir_f5.plugins.connections",
+            ["nornir_f5.plugins.connections.f5"],
+            ["requests_toolbelt"],
+        ),
+    ],
+)
+def test_lazy_imports(code, expected, not_expected):
+    modules = importtime(code)
+    for module in expected:
+        assert module in modules
+    for module in not_expected:
+        assert module not in modules
+
+
+def test_lazy_tasks():
+    # Importing the `atc` module does not shadow the `atc` task
+    import nornir_f5.plugins.tasks.atc  # noqa F401
+
+    assert tasks.atc.__name__ == "atc"
+    assert callable(tasks.atc)
+    assert set(tasks.__all__) <= set(dir(tasks))
+    with pytest.raises(AttributeError, match="has no attribute 'bigip_unknown'"):
+        _ = tasks.bigip_unknown
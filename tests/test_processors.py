@@ -0,0 +1,129 @@
+import hashlib
+import json
+
+import pytest
+
+import responses
+from nornir_f5.plugins.processors import ResultRetention, ResultSummary
+from nornir_f5.plugins.tasks import atc
+
+from .conftest import base_decl_dir, base_resp_dir, load_json
+
+
+def register_as3_get(declaration_file):
+    responses.add(
+        responses.GET,
+        "https://bigip1.localhost:443/mgmt/shared/appsvcs/info",
+        json=load_json(f"{base_resp_dir}/atc/as3/version_3.22.1.json"),
+        status=200,
+    )
+    responses.add(
+        responses.GET,
+        "https://bigip1.localhost:443/mgmt/shared/appsvcs/declare",
+        json=load_json(declaration_file),
+        status=200,
+    )
+
+
+@pytest.mark.parametrize(
+    ("mode", "spill_threshold"),
+    [("full", 0), ("summary", 0), ("spill", 0), ("spill", 1024 * 1024)],
+)
+@responses.activate
+def test_result_retention(nornir, tmp_path, mode, spill_threshold):
+    declaration_file = f"{base_decl_dir}/atc/as3/simple_01.json"
+    declaration = load_json(declaration_file)
+    register_as3_get(declaration_file)
+
+    # Run task
+    processor = ResultRetention(
+        mode=mode, directory=str(tmp_path), spill_threshold=spill_threshold
+    )
+    nornir = nornir.filter(name="bigip1.localhost").with_processors([processor])
+    result = nornir.run(name="Get AS3 Declaration", task=atc, atc_service="AS3")
+
+    # Assert result
+    multi_result = result["bigip1.localhost"]
+    assert not result.failed
+    if mode == "full" or spill_threshold:
+        assert multi_result.result == declaration
+        return
+
+    data = json.dumps(declaration, sort_keys=True).encode("utf-8")
+    summary = multi_result.result
+    assert isinstance(summary, ResultSummary)
+    assert summary.status is None
+    assert not summary.changed
+    assert summary.sha256 == hashlib.sha256(data).hexdigest()
+    assert summary.size == len(data)
+    assert summary.elapsed > 0
+    # The subtasks are summarized too
+    assert all(isinstance(r.result, ResultSummary) for r in multi_result[1:])
+    assert multi_result[1].result.status is None
+
+    if mode == "summary":
+        assert summary.file is None
+        with pytest.raises(Exception, match="The payload was not spilled to disk."):
+            summary.load()
+    else:
+        assert summary.file.startswith(
+            f"{tmp_path}/Get_AS3_Declaration/bigip1.localhost/"
+        )
+        assert summary.load() == declaration
+        # The declaration of the subtask is spilled once
+        get_result = [r for r in multi_result if r.name == "GET the declaration"][0]
+        assert get_result.result.file == summary.file
+
+
+@responses.activate
+def test_result_retention_status(nornir):
+    register_as3_get(f"{base_decl_dir}/atc/as3/simple_01.json")
+
+    def grouped_task(task):
+        task.run(name="Get AS3 Declaration", task=atc, atc_service="AS3")
+        task.run(name="Message", task=lambda task: "ok")
+        return {
+            "status": "done",
+            "dataclass": ResultSummary(None, False, "", 0),
+            "set": {"Simple_01"},
+        }
+
+    # Run task
+    nornir = nornir.filter(name="bigip1.localhost").with_processors([ResultRetention()])
+    result = nornir.run(task=grouped_task)
+
+    # Assert result
+    assert result["bigip1.localhost"].result.status == "done"
+    assert result["bigip1.localhost"][1].name == "Get AS3 Declaration"
+    assert result["bigip1.localhost"][-1].result.status == "ok"
+
+
+@responses.activate
+def test_result_retention_failed(nornir):
+    responses.add(
+        responses.GET,
+        "https://bigip1.localhost:443/mgmt/shared/appsvcs/info",
+        status=500,
+    )
+
+    # Run task
+    nornir = nornir.filter(name="bigip1.localhost").with_processors([ResultRetention()])
+    result = nornir.run(task=atc, atc_service="AS3")
+
+    # Failed results are retained in full
+    assert result.failed
+    assert all(
+        not isinstance(r.result, ResultSummary) for r in result["bigip1.localhost"]
+    )
+
+
+@pytest.mark.parametrize(
+    ("kwargs", "expected"),
+    [
+        ({"mode": "none"}, "Result retention 'none' is not valid."),
+        ({"mode": "spill"}, "A directory is required to spill the results."),
+    ],
+)
+def test_result_retention_invalid(kwargs, expected):
+    with pytest.raises(Exception, match=expected):
+        ResultRetention(**kwargs)
@@ -0,0 +1,223 @@
+import asyncio
+import json
+import re
+
+import pytest
+
+import responses
+from nornir_f5.plugins.telemetry import (
+    CallbackSink,
+    JSONLinesSink,
+    RingBufferSink,
+    Sink,
+    TelemetryReceiver,
+    TelemetryScraper,
+)
+
+from .conftest import base_resp_dir, load_json
+
+event_file = f"{base_resp_dir}/atc/telemetry/event_ltm_request.json"
+event = load_json(event_file)
+
+
+def http_request(body: bytes, method: str = "POST", headers: str = "") -> bytes:
+    return (
+        f"{method} / HTTP/1.1\r\nHost: localhost\r\n{headers}"
+        f"Content-Length: {len(body)}\r\n\r\n"
+    ).encode("latin-1") + body
+
+
+async def send(port: int, requests: list) -> list:
+    # Sends the raw requests over one connection, and returns the response statuses
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    statuses = []
+    for request in requests:
+        writer.write(request)
+        await writer.drain()
+        statuses.append(int((await reader.readline()).split()[1]))
+        while (await reader.readline()) != b"\r\n":
+            pass
+    writer.close()
+    return statuses
+
+
+def test_receiver_push(tmp_path):
+    ring = RingBufferSink(size=100)
+    batches = []
+    output_file = str(tmp_path / "events.jsonl")
+    event_json = json.dumps(event).encode("utf-8")
+    chunked = (
+        b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+        + f"{len(event_json):x}\r\n".encode("ascii")
+        + event_json
+        + b"\r\n0\r\n\r\n"
+    )
+
+    async def run():
+        receiver = TelemetryReceiver(
+            sinks=[ring, JSONLinesSink(output_file), CallbackSink(batches.append)],
+            host="127.0.0.1",
+            port=0,
+            batch_size=2,
+            batch_interval=0.01,
+        )
+        async with receiver:
+            statuses = await send(
+                receiver.port,
+                [
+                    # One event
+                    http_request(event_json),
+                    # An array of events
+                    http_request(json.dumps([event, event]).encode("utf-8")),
+                    # JSON lines
+                    http_request(event_json + b"\n\n" + event_json + b"\n"),
+                    chunked,
+                    http_request(b"{not json"),
+                    http_request(b"", method="GET", headers="Connection: close\r\n"),
+                ],
+            )
+            # Idle connections are closed when stopping
+            await asyncio.open_connection("127.0.0.1", receiver.port)
+        return receiver, statuses
+
+    receiver, statuses = asyncio.run(run())
+
+    assert statuses == [200, 200, 200, 200, 400, 405]
+    assert ring.events == [event] * 6
+    with open(output_file, "rb") as f:
+        assert [json.loads(line) for line in f] == [event] * 6
+    assert all(len(batch) <= 2 for batch in batches)
+    assert sum(len(batch) for batch in batches) == 6
+    metrics = receiver.metrics
+    assert (metrics.payloads, metrics.events, metrics.written) == (5, 6, 6)
+    assert metrics.batches == len(batches)
+    assert metrics.errors == 1
+    assert metrics.last_error.startswith("Invalid payload")
+    assert metrics.events_per_sec > 0
+
+
+def test_receiver_body_too_large(monkeypatch):
+    receiver_module = __import__(
+        "nornir_f5.plugins.telemetry.receiver", fromlist=["MAX_BODY_SIZE"]
+    )
+    monkeypatch.setattr(receiver_module, "MAX_BODY_SIZE", 10)
+
+    async def run():
+        async with TelemetryReceiver(sinks=[], host="127.0.0.1", port=0) as receiver:
+            # Truncated request
+            _reader, writer = await asyncio.open_connection("127.0.0.1", receiver.port)
+            writer.write(http_request(b"[1]")[:-1])
+            writer.close()
+            await asyncio.sleep(0.05)
+            statuses = await send(
+                receiver.port, [http_request(b"[" + b"1," * 10 + b"1]")]
+            )
+            # The chunks are counted until exceeding the limit
+            return statuses + await send(
+                receiver.port,
+                [
+                    b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+                    + b"6\r\n[1,1,1\r\n6\r\n,1,1]\n\r\n0\r\n\r\n"
+                ],
+            )
+
+    assert asyncio.run(run()) == [413, 413]
+
+
+@pytest.mark.parametrize(
+    ("overflow", "expected_written", "expected_dropped"),
+    [("block", 3, 0), ("drop", 1, 2)],
+)
+def test_receiver_overflow(overflow, expected_written, expected_dropped):
+    ring = RingBufferSink()
+
+    async def run():
+        receiver = TelemetryReceiver(sinks=[ring], max_pending=1, overflow=overflow)
+        await receiver.start(listen=False)
+        # The writer does not run until the event loop is yielded to, so the
+        # first payload fills the queue
+        results = await asyncio.gather(
+            *(receiver.ingest(b'{"event": 1}') for _i in range(3))
+        )
+        await receiver.stop()
+        return receiver, results
+
+    receiver, results = asyncio.run(run())
+
+    assert results.count(False) == expected_dropped
+    assert len(ring.events) == expected_written
+    assert receiver.metrics.dropped == expected_dropped
+
+
+def test_receiver_replay():
+    ring = RingBufferSink(size=2)
+
+    def failing_callback(events):
+        raise ValueError("The sink is full.")
+
+    async def run():
+        receiver = TelemetryReceiver(
+            sinks=[ring, CallbackSink(failing_callback)], batch_interval=0
+        )
+        with pytest.raises(Exception, match="The Telemetry receiver is not started."):
+            await receiver.ingest(b"{}")
+        await receiver.start(listen=False)
+        await receiver.replay([event_file, b'{"event": 2}', b'{"event": 3}'])
+        # The batch is written without waiting for more events
+        await asyncio.sleep(0.05)
+        assert receiver.metrics.written == 3
+        await receiver.stop()
+        return receiver
+
+    receiver = asyncio.run(run())
+
+    # Only the most recent events are kept
+    assert ring.events == [{"event": 2}, {"event": 3}]
+    assert receiver.metrics.errors == 1
+    assert receiver.metrics.last_error == "CallbackSink: The sink is full."
+
+
+def test_receiver_invalid():
+    with pytest.raises(Exception, match="Overflow 'wait' is not valid."):
+        TelemetryReceiver(sinks=[], overflow="wait")
+    with pytest.raises(NotImplementedError):
+        Sink().write([])
+    # Stopping a receiver that is not started
+    asyncio.run(TelemetryReceiver(sinks=[RingBufferSink()]).stop())
+
+
+@responses.activate
+def test_scraper(nornir):
+    ring = RingBufferSink()
+    pull_data = load_json(f"{base_resp_dir}/atc/telemetry/pull_consumer.json")
+
+    # Register mock responses
+    responses.add(
+        responses.GET,
+        re.compile(
+            "https://bigip(1|2).localhost:443"
+            "/mgmt/shared/telemetry/pullconsumer/My_Pull_Consumer"
+        ),
+        json=pull_data,
+        status=200,
+    )
+    responses.add(
+        responses.GET,
+        "https://bigip3.localhost:443"
+        "/mgmt/shared/telemetry/pullconsumer/My_Pull_Consumer",
+        status=404,
+    )
+
+    async def run():
+        async with TelemetryReceiver(sinks=[ring], host="127.0.0.1", port=0) as r:
+            scraper = TelemetryScraper(r, nornir, "My_Pull_Consumer", interval=0)
+            await scraper.run(scrapes=2)
+        return r
+
+    receiver = asyncio.run(run())
+    nornir.close_connections()
+
+    # Assert result
+    assert ring.events == pull_data * 4
+    assert receiver.metrics.errors == 2
+    assert receiver.metrics.last_error.startswith("bigip3.localhost: 404")